@@ -5,6 +5,7 @@ from .models import UserProfile
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone_number', 'city', 'country', 'newsletter_subscription']
+    list_select_related = ['user']
     list_filter = ['newsletter_subscription', 'country', 'created_at']
     search_fields = ['user__username', 'user__email', 'phone_number']
     readonly_fields = ['created_at', 'updated_at'] 
\ No newline at end of file
@@ -6,4 +6,4 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
-        import accounts.models  # Import to register signals 
\ No newline at end of file
+        import accounts.backends  # Import to register cache invalidation
@@ -0,0 +1,82 @@
+"""
+Authentication backend that serves ``request.user`` from the cache.
+
+``AuthenticationMiddleware`` looks the logged-in user up on every request.
+``CachedModelBackend`` keeps a copy of each user in the cache, tagged with
+the user's cache version.  Saving the user or their profile bumps the
+version, so the next request reads fresh data, and a copy written by a
+request that raced with the save can never be served.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from redis.exceptions import RedisError
+
+from .models import UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+# Versions only need to outlive the cached users they point at
+VERSION_TIMEOUT = 86400
+
+
+def user_cache_ttl():
+    return getattr(settings, 'USER_CACHE_TTL', 300)
+
+
+def _version_key(user_id):
+    return f'auth_user_version:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads through the cache"""
+
+    def get_user(self, user_id):
+        version_key, user_key = _version_key(user_id), f'auth_user:{user_id}'
+        # One round trip for both the current version and the cached (version, user) pair
+        cached = cache.get_many([version_key, user_key])
+        version = cached.get(version_key)
+        if version is None:
+            # A lost version restarts at the current time, so it cannot match old entries
+            version = time.time_ns()
+            cache.add(version_key, version, VERSION_TIMEOUT)
+
+        entry = cached.get(user_key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(user_key, (version, user), user_cache_ttl())
+        return user
+
+
+def invalidate_cached_user(user_id):
+    """Make the next request load the user from the database"""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # No version yet, so nothing is cached
+        pass
+    except RedisError as e:
+        # The save has happened; a copy cached before it can live up to USER_CACHE_TTL
+        logger.warning('Could not invalidate cached user %s: %s', user_id, e)
+        count = getattr(cache, 'count', None)
+        if count is not None:
+            count('invalidations_failed')
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
@@ -0,0 +1,105 @@
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.db.models.signals import post_save
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import UserProfile
+
+
+def legacy_create_user_profile(sender, instance, created, **kwargs):
+    """The post_save handlers accounts.models used to register, for comparison"""
+    if created:
+        UserProfile.objects.create(user=instance)
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    try:
+        # Model.save(), not UserProfile.save(), which now skips unchanged rows
+        models.Model.save(instance.userprofile)
+    except UserProfile.DoesNotExist:
+        UserProfile.objects.create(user=instance)
+
+
+def count_writes(queries):
+    counts = Counter()
+    for query in queries:
+        verb = query['sql'].split(None, 1)[0].upper()
+        if verb in ('INSERT', 'UPDATE', 'DELETE'):
+            counts[verb] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Measure registration and login throughput and the database writes each one makes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Accounts to register and log in')
+        parser.add_argument(
+            '--real-hasher', action='store_true',
+            help='Hash passwords with the configured hasher instead of a fast one, '
+                 'so the numbers include the deliberate cost of PBKDF2',
+        )
+
+    def handle(self, *args, **options):
+        hashers = {} if options['real_hasher'] else {
+            'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+        }
+        with override_settings(**hashers):
+            post_save.connect(legacy_create_user_profile, sender=User)
+            post_save.connect(legacy_save_user_profile, sender=User)
+            try:
+                before = self.run_mode('legacy', options['users'])
+            finally:
+                post_save.disconnect(legacy_create_user_profile, sender=User)
+                post_save.disconnect(legacy_save_user_profile, sender=User)
+            after = self.run_mode('current', options['users'])
+
+        self.stdout.write(f"{options['users']} accounts per mode")
+        for label, result in (('Post-save profile handlers', before), ('Lazy profile', after)):
+            self.stdout.write(label)
+            for action in ('register', 'login'):
+                writes = result[action]['writes']
+                per_request = ', '.join(
+                    f'{verb} {count / options["users"]:.1f}' for verb, count in sorted(writes.items())
+                ) or 'none'
+                self.stdout.write(
+                    f"  {action:9} {options['users'] / result[action]['seconds']:8.1f}/s   writes per request: {per_request}"
+                )
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def run_mode(self, label, users):
+        prefix = f'bench-auth-{label}-{int(time.time())}'
+        password = 'Bench-password-123'
+        result = {}
+        try:
+            client = Client()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for number in range(users):
+                    client.post(reverse('accounts:register'), {
+                        'username': f'{prefix}-{number}',
+                        'first_name': 'Bench',
+                        'last_name': 'User',
+                        'email': f'{prefix}-{number}@example.com',
+                        'password1': password,
+                        'password2': password,
+                    })
+                result['register'] = {'seconds': time.perf_counter() - started, 'writes': count_writes(queries)}
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for number in range(users):
+                    Client().post(reverse('accounts:login'), {
+                        'username': f'{prefix}-{number}',
+                        'password': password,
+                    })
+                result['login'] = {'seconds': time.perf_counter() - started, 'writes': count_writes(queries)}
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+        return result
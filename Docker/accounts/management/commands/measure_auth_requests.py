@@ -0,0 +1,117 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from shop.models import Product
+
+
+CACHE_OPERATIONS = ['get', 'set', 'add', 'delete', 'incr', 'touch', 'has_key', 'get_many', 'set_many']
+
+# The settings this project used before the user cache and cookie messages
+BASELINE_SETTINGS = {
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+}
+
+
+class CacheRecorder:
+    """Counts round trips made through the session cache, split into session and other keys"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.counts = Counter()
+        self.depth = 0
+
+    def __enter__(self):
+        for name in CACHE_OPERATIONS:
+            setattr(self.cache, name, self._wrap(name, getattr(self.cache, name)))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name in CACHE_OPERATIONS:
+            delattr(self.cache, name)
+
+    def _wrap(self, name, method):
+        def recorded(key_or_keys, *args, **kwargs):
+            # Backends without native get_many/set_many loop over get/set; count the outer call only
+            if not self.depth:
+                keys = [key_or_keys] if isinstance(key_or_keys, str) else list(key_or_keys)
+                is_session = any(str(key).startswith('django.contrib.sessions') for key in keys)
+                writes = name not in ('get', 'has_key', 'get_many')
+                self.counts[('session' if is_session else 'other', 'write' if writes else 'read')] += 1
+            self.depth += 1
+            try:
+                return method(key_or_keys, *args, **kwargs)
+            finally:
+                self.depth -= 1
+        return recorded
+
+
+class Command(BaseCommand):
+    help = 'Count database queries and session/cache round trips per authenticated request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='admin', help='User to log in as')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per page')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        product = Product.objects.available().first()
+        if product is None:
+            raise CommandError('Needs at least one available product (run populate_data)')
+
+        requests = [
+            ('GET home', 'get', reverse('shop:home')),
+            ('GET product list', 'get', reverse('shop:product_list')),
+            ('GET product', 'get', product.get_absolute_url()),
+            ('GET cart', 'get', reverse('shop:cart_detail')),
+            ('GET profile', 'get', reverse('accounts:profile')),
+            # Toggled an even number of times, so the wishlist ends up unchanged
+            ('POST wishlist toggle', 'post', reverse('shop:add_to_wishlist', args=[product.pk])),
+        ]
+        repeat = options['repeat'] + options['repeat'] % 2
+
+        self.stdout.write(f"Per-request averages over {repeat} requests as {user.username}")
+        self.stdout.write(f"{'':24}{'db queries':>22}{'session r/w':>22}{'other cache r/w':>22}")
+        before = self.measure(user, requests, repeat, BASELINE_SETTINGS)
+        after = self.measure(user, requests, repeat, {})
+        for label, _, _ in requests:
+            b, a = before[label], after[label]
+            self.stdout.write(
+                f"{label:24}"
+                f"{b['db']:>10.1f} -> {a['db']:<9.1f}"
+                f"{b['session read']:>6.1f}/{b['session write']:<3.1f} -> {a['session read']:.1f}/{a['session write']:<6.1f}"
+                f"{b['other read']:>6.1f}/{b['other write']:<3.1f} -> {a['other read']:.1f}/{a['other write']:.1f}"
+            )
+        self.stdout.write(self.style.SUCCESS('Left: previous settings; right: current settings'))
+
+    def measure(self, user, requests, repeat, overrides):
+        results = {}
+        with override_settings(**overrides):
+            client = Client()
+            client.force_login(user)
+            cache = caches[settings.SESSION_CACHE_ALIAS]
+            for label, method, url in requests:
+                # Warm up so one-off cache fills do not count (twice, to keep toggles even)
+                for _ in range(2):
+                    getattr(client, method)(url)
+                with CaptureQueriesContext(connection) as queries, CacheRecorder(cache) as recorder:
+                    for _ in range(repeat):
+                        getattr(client, method)(url)
+                results[label] = {
+                    'db': len(queries) / repeat,
+                    **{f'{kind} {op}': recorder.counts[(kind, op)] / repeat
+                       for kind in ('session', 'other') for op in ('read', 'write')},
+                }
+        return results
@@ -1,7 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+
+
+class UserProfileManager(models.Manager):
+    def for_user(self, user):
+        """The user's profile; an unsaved one if they never saved theirs"""
+        try:
+            return user.userprofile
+        except UserProfile.DoesNotExist:
+            # Created by the first save instead of on every User save
+            return UserProfile(user=user)
 
 
 class UserProfile(models.Model):
@@ -18,21 +26,31 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UserProfileManager()
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Create user profile when user is created"""
-    if created:
-        UserProfile.objects.create(user=instance)
-
+    def changed_fields(self):
+        """Names of fields that differ from what was loaded from the database"""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]
+        ]
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save user profile when user is saved"""
-    try:
-        instance.userprofile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance) 
\ No newline at end of file
+    def save(self, *args, **kwargs):
+        # Existing profiles only write the fields that changed, or nothing at all
+        if self.pk and hasattr(self, '_loaded_values') and 'update_fields' not in kwargs and not kwargs.get('force_insert'):
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed + ['updated_at']
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
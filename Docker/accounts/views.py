@@ -3,8 +3,10 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.db.models import Count, Window
 from .forms import UserRegistrationForm, UserProfileForm
 from .models import UserProfile
+from shop.cards import card_rows, product_cards
 from shop.models import Wishlist
 from orders.models import Order
 
@@ -52,21 +54,24 @@ def user_register(request):
 @login_required
 def user_profile(request):
     """User profile view with wishlist and orders"""
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
-        profile = UserProfile.objects.create(user=request.user)
+    profile = UserProfile.objects.for_user(request.user)
     
     # Handle profile form submission
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
         
-        # Handle user fields
+        # Handle user fields, writing only the ones that changed
         user = request.user
-        user.first_name = request.POST.get('first_name', '')
-        user.last_name = request.POST.get('last_name', '')
-        user.email = request.POST.get('email', user.email)
-        user.save()
+        user_fields = {
+            'first_name': request.POST.get('first_name', ''),
+            'last_name': request.POST.get('last_name', ''),
+            'email': request.POST.get('email', user.email),
+        }
+        changed = [name for name, value in user_fields.items() if getattr(user, name) != value]
+        if changed:
+            for name in changed:
+                setattr(user, name, user_fields[name])
+            user.save(update_fields=changed)
         
         if form.is_valid():
             form.save()
@@ -80,14 +85,18 @@ def user_profile(request):
     wishlist_count = 0
     try:
         wishlist = Wishlist.objects.get(user=request.user)
-        wishlist_products = wishlist.products.filter(is_active=True).select_related('category')[:12]
+        wishlist_products = product_cards(card_rows(wishlist.products.filter(is_active=True))[:12])
         wishlist_count = wishlist.products.filter(is_active=True).count()
     except Wishlist.DoesNotExist:
         pass
     
-    # Get user's orders
-    orders = Order.objects.filter(user=request.user).prefetch_related('items__product').order_by('-created_at')[:10]
-    orders_count = Order.objects.filter(user=request.user).count()
+    # Get user's latest orders; the window count saves a separate COUNT query
+    orders = list(
+        Order.objects.filter(user=request.user).with_item_preview().annotate(
+            total_orders=Window(Count('pk'))
+        ).order_by('-created_at')[:10]
+    )
+    orders_count = orders[0].total_orders if orders else 0
     
     context = {
         'form': form,
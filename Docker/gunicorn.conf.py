@@ -0,0 +1,152 @@
+"""
+Gunicorn settings for the Pet Shop (``gunicorn -c gunicorn.conf.py``).
+
+Every setting can be overridden from the environment (GUNICORN_*), and
+command-line flags still win over this file.
+
+- GUNICORN_WORKER_CLASS: ``gthread`` (default) runs GUNICORN_THREADS
+  threads per worker, so requests waiting on PostgreSQL or Redis do not
+  hold a whole process; ``sync`` is one request per process.
+- Worker count defaults to the CPUs this container may use: 2 x CPUs + 1
+  for sync workers, CPUs + 1 for gthread, capped by GUNICORN_MAX_WORKERS.
+- The app is preloaded in the master and shared copy-on-write.  Database
+  and cache connections are closed before forking, so each worker opens
+  its own on first use instead of sharing the master's sockets.
+- Workers are recycled after GUNICORN_MAX_REQUESTS requests, give or take
+  a random jitter so they do not all restart at once, to cap memory growth.
+- Each worker writes its counters (including per-tier cache hits) to
+  GUNICORN_STATS_DIR; read them with ``manage.py gunicorn_stats``.
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+
+def env(name, default, cast=str):
+    value = os.environ.get(name)
+    return default if value in (None, '') else cast(value)
+
+
+def env_bool(name, default):
+    return env(name, default, lambda value: value.lower() in ('1', 'true', 'yes', 'on'))
+
+
+def usable_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = env('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = env('GUNICORN_WORKER_CLASS', 'gthread')
+threads = env('GUNICORN_THREADS', 4, int) if worker_class == 'gthread' else 1
+_cpus = usable_cpus()
+workers = env(
+    'GUNICORN_WORKERS',
+    min(_cpus + 1 if worker_class == 'gthread' else 2 * _cpus + 1, env('GUNICORN_MAX_WORKERS', 8, int)),
+    int,
+)
+
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+max_requests = env('GUNICORN_MAX_REQUESTS', 1000, int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10, int)
+
+timeout = env('GUNICORN_TIMEOUT', 30, int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', 30, int)
+# Matches nginx's upstream keepalive (sync workers close every connection anyway)
+keepalive = env('GUNICORN_KEEPALIVE', 5, int)
+# Heartbeat files on tmpfs, so a slow container disk cannot get workers killed
+worker_tmp_dir = env('GUNICORN_WORKER_TMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+accesslog = env('GUNICORN_ACCESS_LOG', None)
+loglevel = env('GUNICORN_LOG_LEVEL', 'info')
+statsd_host = env('GUNICORN_STATSD_HOST', None)
+statsd_prefix = 'petshop'
+
+stats_dir = env('GUNICORN_STATS_DIR', '/tmp/petshop-gunicorn')
+# Worker counters are written at most this often
+STATS_INTERVAL = 5
+
+
+def on_starting(server):
+    os.makedirs(stats_dir, exist_ok=True)
+    for name in os.listdir(stats_dir):
+        if name.endswith('.json'):
+            os.unlink(os.path.join(stats_dir, name))
+
+
+def pre_fork(server, worker):
+    # Anything the preloaded app connected to in the master must not leak into workers
+    if preload_app:
+        from django.core.cache import caches
+        from django.db import connections
+        connections.close_all()
+        caches.close_all()
+
+
+def post_fork(server, worker):
+    worker.stats = {
+        'pid': worker.pid,
+        'worker_class': worker_class,
+        'threads': threads,
+        'started': time.time(),
+        # The jittered limit this worker drew
+        'max_requests': worker.max_requests,
+        'requests': 0,
+        'errors': 0,
+        'busy_seconds': 0.0,
+        'slowest_seconds': 0.0,
+    }
+    worker.stats_lock = threading.Lock()
+    worker.stats_written = 0.0
+    write_stats(worker)
+    server.log.info('Worker %s spawned, recycling after %s requests', worker.pid, worker.max_requests)
+
+
+def pre_request(worker, req):
+    req.started = time.monotonic()
+
+
+def post_request(worker, req, environ, resp):
+    elapsed = time.monotonic() - getattr(req, 'started', time.monotonic())
+    # gthread workers finish requests on several threads
+    with worker.stats_lock:
+        stats = worker.stats
+        stats['requests'] += 1
+        stats['busy_seconds'] += elapsed
+        stats['slowest_seconds'] = max(stats['slowest_seconds'], elapsed)
+        if resp.status_code and resp.status_code >= 500:
+            stats['errors'] += 1
+        if time.monotonic() - worker.stats_written >= STATS_INTERVAL:
+            write_stats(worker)
+
+
+def worker_exit(server, worker):
+    try:
+        os.unlink(os.path.join(stats_dir, f'{worker.pid}.json'))
+    except OSError:
+        pass
+
+
+def write_stats(worker):
+    worker.stats_written = time.monotonic()
+    stats = dict(worker.stats, updated=time.time())
+    # ru_maxrss is in kilobytes on Linux
+    stats['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    # Per-tier hit/miss counters of petshop.cache.TieredCache, once Django is loaded
+    if 'django.core.cache' in sys.modules:
+        from django.core.cache import cache
+        tier_stats = getattr(cache, 'tier_stats', None)
+        if tier_stats is not None:
+            stats['cache'] = tier_stats()
+    path = os.path.join(stats_dir, f'{worker.pid}.json')
+    try:
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(stats, file)
+        os.replace(f'{path}.tmp', path)
+    except OSError as error:
+        worker.log.warning('Could not write worker stats: %s', error)
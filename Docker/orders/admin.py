@@ -1,24 +1,48 @@
+import csv
+from datetime import timedelta
+
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.urls import path
+from django.utils import timezone
+from shop.changelists import IndexedSearchMixin, ScalableModelAdmin
 from .models import Order, OrderItem
+from .rollups import sales_report
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ['total_price']
+    fields = ['product', 'product_name', 'category_name', 'quantity', 'price', 'line_total']
+    readonly_fields = ['product_name', 'category_name', 'line_total']
+    raw_id_fields = ['product']
+
+    @admin.display(description='Total price')
+    def line_total(self, obj):
+        # The blank "add another" row has no quantity or price yet
+        return obj.total_price if obj.pk else '-'
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(IndexedSearchMixin, ScalableModelAdmin):
     list_display = ['order_number', 'user', 'status', 'total_amount', 'created_at']
-    list_filter = ['status', 'created_at']
-    search_fields = ['order_number', 'user__username', 'user__email']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    list_filter = ['status']
+    list_select_related = ['user']
+    date_hierarchy = 'created_at'
+    search_fields = ['order_number', 'user__username', 'email']
+    search_exact_fields = ['order_number', 'user__username']
+    # Backed by the trigram indexes of orders migration 0009
+    search_fallback_fields = ['order_number', 'email']
+    raw_id_fields = ['user']
+    readonly_fields = ['order_number', 'item_count', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
+    actions = ['export_order_lines']
+    change_list_template = 'admin/orders/order/change_list.html'
     
     fieldsets = (
         ('Order Information', {
-            'fields': ('order_number', 'user', 'status', 'total_amount')
+            'fields': ('order_number', 'user', 'status', 'total_amount', 'item_count')
         }),
         ('Contact Information', {
             'fields': ('email', 'phone_number')
@@ -33,4 +57,61 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    ) 
\ No newline at end of file
+    )
+
+    DASHBOARD_RANGES = [
+        ('7', 'Last 7 days'),
+        ('30', 'Last 30 days'),
+        ('90', 'Last 90 days'),
+        ('365', 'Last year'),
+        ('all', 'All time'),
+    ]
+
+    @admin.action(description='Export order lines of selected orders as CSV')
+    def export_order_lines(self, request, queryset):
+        # Reads only the order line snapshots, never the live catalog
+        lines = OrderItem.objects.filter(order__in=queryset).order_by('order_id', 'pk').values_list(
+            'order__order_number', 'order__created_at', 'product_slug', 'product_name',
+            'category_name', 'quantity', 'price',
+        )
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="order-lines.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['order_number', 'ordered_at', 'product_slug', 'product_name', 'category', 'quantity', 'unit_price'])
+        writer.writerows(lines)
+        return response
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Keep the denormalized line count in step with inline edits
+        order = form.instance
+        Order.objects.filter(pk=order.pk).update(item_count=order.items.count())
+
+    def get_urls(self):
+        urls = [
+            path(
+                'sales-dashboard/',
+                self.admin_site.admin_view(self.sales_dashboard_view),
+                name='orders_sales_dashboard',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def sales_dashboard_view(self, request):
+        """Revenue and top sellers, read from the daily rollup tables"""
+        selected = request.GET.get('range', '30')
+        if selected not in dict(self.DASHBOARD_RANGES):
+            selected = '30'
+        start = None
+        if selected != 'all':
+            start = timezone.localdate() - timedelta(days=int(selected) - 1)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sales dashboard',
+            'ranges': self.DASHBOARD_RANGES,
+            'selected_range': selected,
+            'report': sales_report(start=start),
+        }
+        return render(request, 'admin/orders/order/sales_dashboard.html', context)
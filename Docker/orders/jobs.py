@@ -0,0 +1,284 @@
+"""
+Background jobs for work that follows an order.
+
+Checkout only queues its side effects (confirmation email, low-stock alerts,
+...) once the order transaction commits; ``run_jobs`` workers pick them up,
+so checkout latency does not grow with the number of side effects.
+
+Jobs are registered with ``@job(name)`` and queued with ``enqueue(name,
+**payload)``.  A handler registered with ``batch=True`` receives the payloads
+of all queued jobs of that name in one call, which lets it share a query or
+an SMTP connection.  Failed jobs are retried with exponential backoff and
+jitter, and parked as failed after ``JOB_MAX_ATTEMPTS`` attempts.  A batch
+is retried whole, so a handler whose work cannot be undone (sending email)
+records what it already did and skips it the next time.
+
+The queue lives in Redis (a ready list, a delayed sorted set for retries, a
+processing set of claimed jobs and a capped failed list).  If Redis is not configured or not reachable, the
+``orders_job`` table is used instead; workers always drain both.
+"""
+import json
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# name -> (function, batch)
+_handlers = {}
+
+# A job left running this long is assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+MAX_RETRY_DELAY = 600
+FAILED_KEEP = 1000
+
+
+def job(name, batch=False):
+    """Register a job handler under ``name``"""
+    def decorator(func):
+        _handlers[name] = (func, batch)
+        return func
+    return decorator
+
+
+def max_attempts():
+    return getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+
+
+def batch_size():
+    return getattr(settings, 'JOB_BATCH_SIZE', 100)
+
+
+def retry_delay(attempts):
+    """Seconds before the next attempt: 2, 4, 8, ... with +-50% jitter"""
+    return min(2 ** attempts, MAX_RETRY_DELAY) * random.uniform(0.5, 1.5)
+
+
+# KEYS: ready list, delayed zset, processing zset, processing hash; ARGV: now, batch size, lease seconds
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 1000)
+for _, member in ipairs(due) do
+    redis.call('RPUSH', KEYS[1], member)
+end
+if #due > 0 then
+    redis.call('ZREM', KEYS[2], unpack(due))
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, 1000)
+if #expired > 0 then
+    local members = redis.call('HMGET', KEYS[4], unpack(expired))
+    for i = #expired, 1, -1 do
+        if members[i] then
+            redis.call('LPUSH', KEYS[1], members[i])
+        end
+    end
+    redis.call('ZREM', KEYS[3], unpack(expired))
+    redis.call('HDEL', KEYS[4], unpack(expired))
+end
+local jobs = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+redis.call('LTRIM', KEYS[1], #jobs, -1)
+local deadline = tonumber(ARGV[1]) + tonumber(ARGV[3])
+for _, member in ipairs(jobs) do
+    local id = cjson.decode(member)['id']
+    redis.call('ZADD', KEYS[3], deadline, id)
+    redis.call('HSET', KEYS[4], id, member)
+end
+return jobs
+"""
+
+
+class RedisJobQueue:
+    """
+    Jobs kept in Redis as JSON documents.
+
+    Claiming moves a job from the ready list into the processing set with a
+    deadline; it leaves only when its worker completes, retries or fails it.
+    Jobs whose deadline passed belonged to a dead worker and are claimed again
+    from the front of the ready list.
+    """
+    READY = 'jobs:ready'
+    DELAYED = 'jobs:delayed'
+    PROCESSING = 'jobs:processing'
+    PROCESSING_DATA = 'jobs:processing:data'
+    FAILED = 'jobs:failed'
+
+    def __init__(self, client):
+        self.client = client
+        self._claim = client.register_script(CLAIM_SCRIPT)
+
+    def push(self, entry):
+        self.client.rpush(self.READY, json.dumps(entry))
+
+    def claim(self, limit):
+        members = self._claim(
+            keys=[self.READY, self.DELAYED, self.PROCESSING, self.PROCESSING_DATA],
+            args=[time.time(), limit, STALE_AFTER.total_seconds()],
+        )
+        return [json.loads(member) for member in members]
+
+    def _finish(self, pipe, entries):
+        ids = [entry['id'] for entry in entries]
+        pipe.zrem(self.PROCESSING, *ids)
+        pipe.hdel(self.PROCESSING_DATA, *ids)
+
+    def complete(self, entries):
+        pipe = self.client.pipeline()
+        self._finish(pipe, entries)
+        pipe.execute()
+
+    def retry(self, entry, run_at, error):
+        entry['last_error'] = error
+        pipe = self.client.pipeline()
+        self._finish(pipe, [entry])
+        pipe.zadd(self.DELAYED, {json.dumps(entry): run_at})
+        pipe.execute()
+
+    def fail(self, entry, error):
+        entry['last_error'] = error
+        pipe = self.client.pipeline()
+        self._finish(pipe, [entry])
+        pipe.lpush(self.FAILED, json.dumps(entry))
+        pipe.ltrim(self.FAILED, 0, FAILED_KEEP - 1)
+        pipe.execute()
+
+
+class DatabaseJobQueue:
+    """Jobs kept in the orders_job table"""
+
+    def push(self, entry):
+        Job.objects.create(name=entry['name'], payload=entry['payload'])
+
+    def claim(self, limit):
+        now = timezone.now()
+        with transaction.atomic():
+            # SKIP LOCKED lets several workers claim different rows at once
+            rows = list(
+                Job.objects.select_for_update(skip_locked=True).filter(
+                    Q(status='pending', run_at__lte=now) |
+                    Q(status='running', locked_at__lt=now - STALE_AFTER)
+                ).order_by('run_at')[:limit]
+            )
+            Job.objects.filter(pk__in=[row.pk for row in rows]).update(status='running', locked_at=now)
+        return [
+            {'id': row.pk, 'name': row.name, 'payload': row.payload, 'attempts': row.attempts}
+            for row in rows
+        ]
+
+    def complete(self, entries):
+        Job.objects.filter(pk__in=[entry['id'] for entry in entries]).delete()
+
+    def retry(self, entry, run_at, error):
+        Job.objects.filter(pk=entry['id']).update(
+            status='pending',
+            attempts=entry['attempts'],
+            run_at=datetime.fromtimestamp(run_at, tz=dt_timezone.utc),
+            locked_at=None,
+            last_error=error,
+        )
+
+    def fail(self, entry, error):
+        Job.objects.filter(pk=entry['id']).update(
+            status='failed', attempts=entry['attempts'], locked_at=None, last_error=error,
+        )
+
+
+_database_queue = DatabaseJobQueue()
+_redis_queue = None
+
+
+def _redis():
+    """The Redis queue, or None if jobs are configured to use the database"""
+    global _redis_queue
+    if getattr(settings, 'JOB_QUEUE_BACKEND', 'redis') != 'redis':
+        return None
+    if _redis_queue is None:
+        try:
+            from django_redis import get_redis_connection
+            _redis_queue = RedisJobQueue(get_redis_connection('default'))
+        except (ImportError, NotImplementedError):
+            # The default cache is not django_redis (e.g. local development)
+            return None
+    return _redis_queue
+
+
+def _push(entry):
+    queue = _redis()
+    if queue is not None:
+        try:
+            return queue.push(entry)
+        except RedisError as e:
+            logger.warning('Job queue falling back to the database: %s', e)
+    _database_queue.push(entry)
+
+
+def enqueue(name, **payload):
+    """Queue a job to run once the current transaction (if any) commits"""
+    if name not in _handlers:
+        raise ValueError(f'Unknown job: {name}')
+    entry = {'id': uuid.uuid4().hex, 'name': name, 'payload': payload, 'attempts': 0}
+    transaction.on_commit(lambda: _push(entry))
+
+
+def _queues():
+    queue = _redis()
+    return [_database_queue] if queue is None else [queue, _database_queue]
+
+
+def _retry_or_fail(queue, entry, error):
+    entry['attempts'] += 1
+    if entry['attempts'] >= max_attempts():
+        logger.error('Job %s failed for good after %d attempts: %s', entry['name'], entry['attempts'], error)
+        queue.fail(entry, error)
+    else:
+        queue.retry(entry, time.time() + retry_delay(entry['attempts']), error)
+
+
+def _run(queue, name, entries):
+    if name not in _handlers:
+        for entry in entries:
+            queue.fail(entry, f'Unknown job: {name}')
+        return
+    func, batch = _handlers[name]
+    groups = [entries] if batch else [[entry] for entry in entries]
+    for group in groups:
+        try:
+            if batch:
+                func([entry['payload'] for entry in group])
+            else:
+                func(**group[0]['payload'])
+        except Exception as e:
+            logger.exception('Job %s failed', name)
+            for entry in group:
+                _retry_or_fail(queue, entry, repr(e))
+        else:
+            queue.complete(group)
+
+
+def run_pending(limit=None):
+    """Claim and run up to ``limit`` due jobs per queue; returns how many ran"""
+    limit = limit or batch_size()
+    processed = 0
+    for queue in _queues():
+        try:
+            entries = queue.claim(limit)
+        except RedisError as e:
+            logger.warning('Could not claim jobs from Redis: %s', e)
+            continue
+        by_name = defaultdict(list)
+        for entry in entries:
+            by_name[entry['name']].append(entry)
+        for name, group in by_name.items():
+            _run(queue, name, group)
+        processed += len(entries)
+    return processed
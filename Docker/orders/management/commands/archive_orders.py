@@ -0,0 +1,76 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import partitions
+
+
+class Command(BaseCommand):
+    help = 'Move closed months of orders to compressed NDJSON files, or load a month back'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=12, metavar='MONTHS',
+            help='Archive months that ended at least this many months ago',
+        )
+        parser.add_argument('--restore', metavar='YYYY-MM', help='Load this month back from its archive')
+        parser.add_argument('--list', action='store_true', help='Show partitions and archive files, change nothing')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be archived')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.list()
+            return
+        if options['restore']:
+            self.restore(options['restore'])
+            return
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1: the current month is never closed')
+
+        created = partitions.ensure_partitions()
+        if created:
+            self.stdout.write(f'Created partitions {", ".join(created)}')
+        months = partitions.archivable_months(options['older_than'])
+        if not months:
+            self.stdout.write(self.style.SUCCESS('Nothing to archive'))
+            return
+        for month, orders, open_orders in months:
+            label = partitions.month_label(month)
+            if open_orders:
+                self.stdout.write(self.style.WARNING(f'{label}: {open_orders} of {orders} orders still open, skipped'))
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {orders} orders would be archived')
+                continue
+            orders, lines = partitions.archive_month(month)
+            self.stdout.write(f'{label}: {orders} orders, {lines} lines -> {partitions.archive_path(month)}')
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def restore(self, text):
+        try:
+            month = partitions.parse_month(text)
+        except ValueError as error:
+            raise CommandError(str(error))
+        try:
+            orders, lines, skipped = partitions.restore_month(month)
+        except (FileNotFoundError, RuntimeError) as error:
+            raise CommandError(str(error))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{skipped} orders of deleted accounts were not restored'))
+        self.stdout.write(self.style.SUCCESS(f'Restored {orders} orders and {lines} lines for {text}'))
+
+    def list(self):
+        if partitions.is_partitioned():
+            for table in partitions.PARTITION_KEYS:
+                months = sorted(partitions.partitions(table))
+                self.stdout.write(f'{table}: {len(months)} monthly partitions')
+                if months:
+                    first, last = partitions.month_label(months[0]), partitions.month_label(months[-1])
+                    self.stdout.write(f'  {first} to {last}')
+        else:
+            self.stdout.write('Order tables are not partitioned (PostgreSQL only)')
+        months = partitions.archived_months()
+        self.stdout.write(f'{len(months)} archived months in {partitions.archive_dir()}')
+        for month in months:
+            size = os.path.getsize(partitions.archive_path(month))
+            self.stdout.write(f'  {partitions.month_label(month)}  {size / 1024:.0f} KiB')
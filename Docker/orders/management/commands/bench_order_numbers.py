@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order
+from orders.numbers import new_order_number
+
+
+def dated_uuid_number():
+    """What process_checkout used before"""
+    return f"PET-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+def hex_number():
+    """What orders.views.checkout used before"""
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+
+SCHEMES = [
+    ('PET-date-uuid8', dated_uuid_number),
+    ('ORD-hex8', hex_number),
+    ('ULID', new_order_number),
+]
+
+
+def make_numbers(count):
+    return [new_order_number() for _ in range(count)]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare order number schemes: generation rate, uniqueness across processes and insert throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50000, help='Orders inserted per scheme')
+        parser.add_argument('--batch', type=int, default=1, help='Orders per INSERT (1 = one per checkout)')
+        parser.add_argument('--processes', type=int, default=8, help='Processes making ULIDs at once')
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('No users; run populate_data first')
+        count = options['orders']
+
+        self.stdout.write(f"{'scheme':<16} {'numbers/s':>10} {'duplicates':>10}")
+        for label, make in SCHEMES:
+            started = time.perf_counter()
+            numbers = [make() for _ in range(count)]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label:<16} {count / elapsed:>10.0f} {count - len(set(numbers)):>10}')
+
+        # Forked like gunicorn workers, all in the same milliseconds
+        per_process = count // options['processes']
+        with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+            batches = pool.map(make_numbers, [per_process] * options['processes'])
+        made = [number for batch in batches for number in batch]
+        increasing = all(batch == sorted(batch) and len(set(batch)) == len(batch) for batch in batches)
+        self.stdout.write(
+            f'{len(made)} ULIDs from {options["processes"]} forked processes: '
+            f'{len(made) - len(set(made))} duplicates, strictly increasing in each process: {increasing}'
+        )
+
+        self.stdout.write(f"{'scheme':<16} {'inserts/s':>10} {'index KiB':>10}   ({connection.vendor}, "
+                          f"{options['batch']} per INSERT, rolled back)")
+        for label, make in SCHEMES:
+            # Drop the clashes a random scheme makes; each would be a failed checkout
+            numbers = list(dict.fromkeys(make() for _ in range(count)))
+            elapsed, index_size = self.insert(user, numbers, options['batch'])
+            size = f'{index_size / 1024:.0f}' if index_size is not None else '-'
+            self.stdout.write(f'{label:<16} {len(numbers) / elapsed:>10.0f} {size:>10}')
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def insert(self, user, numbers, batch):
+        """(seconds to insert orders with ``numbers``, size of the order_number index or None)"""
+        template = dict(
+            user=user, total_amount=Decimal('10.00'), shipping_address='-', billing_address='-',
+            phone_number='-', email='bench@example.com', item_count=1,
+        )
+        index_size = None
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                for start in range(0, len(numbers), batch):
+                    Order.objects.bulk_create([
+                        Order(order_number=number, **template) for number in numbers[start:start + batch]
+                    ])
+                elapsed = time.perf_counter() - started
+                index_size = self.index_size()
+                raise Rollback
+        except Rollback:
+            pass
+        return elapsed, index_size
+
+    def index_size(self):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+            name = next(
+                name for name, info in constraints.items()
+                if info['columns'] == ['order_number'] and info['unique']
+            )
+            cursor.execute('SELECT pg_relation_size(%s::regclass)', [name])
+            return cursor.fetchone()[0]
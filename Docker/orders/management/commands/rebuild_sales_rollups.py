@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from all order items'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding sales rollups...')
+        days = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days'))
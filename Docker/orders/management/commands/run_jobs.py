@@ -0,0 +1,41 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from orders.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (order emails, stock alerts, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--batch-size', type=int, help='Jobs claimed per queue per round')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the current batch before stopping on SIGTERM (docker stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        if not options['once']:
+            self.stdout.write('Job worker started')
+        while not self.stopping:
+            close_old_connections()
+            processed = run_pending(options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f'Ran {processed} job(s)')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Job worker stopped after {total} job(s)'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_order_items(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    counts = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+        count=Count('pk')
+    ).values('count')
+    Order.objects.update(item_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ),
+        migrations.RunPython(count_order_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:40
+
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def copy_order_times(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    OrderItem.objects.update(
+        ordered_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')),
+    )
+
+
+def partition_orders(apps, schema_editor):
+    # Declarative partitioning is PostgreSQL only; elsewhere the tables stay as they are
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from orders.partitions import partition_tables
+    with schema_editor.connection.cursor() as cursor:
+        partition_tables(cursor)
+
+
+def unpartition_orders(apps, schema_editor):
+    from orders.partitions import is_partitioned
+    if is_partitioned():
+        raise IrreversibleError('orders_order and orders_orderitem are partitioned; restore them from a backup')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='ordered_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_order_times, migrations.RunPython.noop),
+        migrations.RunPython(partition_orders, unpartition_orders),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:53
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def merge_deleted_product_rows(apps, schema_editor):
+    # Deleting a product used to leave one row per product and day with product NULL
+    DailyProductSales = apps.get_model('orders', 'DailyProductSales')
+    deleted = DailyProductSales.objects.filter(product__isnull=True)
+    days = deleted.values('day').annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    merged = [DailyProductSales(category=None, **row) for row in days]
+    deleted.delete()
+    DailyProductSales.objects.bulk_create(merged)
+    if schema_editor.connection.vendor == 'postgresql':
+        # Run the deferred FK checks now; PostgreSQL will not build an index with them pending
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_partitions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_deleted_product_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('day',), name='daily_sales_deleted_product_uniq'),
+        ),
+    ]
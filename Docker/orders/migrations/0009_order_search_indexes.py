@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:05
+
+from django.db import migrations
+
+
+# Trigram indexes on the expressions Django's icontains compares, for the
+# search_fallback_fields of OrderAdmin
+SEARCH_INDEXES = [
+    ('order_number_trgm_idx', 'orders_order', 'UPPER(order_number::text) gin_trgm_ops'),
+    ('order_email_trgm_idx', 'orders_order', 'UPPER(email::text) gin_trgm_ops'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_deleted_product_sales'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
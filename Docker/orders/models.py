@@ -1,6 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
-from shop.models import Product
+from django.utils import timezone
+from shop.models import Category, Product
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_item_preview(self, size=3):
+        """Attach the first ``size`` items of each order as ``preview_items``, in one query"""
+        return self.prefetch_related(models.Prefetch(
+            'items',
+            queryset=OrderItem.objects.only('order', 'quantity', 'product_name').order_by('pk')[:size],
+            to_attr='preview_items',
+        ))
 
 
 class Order(models.Model):
@@ -22,26 +33,147 @@ class Order(models.Model):
     phone_number = models.CharField(max_length=20)
     email = models.EmailField()
     notes = models.TextField(blank=True)
+    # Number of order lines, so order lists need not count them
+    item_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} by {self.user.username}"
 
+    @property
+    def more_item_count(self):
+        """Items beyond the preview shown in order lists"""
+        return max(self.item_count - len(getattr(self, 'preview_items', ())), 0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so rollups can react to status changes
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
 
 class OrderItem(models.Model):
-    """Items in an order"""
+    """Items in an order, with the product details as they were when ordered"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Deleting a product keeps the order history; the snapshot below still describes it
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=200, blank=True)
+    product_slug = models.SlugField(max_length=200, blank=True, db_index=False)
+    product_image = models.ImageField(upload_to='products/', blank=True)
+    category_name = models.CharField(max_length=100, blank=True)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # The order's created_at, so lines are partitioned and archived by the same month (orders/partitions.py)
+    ordered_at = models.DateTimeField(editable=False)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
+        return f"{self.quantity} x {self.product_name}"
+
+    @classmethod
+    def from_product(cls, order, product, quantity):
+        """Unsaved order line for ``product`` at its current price, ready for bulk_create"""
+        item = cls(
+            order=order, product=product, quantity=quantity, price=product.get_price, ordered_at=order.created_at,
+        )
+        item.take_snapshot()
+        return item
+
+    def take_snapshot(self):
+        """Copy the product details this line is displayed with"""
+        product = self.product
+        self.product_name = product.name
+        self.product_slug = product.slug
+        self.product_image = product.image.name if product.image else ''
+        self.category_name = product.category.name
+
+    def save(self, *args, **kwargs):
+        # Lines added by hand (e.g. in the admin) get their snapshot here
+        if self.product_id and not self.product_name:
+            self.take_snapshot()
+        if self.ordered_at is None:
+            self.ordered_at = self.order.created_at
+        super().save(*args, **kwargs)
 
     @property
     def total_price(self):
-        return self.quantity * self.price 
\ No newline at end of file
+        return self.quantity * self.price
+
+
+class DailySales(models.Model):
+    """Per-day sales totals, maintained incrementally by orders.rollups"""
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'Daily sales'
+
+    def __str__(self):
+        return f"Sales for {self.day}"
+
+
+class DailyProductSales(models.Model):
+    """Per-day, per-product sales, maintained incrementally by orders.rollups"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ('day', 'product')
+        constraints = [
+            # Sales of deleted products share one row per day (orders.rollups)
+            models.UniqueConstraint(
+                fields=['day'], condition=models.Q(product__isnull=True), name='daily_sales_deleted_product_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category']),
+        ]
+        verbose_name_plural = 'Daily product sales'
+
+    def __str__(self):
+        return f"Sales of product {self.product_id} on {self.day}"
+
+
+class Job(models.Model):
+    """Queued background job, used when JOB_QUEUE_BACKEND is 'database' or Redis is down"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,398 @@
+"""
+Monthly partitions of orders and order lines, and their archive.
+
+On PostgreSQL, ``orders_order`` is partitioned by month of ``created_at``
+and ``orders_orderitem`` by month of ``ordered_at`` (the order's
+``created_at``, copied onto each line), so an order and its lines always
+live in partitions for the same month.  Queries for a user's recent orders
+only touch the recent partitions, each with its own small indexes, and
+vacuum works on one month at a time.  A ``_default`` partition catches
+rows for a month with no partition yet; ``ensure_partitions`` creates the
+coming months (``release`` runs it) and moves any such rows out.
+
+A partitioned table's keys must include the partition column, so the
+primary keys become (id, created_at) and (id, ordered_at) and
+``order_number`` is unique per (order_number, created_at).  The foreign key
+from order lines to orders becomes (order_id, ordered_at) referencing
+(id, created_at), which needs PostgreSQL 12 or later.  A month's line
+partition is therefore dropped before its order partition, and attached
+after it.
+
+Closed months can be written to ``ORDER_ARCHIVE_DIR`` as gzipped NDJSON
+(Django's ``jsonl`` serialization, orders then their lines) and removed
+from the database: a partitioned month is detached and dropped, otherwise
+(SQLite, or before migrating) its rows are deleted.  Restoring loads a
+month back and renames its file to ``.restored``.  The sales rollups are
+left alone either way, since they summarise archived months too.
+"""
+import gzip
+import io
+import os
+import re
+from datetime import datetime
+
+from django.conf import settings
+from django.core import serializers
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+
+# Orders in these statuses can still change, so their month is not archived
+OPEN_STATUSES = ('pending', 'processing', 'shipped')
+
+# Partitioned tables and their partition column
+PARTITION_KEYS = {
+    'orders_order': 'created_at',
+    'orders_orderitem': 'ordered_at',
+}
+
+PARTITION_NAME = re.compile(r'_(\d{4})_(\d{2})$')
+
+
+def archive_dir():
+    return getattr(settings, 'ORDER_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'order_archive'))
+
+
+def partition_months_ahead():
+    return getattr(settings, 'ORDER_PARTITION_MONTHS_AHEAD', 3)
+
+
+def add_months(month, count):
+    """``month`` (a (year, month) pair) moved by ``count`` months"""
+    year, index = divmod(month[0] * 12 + month[1] - 1 + count, 12)
+    return year, index + 1
+
+
+def month_of(value):
+    """(year, month) of a datetime, in the site's time zone"""
+    value = timezone.localtime(value)
+    return value.year, value.month
+
+
+def month_start(month):
+    """Aware datetime at the start of ``month``"""
+    return timezone.make_aware(datetime(month[0], month[1], 1))
+
+
+def month_label(month):
+    return f'{month[0]:04d}-{month[1]:02d}'
+
+
+def parse_month(text):
+    """(year, month) from 'YYYY-MM'"""
+    match = re.fullmatch(r'(\d{4})-(\d{2})', text)
+    if not match or not 1 <= int(match[2]) <= 12:
+        raise ValueError(f'Expected a month as YYYY-MM, got {text!r}')
+    return int(match[1]), int(match[2])
+
+
+def partition_name(table, month):
+    return f'{table}_{month[0]:04d}_{month[1]:02d}'
+
+
+def is_partitioned(table='orders_order'):
+    """Whether ``table`` is a partitioned table (always False outside PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind = 'p'", [table])
+        return cursor.fetchone() is not None
+
+
+def partitions(table):
+    """{(year, month): partition name} of ``table``'s monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            WHERE parent.relname = %s
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    found = {}
+    for name in names:
+        match = PARTITION_NAME.search(name)
+        if match:
+            found[int(match[1]), int(match[2])] = name
+    return found
+
+
+def create_partitions(cursor, month, tables=PARTITION_KEYS):
+    """
+    Attach partitions of ``tables`` for ``month``, taking their rows out of
+    the default partitions; returns their names.
+    """
+    tables = [table for table in PARTITION_KEYS if table in tables]
+    start, end = month_start(month), month_start(add_months(month, 1))
+    # Checked row by row, not at commit: by then a moved order's lines are attached again and
+    # the check, made against the default partition it was deleted from, would fail
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    # Created on their own and attached, so rows already in the default partitions can move first:
+    # lines before their orders, so no attached line is left without its order
+    for table in reversed(tables):
+        key = PARTITION_KEYS[table]
+        name = partition_name(table, month)
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end],
+        )
+    # Orders first, so the lines attached after them find theirs
+    names = []
+    for table in tables:
+        name = partition_name(table, month)
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        names.append(name)
+    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+    return names
+
+
+def ensure_partitions(months_ahead=None):
+    """Create the partitions from this month to ``months_ahead`` months on; returns their names"""
+    if not is_partitioned():
+        return []
+    months_ahead = partition_months_ahead() if months_ahead is None else months_ahead
+    this_month = month_of(timezone.now())
+    missing = {}
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in PARTITION_KEYS:
+            existing = partitions(table)
+            # And any month that has rows waiting in the default partition
+            cursor.execute(f'SELECT DISTINCT {PARTITION_KEYS[table]} FROM {table}_default')
+            months = {month_of(row[0]) for row in cursor.fetchall()}
+            months.update(add_months(this_month, offset) for offset in range(months_ahead + 1))
+            for month in months - set(existing):
+                missing.setdefault(month, []).append(table)
+        for month in sorted(missing):
+            created.extend(create_partitions(cursor, month, missing[month]))
+    return created
+
+
+def partition_tables(cursor, months_ahead=3):
+    """
+    Turn ``orders_order`` and ``orders_orderitem`` into monthly partitioned tables.
+
+    Used by migration 0007 on PostgreSQL.  Each table is copied into a new
+    partitioned table with a partition for every month that has rows, up to
+    ``months_ahead`` months from now.
+    """
+    # Nothing may reference a partitioned table by id alone: dropped, and the line to order key re-added below
+    cursor.execute(
+        """
+        SELECT con.conname, src.relname, pg_get_constraintdef(con.oid) FROM pg_constraint con
+        JOIN pg_class src ON src.oid = con.conrelid
+        JOIN pg_class dst ON dst.oid = con.confrelid
+        WHERE con.contype = 'f' AND dst.relname = ANY(%s)
+        """,
+        [list(PARTITION_KEYS)],
+    )
+    references = cursor.fetchall()
+    for name, table, definition in references:
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+
+    this_month = month_of(timezone.now())
+    for table, key in PARTITION_KEYS.items():
+        old = f'{table}_unpartitioned'
+        # Indexes and foreign keys to recreate on the new table, under the same names
+        cursor.execute(
+            """
+            SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN (
+                SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass
+            )
+            """,
+            [table, table],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('f', 'u')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        # Identity columns are not allowed on partitioned tables before PostgreSQL 17: a sequence instead.
+        # CHECK constraints (quantity >= 0, item_count >= 0) come along with their names
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({key})'
+        )
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        cursor.execute(f'SELECT min({key}) FROM {old}')
+        oldest = cursor.fetchone()[0]
+        month = month_of(oldest) if oldest is not None else this_month
+        last = add_months(this_month, months_ahead)
+        while month <= last:
+            create_partitions(cursor, month, [table])
+            month = add_months(month, 1)
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {old}')
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'DROP TABLE {old}')
+
+        cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        cursor.execute(f"SELECT setval('{table}_id_seq', %s, %s)", [max(last_id, 1), last_id > 0])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {key})')
+        for name, kind, definition in constraints:
+            if kind == 'u':
+                # "UNIQUE (order_number)" becomes unique together with the partition column
+                definition = f'{definition[:-1]}, {key})'
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+    # References between the two tables take the partition columns along:
+    # "FOREIGN KEY (order_id) REFERENCES orders_order(id)" becomes
+    # "FOREIGN KEY (order_id, ordered_at) REFERENCES orders_order(id, created_at)"
+    for name, table, definition in references:
+        if table not in PARTITION_KEYS:
+            continue
+        definition = re.sub(
+            r'FOREIGN KEY \((\w+)\) REFERENCES (\w+)\((\w+)\)',
+            lambda match: (
+                f'FOREIGN KEY ({match[1]}, {PARTITION_KEYS[table]}) '
+                f'REFERENCES {match[2]}({match[3]}, {PARTITION_KEYS[match[2]]})'
+            ),
+            definition,
+        )
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+
+def month_orders(month):
+    """Orders placed in ``month``"""
+    return Order.objects.filter(
+        created_at__gte=month_start(month), created_at__lt=month_start(add_months(month, 1)),
+    )
+
+
+def archivable_months(older_than):
+    """(month, orders, open orders) for each month that ended at least ``older_than`` months ago"""
+    cutoff = month_start(add_months(month_of(timezone.now()), -older_than))
+    rows = (
+        Order.objects.filter(created_at__lt=cutoff)
+        .annotate(month=TruncMonth('created_at')).values('month')
+        .annotate(orders=Count('pk'), open=Count('pk', filter=Q(status__in=OPEN_STATUSES)))
+        .order_by('month')
+    )
+    return [(month_of(row['month']), row['orders'], row['open']) for row in rows]
+
+
+def archive_path(month):
+    return os.path.join(archive_dir(), f'orders-{month_label(month)}.ndjson.gz')
+
+
+def archived_months():
+    """Months whose orders are in an archive file rather than the database"""
+    directory = archive_dir()
+    if not os.path.isdir(directory):
+        return []
+    months = []
+    for name in sorted(os.listdir(directory)):
+        match = re.fullmatch(r'orders-(\d{4}-\d{2})\.ndjson\.gz', name)
+        if match:
+            months.append(parse_month(match[1]))
+    return months
+
+
+def archive_month(month):
+    """Write ``month``'s orders and lines to its archive file and remove them; returns (orders, lines)"""
+    os.makedirs(archive_dir(), exist_ok=True)
+    path = archive_path(month)
+    orders = month_orders(month).order_by('pk')
+    items = OrderItem.objects.filter(order__in=orders.values('pk')).order_by('pk')
+    with transaction.atomic():
+        order_count, item_count = orders.count(), items.count()
+        partial = f'{path}.partial'
+        with open(partial, 'wb') as raw:
+            with io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode='wb'), encoding='utf-8') as stream:
+                serializers.serialize('jsonl', orders.iterator(chunk_size=2000), stream=stream)
+                serializers.serialize('jsonl', items.iterator(chunk_size=2000), stream=stream)
+            # On disk before the rows are gone
+            raw.flush()
+            os.fsync(raw.fileno())
+        with gzip.open(partial, 'rt', encoding='utf-8') as stream:
+            written = sum(1 for _ in stream)
+        if written != order_count + item_count:
+            os.remove(partial)
+            raise RuntimeError(f'{partial} has {written} lines, expected {order_count + item_count}')
+        os.replace(partial, path)
+        _remove_month(month)
+    return order_count, item_count
+
+
+def _remove_month(month):
+    start, end = month_start(month), month_start(add_months(month, 1))
+    with connection.cursor() as cursor:
+        if is_partitioned():
+            # Lines first: their foreign key keeps an order's partition from being detached before them
+            for table, name in ((table, partitions(table).get(month)) for table in reversed(PARTITION_KEYS)):
+                if name:
+                    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+                    cursor.execute(f'DROP TABLE {name}')
+                else:
+                    # The month's rows are in the default partition
+                    cursor.execute(
+                        f'DELETE FROM {table} WHERE {PARTITION_KEYS[table]} >= %s AND {PARTITION_KEYS[table]} < %s',
+                        [start, end],
+                    )
+        else:
+            # Plain SQL: the ORM's delete() would take the orders out of the rollups
+            cursor.execute(
+                'DELETE FROM orders_orderitem WHERE order_id IN '
+                '(SELECT id FROM orders_order WHERE created_at >= %s AND created_at < %s)',
+                [start, end],
+            )
+            cursor.execute('DELETE FROM orders_order WHERE created_at >= %s AND created_at < %s', [start, end])
+
+
+def restore_month(month):
+    """Load ``month`` back from its archive file; returns (orders, lines, orders skipped)"""
+    from django.contrib.auth.models import User
+    from shop.models import Product
+
+    path = archive_path(month)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No archive for {month_label(month)} at {path}')
+    if month_orders(month).exists():
+        raise RuntimeError(f'{month_label(month)} already has orders in the database')
+
+    with gzip.open(path, 'rt', encoding='utf-8') as stream:
+        loaded = list(serializers.deserialize('jsonl', stream))
+    orders = [entry for entry in loaded if isinstance(entry.object, Order)]
+    items = [entry for entry in loaded if isinstance(entry.object, OrderItem)]
+
+    # Accounts deleted since take their orders with them, as a delete would have
+    users = set(User.objects.filter(pk__in={entry.object.user_id for entry in orders}).values_list('pk', flat=True))
+    kept = [entry for entry in orders if entry.object.user_id in users]
+    kept_ids = {entry.object.pk for entry in kept}
+    items = [entry for entry in items if entry.object.order_id in kept_ids]
+    # Deleted products leave the lines and their snapshot, as SET_NULL would have
+    products = set(Product.objects.filter(
+        pk__in={entry.object.product_id for entry in items},
+    ).values_list('pk', flat=True))
+    for entry in items:
+        if entry.object.product_id not in products:
+            entry.object.product_id = None
+
+    with transaction.atomic():
+        if is_partitioned():
+            missing = [table for table in PARTITION_KEYS if month not in partitions(table)]
+            if missing:
+                with connection.cursor() as cursor:
+                    create_partitions(cursor, month, missing)
+        # Raw saves, as loaddata does: created_at is kept, and the rollups, which still count
+        # the month, are left alone
+        for entry in kept + items:
+            entry.save(force_insert=True)
+    # Kept, but no longer counted as archived; archiving the month again replaces it
+    os.replace(path, f'{path}.restored')
+    return len(kept), len(items), len(orders) - len(kept)
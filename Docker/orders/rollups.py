@@ -0,0 +1,264 @@
+"""
+Daily sales rollups.
+
+``DailySales`` and ``DailyProductSales`` are kept up to date incrementally:
+checkout queues each new order once (``order_sales``) and a job worker adds
+it, so checkouts never wait on the day's row; status changes in and out of
+``cancelled`` add or subtract the order again.  Reports read only these
+tables, never ``orders_orderitem``.  ``rebuild_sales_rollups`` recomputes them
+from scratch if they ever drift (e.g. after editing order items by hand),
+except for the months ``archive_orders`` has moved out of the database, whose
+rollups are kept as they are.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from shop.models import Category, Product
+
+from .models import DailyProductSales, DailySales, Order, OrderItem
+
+
+# Orders in these statuses do not count towards sales
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def counts_towards_sales(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _increment(model, keys, deltas, defaults=None):
+    """Add ``deltas`` to the row identified by ``keys``, creating it if needed"""
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas, **(defaults or {}))
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**keys).update(**updates)
+
+
+def _order_lines(order):
+    return OrderItem.objects.filter(order=order).values_list(
+        'product_id', 'product__category_id', 'quantity', 'price'
+    )
+
+
+def apply_orders(orders, sign=1):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) orders from the rollups.
+
+    ``orders`` is an iterable of (day, lines), ``lines`` an iterable of
+    (product_id, category_id, quantity, unit_price).  Each row is updated once
+    however many of the orders it counts.
+    """
+    # day -> [orders, units, revenue]; (day, product_id) -> [category_id, orders, units, revenue]
+    per_day = defaultdict(lambda: [0, 0, Decimal('0')])
+    per_product = defaultdict(lambda: [None, 0, 0, Decimal('0')])
+    for day, lines in orders:
+        products = set()
+        for product_id, category_id, quantity, price in lines:
+            entry = per_product[day, product_id]
+            entry[0] = category_id
+            entry[2] += quantity
+            entry[3] += quantity * price
+            products.add(product_id)
+            per_day[day][1] += quantity
+            per_day[day][2] += quantity * price
+        for product_id in products:
+            per_product[day, product_id][1] += 1
+        if products:
+            per_day[day][0] += 1
+
+    with transaction.atomic():
+        # In key order, so concurrent workers lock the rows in the same sequence
+        for (day, product_id), (category_id, count, units, revenue) in sorted(
+            per_product.items(), key=lambda item: (item[0][0], item[0][1] or 0),
+        ):
+            _increment(
+                DailyProductSales,
+                {'day': day, 'product_id': product_id},
+                {'orders': sign * count, 'units': sign * units, 'revenue': sign * revenue},
+                defaults={'category_id': category_id},
+            )
+        for day, (count, units, revenue) in sorted(per_day.items()):
+            _increment(
+                DailySales,
+                {'day': day},
+                {'orders': sign * count, 'units': sign * units, 'revenue': sign * revenue},
+            )
+
+
+def apply_order(order, lines=None, sign=1):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) an order's lines from the rollups.
+
+    ``lines`` is as for ``apply_orders``; it is read from the database when not given.
+    """
+    if lines is None:
+        lines = _order_lines(order)
+    apply_orders([(timezone.localdate(order.created_at), lines)], sign)
+
+
+def order_sales(order, items):
+    """
+    Job payload adding a freshly placed order to the rollups, from its unsaved
+    ``items``; None if the order does not count towards sales.
+
+    The lines travel with the job rather than being read back by it, so an
+    order cancelled or deleted before the job runs (which subtracts it) is
+    still added exactly once.
+    """
+    if not counts_towards_sales(order.status):
+        return None
+    return {
+        'day': timezone.localdate(order.created_at).isoformat(),
+        'lines': [
+            [item.product_id, item.product.category_id, item.quantity, str(item.price)]
+            for item in items
+        ],
+    }
+
+
+def record_sales(payloads):
+    """Add the orders of ``order_sales`` payloads to the rollups"""
+    lines = [line for payload in payloads for line in payload['lines']]
+    # Products and categories deleted since count under None, as SET_NULL would have left them
+    products = set(Product.objects.filter(pk__in={line[0] for line in lines}).values_list('pk', flat=True))
+    categories = set(Category.objects.filter(pk__in={line[1] for line in lines}).values_list('pk', flat=True))
+    apply_orders(
+        (
+            date.fromisoformat(payload['day']),
+            [
+                (
+                    product_id if product_id in products else None,
+                    category_id if product_id in products and category_id in categories else None,
+                    quantity,
+                    Decimal(price),
+                )
+                for product_id, category_id, quantity, price in payload['lines']
+            ],
+        )
+        for payload in payloads
+    )
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_status_change(sender, instance, created, **kwargs):
+    """Move an order in or out of the rollups when it is (un)cancelled"""
+    previous = getattr(instance, '_loaded_status', None)
+    if created or previous is None or previous == instance.status:
+        return
+    was_counted = counts_towards_sales(previous)
+    is_counted = counts_towards_sales(instance.status)
+    if was_counted != is_counted:
+        apply_order(instance, sign=1 if is_counted else -1)
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Remove a deleted order from the rollups while its items still exist"""
+    status = getattr(instance, '_loaded_status', None) or instance.status
+    if counts_towards_sales(status):
+        apply_order(instance, sign=-1)
+
+
+@receiver(pre_delete, sender=Product)
+def merge_deleted_product_sales(sender, instance, **kwargs):
+    """
+    Fold a deleted product's rows into the day's row for deleted products.
+
+    Its order lines lose their product, so from now on they are counted (and
+    cancelled) under product None, as ``rebuild_rollups`` counts them.
+    """
+    rows = DailyProductSales.objects.filter(product=instance)
+    with transaction.atomic():
+        for day, orders, units, revenue in rows.values_list('day', 'orders', 'units', 'revenue'):
+            _increment(
+                DailyProductSales,
+                {'day': day, 'product_id': None},
+                {'orders': orders, 'units': units, 'revenue': revenue},
+                defaults={'category_id': None},
+            )
+        rows.delete()
+
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute the rollups from orders_orderitem; returns the number of days"""
+    # Imported here: partitions reads the settings and files of the archive
+    from .partitions import add_months, archived_months
+    stale = Q()
+    for month in archived_months():
+        next_month = add_months(month, 1)
+        stale &= ~Q(day__gte=date(*month, 1), day__lt=date(*next_month, 1))
+    items = (
+        OrderItem.objects
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .annotate(day=TruncDate('order__created_at'))
+        .order_by()
+    )
+    line_revenue = Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    with transaction.atomic():
+        DailyProductSales.objects.filter(stale).delete()
+        DailySales.objects.filter(stale).delete()
+
+        daily = items.values('day').annotate(
+            orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=line_revenue,
+        )
+        DailySales.objects.bulk_create(
+            (DailySales(**row) for row in daily.iterator()),
+            batch_size=batch_size,
+        )
+
+        per_product = items.values('day', 'product_id', 'product__category_id').annotate(
+            orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=line_revenue,
+        )
+        batch = []
+        for row in per_product.iterator(chunk_size=batch_size):
+            row['category_id'] = row.pop('product__category_id')
+            batch.append(DailyProductSales(**row))
+            if len(batch) >= batch_size:
+                DailyProductSales.objects.bulk_create(batch)
+                batch = []
+        DailyProductSales.objects.bulk_create(batch)
+
+    return DailySales.objects.count()
+
+
+def sales_report(start=None, end=None, top=10):
+    """Summaries for the admin dashboard, read from the rollup tables only"""
+    daily = DailySales.objects.all()
+    per_product = DailyProductSales.objects.all()
+    if start:
+        daily = daily.filter(day__gte=start)
+        per_product = per_product.filter(day__gte=start)
+    if end:
+        daily = daily.filter(day__lte=end)
+        per_product = per_product.filter(day__lte=end)
+
+    totals = daily.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    return {
+        'totals': {name: value or 0 for name, value in totals.items()},
+        'days': list(daily.order_by('-day').values('day', 'orders', 'units', 'revenue')[:90]),
+        'top_products': list(
+            per_product.values('product_id', 'product__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'))
+            .order_by('-revenue')[:top]
+        ),
+        'categories': list(
+            per_product.values('category_id', 'category__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')
+        ),
+    }
@@ -0,0 +1,88 @@
+"""Background jobs queued by checkout"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from shop.inventory import low_stock_products
+
+from .jobs import enqueue, job
+from .models import Order
+from .rollups import order_sales, record_sales
+
+
+# A product that stays low on stock is reported at most this often
+LOW_STOCK_ALERT_INTERVAL = 3600
+# How long a sent confirmation is remembered; longer than a job can keep being retried
+CONFIRMATION_SENT_TTL = 86400
+
+
+def _confirmation_key(order_id):
+    return f'order_confirmation_sent:{order_id}'
+
+
+@job('orders.confirmation_email', batch=True)
+def send_confirmation_emails(payloads):
+    """
+    Email customers their order summaries over one mail connection.
+
+    Each sent message is recorded, so when the batch is retried after a
+    failure only the customers who got nothing are emailed again.
+    """
+    order_ids = [payload['order_id'] for payload in payloads]
+    sent = cache.get_many([_confirmation_key(order_id) for order_id in order_ids])
+    orders = Order.objects.filter(
+        pk__in=[order_id for order_id in order_ids if _confirmation_key(order_id) not in sent],
+    ).exclude(email='').select_related('user').prefetch_related('items')
+    if not orders:
+        return
+    with get_connection() as connection:
+        for order in orders:
+            connection.send_messages([EmailMessage(
+                subject=f'Your Pet Shop order {order.order_number}',
+                body=render_to_string('orders/emails/order_confirmation.txt', {'order': order}),
+                to=[order.email],
+                connection=connection,
+            )])
+            cache.set(_confirmation_key(order.pk), 1, CONFIRMATION_SENT_TTL)
+
+
+@job('orders.low_stock_alert', batch=True)
+def send_low_stock_alert(payloads):
+    """Tell staff about products that orders have pushed to low stock"""
+    product_ids = {product_id for payload in payloads for product_id in payload['product_ids']}
+    recipients = list(User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True))
+    if not recipients:
+        return
+    # Claiming the keys first keeps two workers from reporting the same product
+    products = [
+        product for product in low_stock_products().filter(id__in=product_ids)
+        if cache.add(f'low_stock_alert:{product.pk}', 1, LOW_STOCK_ALERT_INTERVAL)
+    ]
+    if not products:
+        return
+    try:
+        EmailMessage(
+            subject=f'Low stock: {len(products)} product(s)',
+            body=render_to_string('orders/emails/low_stock_alert.txt', {'products': products}),
+            to=recipients,
+        ).send()
+    except Exception:
+        # Nobody was told; let the retry report these products again
+        cache.delete_many([f'low_stock_alert:{product.pk}' for product in products])
+        raise
+
+
+@job('orders.sales_rollup', batch=True)
+def update_sales_rollups(payloads):
+    """Add newly placed orders to the daily sales rollups, one update per row for the whole batch"""
+    record_sales(payloads)
+
+
+def queue_order_jobs(order, items):
+    """Queue the follow-up work for a newly placed order and its lines"""
+    enqueue('orders.confirmation_email', order_id=order.pk)
+    enqueue('orders.low_stock_alert', product_ids=[item.product_id for item in items])
+    sales = order_sales(order, items)
+    if sales is not None:
+        enqueue('orders.sales_rollup', **sales)
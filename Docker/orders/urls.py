@@ -5,5 +5,6 @@ app_name = 'orders'
  
 urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),
+    path('history/', views.order_history, name='order_history'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
 ] 
\ No newline at end of file
@@ -1,9 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from shop import reservations
+from shop.inventory import OutOfStock, decrement_stock
 from shop.models import Cart
 from .models import Order, OrderItem
-import uuid
+from .numbers import new_order_number
+from .tasks import queue_order_jobs
+
+
+ORDERS_PER_PAGE = 20
 
 
 @login_required
@@ -11,7 +19,7 @@ def checkout(request):
     """Checkout view"""
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('product').all()
+        cart_items = cart.items.select_related('product__category').all()
     except Cart.DoesNotExist:
         messages.error(request, 'Your cart is empty.')
         return redirect('shop:cart_detail')
@@ -21,29 +29,43 @@ def checkout(request):
         return redirect('shop:cart_detail')
 
     if request.method == 'POST':
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
-            total_amount=cart.total_price,
-            shipping_address=request.POST.get('shipping_address'),
-            billing_address=request.POST.get('billing_address'),
-            phone_number=request.POST.get('phone_number'),
-            email=request.POST.get('email'),
-            notes=request.POST.get('notes', ''),
-        )
-
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.get_price,
-            )
-
-        # Clear cart
-        cart_items.delete()
+        try:
+            with transaction.atomic():
+                # Create order
+                order = Order.objects.create(
+                    user=request.user,
+                    order_number=new_order_number(),
+                    total_amount=cart.total_price,
+                    shipping_address=request.POST.get('shipping_address'),
+                    billing_address=request.POST.get('billing_address'),
+                    phone_number=request.POST.get('phone_number'),
+                    email=request.POST.get('email'),
+                    notes=request.POST.get('notes', ''),
+                    item_count=len(cart_items),
+                )
+
+                # Create order items and take them out of stock
+                holder = reservations.cart_holder(cart.pk)
+                lines = []
+                for cart_item in sorted(cart_items, key=lambda item: item.product_id):
+                    if not reservations.reserve(cart_item.product, holder, cart_item.quantity):
+                        raise OutOfStock(cart_item.product)
+                    if not decrement_stock(cart_item.product_id, cart_item.quantity):
+                        raise OutOfStock(cart_item.product)
+                    lines.append(OrderItem.from_product(order, cart_item.product, cart_item.quantity))
+                OrderItem.objects.bulk_create(lines)
+
+                held_products = [item.product_id for item in cart_items]
+                transaction.on_commit(lambda: reservations.release_holds(held_products, holder))
+
+                # Emails, stock alerts and the sales rollups run in the job worker once this commits
+                queue_order_jobs(order, lines)
+
+                # Clear cart
+                cart_items.delete()
+        except OutOfStock as e:
+            messages.error(request, f'Not enough stock available for {e.product.name}.')
+            return redirect('shop:cart_detail')
 
         messages.success(request, f'Order {order.order_number} placed successfully!')
         return redirect('orders:order_detail', order_id=order.id)
@@ -60,7 +82,7 @@ def checkout(request):
 def order_detail(request, order_id):
     """Order detail view"""
     order = get_object_or_404(
-        Order.objects.prefetch_related('items__product'),
+        Order.objects.prefetch_related('items'),
         id=order_id,
         user=request.user
     )
@@ -68,4 +90,17 @@ def order_detail(request, order_id):
     context = {
         'order': order,
     }
-    return render(request, 'orders/order_detail.html', context) 
\ No newline at end of file
+    return render(request, 'orders/order_detail.html', context) 
+
+
+@login_required
+def order_history(request):
+    """Paginated list of the user's orders, newest first"""
+    orders = Order.objects.filter(user=request.user).with_item_preview().order_by('-created_at')
+    paginator = Paginator(orders, ORDERS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'orders/order_history.html', context)
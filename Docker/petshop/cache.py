@@ -0,0 +1,589 @@
+"""
+Two-tier cache backend: a bounded in-process LRU (L1) in front of Redis (L2).
+
+Only keys starting with one of ``L1_KEY_PREFIXES`` are kept in L1: data that
+is read on most requests but changes rarely, such as featured products, the
+catalog change stamp and cached users.  Everything else (sessions, counters,
+locks, idempotency keys) goes straight to Redis, so ``add`` and ``incr``
+stay atomic across processes.
+
+Coherence across gunicorn workers and containers:
+
+- Every write or delete of an L1 key is published on a Redis channel.  Each
+  process listens on it in a background thread and drops those keys from
+  its L1.
+- While the listener is not subscribed (just started or forked, or Redis
+  unreachable) L1 is bypassed, because invalidations could be missed.  L1
+  is emptied whenever the subscription is re-established.
+- A value read from Redis is only kept in L1 if no invalidation arrived
+  while it was being read.
+- L1 entries expire after ``L1_TIMEOUT`` seconds whatever happens, which
+  bounds staleness if a message is lost.
+
+When Redis is slow or down:
+
+- Redis calls use short socket timeouts (set in CACHES OPTIONS).
+- After ``BREAKER_THRESHOLD`` consecutive failures a circuit breaker skips
+  Redis for ``BREAKER_COOLDOWN`` seconds, then lets one call through to
+  test it.  Skipped calls fail at once with a redis ``ConnectionError``,
+  which callers already handle as a Redis failure.
+- L1 keys fall back to a per-process in-memory store (``FALLBACK_TIMEOUT``
+  seconds), so catalog pages keep their cached data instead of erroring.
+  Every write goes there too (``set``, ``add``, ``set_many``, ``incr``,
+  ``touch``, deletes), so invalidating catalog data never fails.  Other
+  keys raise as before.  The fallback is dropped when Redis is back.
+
+Values are stored pickled, like LocMemCache, so callers cannot mutate a
+shared copy.  Hit and miss counts per tier, errors and the breaker state
+are returned by ``tier_stats()``.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django_redis.cache import RedisCache
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+
+
+_MISSING = object()
+
+# How long the listener waits before resubscribing after losing Redis
+RECONNECT_DELAY = 1.0
+# A silent subscription is pinged this often so a dead connection is noticed
+PING_INTERVAL = 15.0
+
+
+class LocalLRU:
+    """Bounded LRU of pickled values with per-entry expiry and size accounting"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, pickled value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remove(key)
+            # A value worth more than a tenth of the budget would flush everything else
+            if timeout <= 0 or len(pickled) > self.max_bytes // 10:
+                return
+            self._entries[key] = (time.monotonic() + timeout, pickled)
+            self.bytes += len(pickled)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures; after ``cooldown`` seconds one call may test Redis"""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._testing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self._testing else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._testing and time.monotonic() - self.opened_at >= self.cooldown:
+                self._testing = True
+                return True
+            return False
+
+    def succeeded(self):
+        """Record a successful call; True if that closed the breaker"""
+        with self._lock:
+            was_open = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+            self._testing = False
+            return was_open
+
+    def failed(self):
+        """Record a failed call; True if that opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            self._testing = False
+            was_open = self.opened_at is not None
+            if was_open or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            return not was_open and self.opened_at is not None
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._testing = False
+
+
+class LocalTier:
+    """The per-process L1, fallback store, breaker and invalidation listener, shared by every thread's backend"""
+
+    def __init__(self, channel, max_entries, max_bytes, breaker_threshold=3, breaker_cooldown=5):
+        self.channel = channel
+        self.lru = LocalLRU(max_entries, max_bytes)
+        # Catalog data kept only while Redis is unavailable
+        self.fallback = LocalLRU(max_entries, max_bytes)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.counters = Counter()
+        self.subscribed = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._epoch = 0
+        self.origin = uuid.uuid4().hex
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def usable(self, client_factory):
+        """True when L1 can be trusted; starts the listener in a new process"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Forked: the parent's listener thread and entries did not come along
+                    self._pid = os.getpid()
+                    self.origin = uuid.uuid4().hex
+                    self.subscribed.clear()
+                    self.lru.clear()
+                    self.fallback.clear()
+                    self.breaker.reset()
+                    self.counters.clear()
+                    threading.Thread(
+                        target=self._listen, args=(client_factory,), name='cache-invalidation', daemon=True,
+                    ).start()
+        return self.subscribed.is_set()
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def fill(self, key, value, timeout, epoch):
+        """Keep a value read from L2, unless it may have been invalidated meanwhile"""
+        if self.subscribed.is_set() and self._epoch == epoch:
+            self.lru.set(key, value, timeout)
+
+    def publish(self, client_factory, keys):
+        if self.breaker.state != 'closed':
+            # Nobody can be subscribed through a Redis we cannot reach
+            self.count('invalidations_failed')
+            return
+        try:
+            client_factory().publish(self.channel, json.dumps({'origin': self.origin, 'keys': keys}))
+            self.count('invalidations_sent')
+        except RedisError:
+            # Other processes catch up within L1_TIMEOUT
+            self.count('invalidations_failed')
+
+    def _listen(self, client_factory):
+        pid = os.getpid()
+        while pid == os.getpid():
+            pubsub = None
+            try:
+                pubsub = client_factory().pubsub()
+                pubsub.subscribe(self.channel)
+                last_ping = time.monotonic()
+                while pid == os.getpid():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        if time.monotonic() - last_ping > PING_INTERVAL:
+                            pubsub.ping()
+                            last_ping = time.monotonic()
+                    elif message['type'] == 'subscribe':
+                        # Anything cached before now may have missed an invalidation
+                        self.lru.clear()
+                        self.subscribed.set()
+                    elif message['type'] == 'message':
+                        last_ping = time.monotonic()
+                        self._handle(message['data'])
+            except (RedisError, OSError):
+                pass
+            finally:
+                self.subscribed.clear()
+                self.lru.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except (RedisError, OSError):
+                        pass
+            time.sleep(RECONNECT_DELAY)
+
+    def _handle(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        self._epoch += 1
+        if message.get('origin') == self.origin:
+            return
+        self.count('invalidations_received')
+        keys = message.get('keys') or []
+        if '*' in keys:
+            self.lru.clear()
+        for key in keys:
+            self.lru.delete(key)
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """
+    Django cache backend: ``django_redis`` RedisCache with an in-process L1.
+
+    Takes the RedisCache settings plus these OPTIONS: ``L1_KEY_PREFIXES``
+    (keys to keep locally; empty disables L1), ``L1_TIMEOUT`` (seconds),
+    ``L1_MAX_ENTRIES``, ``L1_MAX_BYTES``, ``L1_CHANNEL``,
+    ``BREAKER_THRESHOLD``, ``BREAKER_COOLDOWN`` and ``FALLBACK_TIMEOUT``.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        options = dict(params.get('OPTIONS') or {})
+        self.l1_prefixes = tuple(options.pop('L1_KEY_PREFIXES', ()))
+        self.l1_timeout = options.pop('L1_TIMEOUT', 30)
+        self.fallback_timeout = options.pop('FALLBACK_TIMEOUT', 30)
+        max_entries = options.pop('L1_MAX_ENTRIES', 1000)
+        max_bytes = options.pop('L1_MAX_BYTES', 16 * 1024 * 1024)
+        channel = options.pop('L1_CHANNEL', f"{params.get('KEY_PREFIX', '')}:cache-invalidation")
+        breaker = (options.pop('BREAKER_THRESHOLD', 3), options.pop('BREAKER_COOLDOWN', 5))
+        self._l2 = RedisCache(server, dict(params, OPTIONS=options))
+        # Django builds a backend per thread; they all share this process's L1
+        with _tiers_lock:
+            self._tier = _tiers.setdefault((str(server), channel), LocalTier(channel, max_entries, max_bytes, *breaker))
+
+    @property
+    def client(self):
+        """The django_redis client, so get_redis_connection() keeps working"""
+        return self._l2.client
+
+    def __getattr__(self, name):
+        # Other django_redis extras (ttl, lock, iter_keys, ...) go to Redis directly
+        if name == '_l2':
+            raise AttributeError(name)
+        return getattr(self._l2, name)
+
+    def _redis(self):
+        return self._l2.client.get_client(write=True)
+
+    def _call(self, method, *args, **kwargs):
+        """Call the Redis backend through the circuit breaker"""
+        tier = self._tier
+        if not tier.breaker.allow():
+            tier.count('l2_short_circuits')
+            raise RedisConnectionError('Redis circuit breaker is open')
+        try:
+            result = getattr(self._l2, method)(*args, **kwargs)
+        except RedisError:
+            tier.count('l2_errors')
+            if tier.breaker.failed():
+                tier.count('breaker_opened')
+            raise
+        if tier.breaker.succeeded():
+            # Redis is back; its data wins over what was kept locally meanwhile
+            tier.fallback.clear()
+            tier.count('breaker_closed')
+        return result
+
+    def _local(self, key):
+        return bool(self.l1_prefixes) and key.startswith(self.l1_prefixes)
+
+    def _full_key(self, key, version):
+        return self._l2.make_and_validate_key(key, version=version)
+
+    def _capped_timeout(self, timeout, cap):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return cap if timeout is None else min(cap, timeout)
+
+    def _invalidate(self, full_keys):
+        if '*' in full_keys:
+            self._tier.lru.clear()
+        for full_key in full_keys:
+            self._tier.lru.delete(full_key)
+        self._tier.publish(self._redis, full_keys)
+
+    def _write_fallback(self, full_key, value, timeout):
+        """Keep a value of an L1 key in this process while Redis cannot take it"""
+        self._tier.fallback.set(full_key, value, self._capped_timeout(timeout, self.fallback_timeout))
+        self._tier.lru.set(full_key, value, self._capped_timeout(timeout, self.l1_timeout))
+
+    def _read_fallback(self, full_key, default):
+        value = self._tier.fallback.get(full_key)
+        if value is _MISSING:
+            self._tier.count('fallback_misses')
+            return default
+        self._tier.count('fallback_hits')
+        return value
+
+    def _read_l2(self, key, version, default):
+        value = self._call('get', key, _MISSING, version=version)
+        if value is _MISSING:
+            self._tier.count('l2_misses')
+            return default
+        self._tier.count('l2_hits')
+        return value
+
+    def get(self, key, default=None, version=None):
+        if not self._local(key):
+            return self._read_l2(key, version, default)
+        full_key = self._full_key(key, version)
+        if not self._tier.usable(self._redis):
+            self._tier.count('l1_bypassed')
+            try:
+                return self._read_l2(key, version, default)
+            except RedisError:
+                return self._read_fallback(full_key, default)
+        value = self._tier.lru.get(full_key)
+        if value is not _MISSING:
+            self._tier.count('l1_hits')
+            return value
+        self._tier.count('l1_misses')
+        epoch = self._tier.epoch
+        try:
+            value = self._read_l2(key, version, _MISSING)
+        except RedisError:
+            return self._read_fallback(full_key, default)
+        if value is _MISSING:
+            return default
+        self._tier.fill(full_key, value, self.l1_timeout, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        remote = keys
+        usable = any(self._local(key) for key in keys) and self._tier.usable(self._redis)
+        if usable:
+            remote = []
+            for key in keys:
+                value = self._tier.lru.get(self._full_key(key, version)) if self._local(key) else _MISSING
+                if value is _MISSING:
+                    remote.append(key)
+                    if self._local(key):
+                        self._tier.count('l1_misses')
+                else:
+                    found[key] = value
+                    self._tier.count('l1_hits')
+        if remote:
+            epoch = self._tier.epoch
+            try:
+                fetched = self._call('get_many', remote, version=version)
+            except RedisError:
+                if not any(self._local(key) for key in remote):
+                    raise
+                # Serve what the fallback has; keys it cannot hold are simply missing
+                for key in filter(self._local, remote):
+                    value = self._read_fallback(self._full_key(key, version), _MISSING)
+                    if value is not _MISSING:
+                        found[key] = value
+                return found
+            self._tier.count('l2_hits', len(fetched))
+            self._tier.count('l2_misses', len(remote) - len(fetched))
+            for key, value in fetched.items():
+                if usable and self._local(key):
+                    self._tier.fill(self._full_key(key, version), value, self.l1_timeout, epoch)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        if self._local(key):
+            full_key = self._full_key(key, version)
+            if self._tier.usable(self._redis) and self._tier.lru.get(full_key) is not _MISSING:
+                return True
+            try:
+                return self._call('has_key', key, version=version)
+            except RedisError:
+                return self._tier.fallback.get(full_key) is not _MISSING
+        return self._call('has_key', key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self._call('set', key, value, timeout=timeout, version=version)
+        full_key = self._full_key(key, version)
+        try:
+            result = self._call('set', key, value, timeout=timeout, version=version)
+        except RedisError:
+            self._write_fallback(full_key, value, timeout)
+            return False
+        self._invalidate([full_key])
+        if self._tier.usable(self._redis):
+            self._tier.lru.set(full_key, value, self._capped_timeout(timeout, self.l1_timeout))
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self._call('add', key, value, timeout=timeout, version=version)
+        full_key = self._full_key(key, version)
+        try:
+            added = self._call('add', key, value, timeout=timeout, version=version)
+        except RedisError:
+            if self._tier.fallback.get(full_key) is not _MISSING:
+                return False
+            self._write_fallback(full_key, value, timeout)
+            return True
+        if added:
+            # Another process may still hold a copy that outlived the Redis entry
+            self._invalidate([full_key])
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        local = [key for key in data if self._local(key)]
+        try:
+            failed = self._call('set_many', data, timeout=timeout, version=version)
+        except RedisError:
+            for key in local:
+                self._write_fallback(self._full_key(key, version), data[key], timeout)
+            if len(local) < len(data):
+                raise
+            # Not in Redis, as set() returning False says
+            return local
+        if local:
+            self._invalidate([self._full_key(key, version) for key in local])
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self._call('touch', key, timeout=timeout, version=version)
+        try:
+            return self._call('touch', key, timeout=timeout, version=version)
+        except RedisError:
+            full_key = self._full_key(key, version)
+            value = self._tier.fallback.get(full_key)
+            if value is _MISSING:
+                return False
+            self._write_fallback(full_key, value, timeout)
+            return True
+
+    def delete(self, key, version=None):
+        if not self._local(key):
+            return self._call('delete', key, version=version)
+        full_key = self._full_key(key, version)
+        self._tier.fallback.delete(full_key)
+        try:
+            deleted = self._call('delete', key, version=version)
+        except RedisError:
+            self._tier.lru.delete(full_key)
+            return False
+        self._invalidate([full_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        local = [self._full_key(key, version) for key in keys if self._local(key)]
+        for full_key in local:
+            self._tier.fallback.delete(full_key)
+        try:
+            result = self._call('delete_many', keys, version=version)
+        except RedisError:
+            for full_key in local:
+                self._tier.lru.delete(full_key)
+            if len(local) < len(keys):
+                raise
+            return 0
+        if local:
+            self._invalidate(local)
+        return result
+
+    def incr(self, key, delta=1, version=None):
+        if not self._local(key):
+            return self._call('incr', key, delta, version=version)
+        full_key = self._full_key(key, version)
+        try:
+            value = self._call('incr', key, delta, version=version)
+        except RedisError:
+            current = self._tier.fallback.get(full_key)
+            if current is _MISSING:
+                # Whether Redis has the key is unknown, so neither a new value nor ValueError
+                raise
+            value = current + delta
+            self._write_fallback(full_key, value, None)
+            return value
+        self._invalidate([full_key])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def delete_pattern(self, *args, **kwargs):
+        result = self._call('delete_pattern', *args, **kwargs)
+        self._invalidate(['*'])
+        return result
+
+    def clear(self):
+        # Emptied even if Redis is not, which then raises as for other keys
+        self._tier.fallback.clear()
+        self._tier.lru.clear()
+        result = self._call('clear')
+        self._invalidate(['*'])
+        return result
+
+    def close(self, **kwargs):
+        self._l2.close(**kwargs)
+
+    def count(self, name, amount=1):
+        """Add to one of the counters ``tier_stats`` returns"""
+        self._tier.count(name, amount)
+
+    def tier_stats(self):
+        """Hit/miss counters per tier, errors, breaker state and sizes, for this process"""
+        tier = self._tier
+        with tier._lock:
+            stats = dict(tier.counters)
+        stats.update(
+            l1_entries=len(tier.lru),
+            l1_bytes=tier.lru.bytes,
+            l1_evictions=tier.lru.evictions,
+            l1_subscribed=tier.subscribed.is_set(),
+            fallback_entries=len(tier.fallback),
+            breaker=tier.breaker.state,
+        )
+        return stats
@@ -109,12 +109,23 @@ else:
     }
 
 # Redis Cache
+# Redis, with an in-process LRU in front for hot, rarely changing keys (petshop/cache.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'petshop.cache.TieredCache',
         'LOCATION': config('REDIS_URL', default='redis://localhost:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'L1_KEY_PREFIXES': ['featured_products', 'catalog_changed_at', 'catalog_listing_changed_at', 'auth_user:'],
+            'L1_TIMEOUT': config('CACHE_L1_TIMEOUT', default=30, cast=int),
+            'L1_MAX_ENTRIES': config('CACHE_L1_MAX_ENTRIES', default=1000, cast=int),
+            'L1_MAX_BYTES': config('CACHE_L1_MAX_BYTES', default=16 * 1024 * 1024, cast=int),
+            # A slow or unreachable Redis must not hold requests for long
+            'SOCKET_CONNECT_TIMEOUT': config('REDIS_CONNECT_TIMEOUT', default=0.25, cast=float),
+            'SOCKET_TIMEOUT': config('REDIS_SOCKET_TIMEOUT', default=0.5, cast=float),
+            'BREAKER_THRESHOLD': config('REDIS_BREAKER_THRESHOLD', default=3, cast=int),
+            'BREAKER_COOLDOWN': config('REDIS_BREAKER_COOLDOWN', default=5, cast=float),
+            'FALLBACK_TIMEOUT': config('CACHE_FALLBACK_TIMEOUT', default=30, cast=int),
         }
     }
 }
@@ -123,6 +134,13 @@ CACHES = {
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
 
+# request.user is read from the cache instead of the database on every request
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=300, cast=int)
+
+# Flash messages travel in a signed cookie, so they never cause a session write
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -152,9 +170,22 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# collectstatic writes content-hashed, precompressed (.gz) copies that WhiteNoise
+# and nginx (gzip_static) can serve with far-future expiry
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': config('STATICFILES_BACKEND', default='whitenoise.storage.CompressedManifestStaticFilesStorage'),
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Turn off where a web server serves MEDIA_ROOT itself (docker-compose.prod.yml)
+SERVE_MEDIA = config('SERVE_MEDIA', default=True, cast=bool)
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -177,4 +208,35 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 
 # Cache timeout
-CACHE_TTL = config('CACHE_TTL', default=300, cast=int) 
\ No newline at end of file
+CACHE_TTL = config('CACHE_TTL', default=300, cast=int)
+
+# Products at or below this quantity show up in the low-stock report
+LOW_STOCK_THRESHOLD = config('LOW_STOCK_THRESHOLD', default=5, cast=int)
+
+# Cart lines hold their stock for this many seconds ('redis' or 'database' store)
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=900, cast=int)
+STOCK_RESERVATION_BACKEND = config('STOCK_RESERVATION_BACKEND', default='redis')
+
+# Checkout responses are replayed for retries with the same idempotency key
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=int)
+
+# Background jobs run by `manage.py run_jobs` ('redis' or 'database' queue)
+JOB_QUEUE_BACKEND = config('JOB_QUEUE_BACKEND', default='redis')
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_BATCH_SIZE = config('JOB_BATCH_SIZE', default=100, cast=int)
+
+# Shared caches (nginx) may keep anonymous catalog pages this many seconds
+CATALOG_CACHE_MAX_AGE = config('CATALOG_CACHE_MAX_AGE', default=60, cast=int)
+
+# Each worker keeps the catalog in memory and lists products without queries (shop/snapshot.py)
+CATALOG_SNAPSHOT = config('CATALOG_SNAPSHOT', default=False, cast=bool)
+CATALOG_SNAPSHOT_MAX_PRODUCTS = config('CATALOG_SNAPSHOT_MAX_PRODUCTS', default=50000, cast=int)
+
+# Search suggestions: rebuild the per-worker index this often for popularity; browsers and nginx keep answers this long
+AUTOCOMPLETE_REFRESH = config('AUTOCOMPLETE_REFRESH', default=300, cast=int)
+AUTOCOMPLETE_MAX_AGE = config('AUTOCOMPLETE_MAX_AGE', default=300, cast=int)
+
+# Orders: monthly PostgreSQL partitions created this many months ahead, and where archive_orders writes closed months
+ORDER_PARTITION_MONTHS_AHEAD = config('ORDER_PARTITION_MONTHS_AHEAD', default=3, cast=int)
+ORDER_ARCHIVE_DIR = config('ORDER_ARCHIVE_DIR', default=str(BASE_DIR / 'order_archive'))
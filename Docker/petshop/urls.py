@@ -23,10 +23,11 @@ urlpatterns = [
 from django.views.static import serve
 from django.urls import re_path
 
-# Force media serving in production
-urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-]
+# Serve media from Django unless a web server in front does it
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
 
 # Serve static files only in debug mode
 if settings.DEBUG:
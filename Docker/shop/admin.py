@@ -1,5 +1,18 @@
-from django.contrib import admin
+import io
+from decimal import Decimal
+
+from django.contrib import admin, messages
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, NullIf, Round
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
+from .catalog import invalidate_catalog
+from .changelists import IndexedSearchMixin, ScalableModelAdmin
+from .forms import CatalogImportForm, ProductActionForm
+from .importers import CatalogImporter, FEED_READERS, detect_format
+from .inventory import DISCONTINUED, IN_STOCK, OUT_OF_STOCK, adjust_stock, low_stock_products, low_stock_threshold
 from .models import Category, Product, ProductImage, Review, Cart, CartItem, Wishlist
 
 
@@ -12,20 +25,49 @@ class CategoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+class StockLevelFilter(admin.SimpleListFilter):
+    title = 'stock level'
+    parameter_name = 'stock_level'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('low', f'Low (≤ {low_stock_threshold()})'),
+            ('sold_out', 'Sold out'),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'low':
+            return queryset.filter(pk__in=low_stock_products().values('pk'))
+        if self.value() == 'sold_out':
+            return queryset.filter(is_active=True, stock_status='out_of_stock')
+        return queryset
+
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(IndexedSearchMixin, ScalableModelAdmin):
     list_display = ['name', 'category', 'price', 'discount_price', 'stock_quantity', 'stock_status', 'is_featured', 'is_active']
-    list_filter = ['category', 'stock_status', 'is_featured', 'is_active', 'created_at']
+    list_filter = ['category', 'stock_status', StockLevelFilter, 'is_featured', 'is_active']
     list_editable = ['price', 'discount_price', 'stock_quantity', 'stock_status', 'is_featured', 'is_active']
-    search_fields = ['name', 'description', 'brand']
+    list_select_related = ['category']
+    date_hierarchy = 'created_at'
+    search_fields = ['name', 'brand']
+    # Matches product_search_idx (shop migration 0004)
+    search_vector = """to_tsvector('simple', "shop_product"."name" || ' ' || "shop_product"."brand")"""
+    search_exact_fields = ['slug']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at', 'updated_at']
     inlines = [ProductImageInline]
+    change_list_template = 'admin/shop/product/change_list.html'
+    action_form = ProductActionForm
+    actions = [
+        'apply_discount', 'clear_discount', 'feature', 'unfeature',
+        'change_stock', 'discontinue', 'reinstate',
+    ]
     
     fieldsets = (
         ('Basic Information', {
@@ -49,12 +91,133 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    # Bulk actions: each is a single UPDATE over the selection, followed by
+    # one catalog cache invalidation
+
+    def _amount(self, request):
+        try:
+            return int(request.POST.get('amount', ''))
+        except ValueError:
+            self.message_user(request, 'Enter a number in the amount box for this action.', messages.ERROR)
+            return None
+
+    def _bulk_update(self, request, queryset, message, **values):
+        count = queryset.update(updated_at=timezone.now(), **values)
+        invalidate_catalog()
+        self.message_user(request, f'{count} product(s) {message}.', messages.SUCCESS)
+
+    @admin.action(description='Discount selected products by amount %%')
+    def apply_discount(self, request, queryset):
+        percent = self._amount(request)
+        if percent is None:
+            return
+        if not 0 < percent < 100:
+            self.message_user(request, 'The discount must be between 1 and 99 percent.', messages.ERROR)
+            return
+        # Multiplier computed here so no database does integer division
+        discount_price = Round(
+            F('price') * Value(Decimal(100 - percent) / 100), 2,
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        self._bulk_update(request, queryset, f'discounted by {percent}%', discount_price=discount_price)
+
+    @admin.action(description='Remove discount from selected products')
+    def clear_discount(self, request, queryset):
+        self._bulk_update(request, queryset, 'back at full price', discount_price=None)
+
+    @admin.action(description='Feature selected products')
+    def feature(self, request, queryset):
+        self._bulk_update(request, queryset, 'featured', is_featured=True)
+
+    @admin.action(description='Stop featuring selected products')
+    def unfeature(self, request, queryset):
+        self._bulk_update(request, queryset, 'no longer featured', is_featured=False)
+
+    @admin.action(description='Add amount units to stock (negative removes)')
+    def change_stock(self, request, queryset):
+        delta = self._amount(request)
+        if delta is None:
+            return
+        count = adjust_stock(queryset, delta)
+        invalidate_catalog()
+        self.message_user(request, f'Stock of {count} product(s) changed by {delta:+d}.', messages.SUCCESS)
+
+    @admin.action(description='Discontinue selected products')
+    def discontinue(self, request, queryset):
+        self._bulk_update(request, queryset, 'discontinued', stock_status=DISCONTINUED)
+
+    @admin.action(description='Reinstate selected products (status from stock)')
+    def reinstate(self, request, queryset):
+        stock_status = Case(
+            When(stock_quantity__gt=0, then=Value(IN_STOCK)),
+            default=Value(OUT_OF_STOCK),
+        )
+        self._bulk_update(request, queryset.filter(stock_status=DISCONTINUED), 'reinstated', stock_status=stock_status)
+
+    def get_urls(self):
+        urls = [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_feed_view),
+                name='shop_product_import',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_feed_view(self, request):
+        """Upload a catalog feed and apply it in bulk"""
+        if not self.has_change_permission(request):
+            return redirect('admin:shop_product_changelist')
+
+        if request.method == 'POST':
+            form = CatalogImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                upload = form.cleaned_data['feed']
+                feed_format = form.cleaned_data['format'] or detect_format(upload.name)
+                # Uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE live in a temp
+                # file, so wrapping it keeps the import streaming
+                stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+                importer = CatalogImporter(
+                    dry_run=form.cleaned_data['dry_run'],
+                    create=form.cleaned_data['create_missing'],
+                )
+                result = importer.run(FEED_READERS[feed_format](stream))
+
+                prefix = '[dry run] ' if importer.dry_run else ''
+                level = messages.WARNING if result.rejected else messages.SUCCESS
+                self.message_user(request, prefix + result.summary(), level)
+                for reject in result.rejects[:10]:
+                    self.message_user(
+                        request,
+                        f"Line {reject['line']} ({reject['slug'] or 'no slug'}): {reject['error']}",
+                        messages.WARNING,
+                    )
+                return redirect('admin:shop_product_changelist')
+        else:
+            form = CatalogImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import catalog feed',
+            'form': form,
+        }
+        return render(request, 'admin/shop/product/import_feed.html', context)
+
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(IndexedSearchMixin, ScalableModelAdmin):
     list_display = ['product', 'user', 'rating', 'title', 'is_verified_purchase', 'created_at']
-    list_filter = ['rating', 'is_verified_purchase', 'created_at']
+    list_filter = ['rating', 'is_verified_purchase']
+    list_select_related = ['product', 'user']
+    date_hierarchy = 'created_at'
     search_fields = ['product__name', 'user__username', 'title', 'comment']
+    # Matches review_search_idx (shop migration 0004)
+    search_vector = """to_tsvector('simple', "shop_review"."title" || ' ' || "shop_review"."comment")"""
+    search_exact_fields = ['product__slug', 'user__username']
+    # Products found through product_search_idx, then their reviews by product_id
+    search_related_vectors = {'product': ProductAdmin.search_vector}
+    raw_id_fields = ['product', 'user']
     readonly_fields = ['created_at', 'updated_at']
 
 
@@ -65,17 +228,40 @@ class CartItemInline(admin.TabularInline):
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'total_items', 'total_price', 'created_at']
+class CartAdmin(IndexedSearchMixin, ScalableModelAdmin):
+    list_display = ['user', 'item_quantity', 'cart_value', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['user']
     search_fields = ['user__username']
+    search_exact_fields = ['user__username']
     readonly_fields = ['created_at', 'updated_at', 'total_items', 'total_price']
+    raw_id_fields = ['user']
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        # Totals for the whole page in the changelist query instead of two queries per cart
+        unit_price = Coalesce(NullIf('items__product__discount_price', 0), 'items__product__price')
+        return super().get_queryset(request).annotate(
+            item_quantity=Sum('items__quantity'),
+            cart_value=Sum(
+                F('items__quantity') * unit_price,
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    @admin.display(description='Total items', ordering='item_quantity')
+    def item_quantity(self, obj):
+        return obj.item_quantity or 0
+
+    @admin.display(description='Total price', ordering='cart_value')
+    def cart_value(self, obj):
+        return round(obj.cart_value or 0, 2)
+
 
 @admin.register(Wishlist)
 class WishlistAdmin(admin.ModelAdmin):
     list_display = ['user', 'created_at']
+    list_select_related = ['user']
     list_filter = ['created_at']
     search_fields = ['user__username']
     filter_horizontal = ['products']
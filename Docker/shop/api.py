@@ -0,0 +1,292 @@
+"""
+Read-only JSON API for the catalog: categories, product listings and details.
+
+Every endpoint takes ``fields=`` (comma-separated) to return only some
+fields, and only the columns behind those fields are selected.  Products
+can be fetched in a batch with ``ids=`` or ``slugs=``, in one query, in the
+order asked for.  Listings take the same ``category``, ``search`` and
+``sort`` parameters as ``product_list``.
+
+Responses do not depend on the visitor.  Their ETag is derived from the
+catalog change stamp and the URL, so revalidating an unchanged response is
+a 304 without a database query, and shared caches may keep them for
+``CATALOG_CACHE_MAX_AGE`` seconds.  Bodies are encoded with orjson when it
+is installed, otherwise with the standard library, both without whitespace.
+"""
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache, wraps
+
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .cards import on_sale, percent_off, rating_subqueries
+from .catalog import catalog_changed_at
+from .http_caching import catalog_cache_max_age
+from .models import Category, Product, ProductImage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Most products a listing page or a batch may return
+MAX_PAGE_SIZE = 100
+DEFAULT_PAGE_SIZE = 24
+
+
+class InvalidParameter(Exception):
+    """A query parameter the API cannot serve; answered with 400"""
+
+
+def _default(value):
+    # Decimals as strings, so prices keep their exact value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Compact JSON bytes for ``data``"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+@lru_cache(maxsize=None)
+def _url_parts(name):
+    # reverse() once per URL name rather than per row; slugs need no quoting
+    return tuple(reverse(name, args=['slug']).rsplit('slug', 1))
+
+
+def _product_url(slug):
+    return slug.join(_url_parts('shop:product_detail'))
+
+
+def _category_url(slug):
+    return slug.join(_url_parts('shop:category_detail'))
+
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+class ApiField:
+    """Where an API field comes from: a column (or lookup), or an expression, and a conversion"""
+    __slots__ = ('source', 'expression', 'convert')
+
+    def __init__(self, source, expression=None, convert=None):
+        self.source = source
+        self.expression = expression
+        self.convert = convert
+
+
+PRODUCT_FIELDS = {
+    'id': ApiField('id'),
+    'name': ApiField('name'),
+    'slug': ApiField('slug'),
+    'url': ApiField('slug', convert=_product_url),
+    'category': ApiField('category__slug'),
+    'brand': ApiField('brand'),
+    'age_group': ApiField('age_group'),
+    'description': ApiField('description'),
+    'price': ApiField('price'),
+    'discount_price': ApiField('discount_price'),
+    'on_sale': ApiField('on_sale', on_sale, bool),
+    'discount_percentage': ApiField('discount_percentage', percent_off),
+    'image': ApiField('image', convert=_media_url),
+    'stock_status': ApiField('stock_status'),
+    'weight': ApiField('weight'),
+    'is_featured': ApiField('is_featured'),
+    'avg_rating': ApiField('avg_rating', lambda: rating_subqueries()[0]),
+    'reviews_count': ApiField('reviews_count', lambda: rating_subqueries()[1]),
+    'created_at': ApiField('created_at'),
+    'updated_at': ApiField('updated_at'),
+    # Filled in from one more query, see _add_images
+    'images': ApiField('id'),
+}
+
+CATEGORY_FIELDS = {
+    'id': ApiField('id'),
+    'name': ApiField('name'),
+    'slug': ApiField('slug'),
+    'url': ApiField('slug', convert=_category_url),
+    'description': ApiField('description'),
+    'image': ApiField('image', convert=_media_url),
+}
+
+# What a listing returns without fields=: what a product card shows
+LIST_FIELDS = (
+    'id', 'name', 'slug', 'url', 'category', 'price', 'discount_price', 'on_sale', 'discount_percentage',
+    'image', 'avg_rating', 'reviews_count',
+)
+DETAIL_FIELDS = tuple(PRODUCT_FIELDS)
+
+
+def requested_fields(request, registry, default):
+    """The fields named by ?fields=, or ``default``"""
+    value = request.GET.get('fields')
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in registry]
+    if unknown:
+        raise InvalidParameter(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def select(queryset, registry, fields, extra=()):
+    """``values()`` of ``queryset`` with the columns and expressions behind ``fields``, plus ``extra``"""
+    columns = dict.fromkeys(extra)
+    annotations = {}
+    for name in fields:
+        field = registry[name]
+        if field.expression is None:
+            columns[field.source] = None
+        else:
+            annotations[field.source] = field.expression()
+    return queryset.annotate(**annotations).values(*columns, *annotations)
+
+
+def serialize(rows, registry, fields):
+    """API objects with ``fields`` from ``select()`` rows"""
+    plan = [(name, registry[name].source, registry[name].convert) for name in fields if name != 'images']
+    objects = []
+    for row in rows:
+        obj = {}
+        for name, source, convert in plan:
+            obj[name] = row[source] if convert is None else convert(row[source])
+        objects.append(obj)
+    return objects
+
+
+def _add_images(objects, rows, fields):
+    """Fill in the gallery of each product, with one query for all of them"""
+    if 'images' not in fields:
+        return
+    images = {row['id']: [] for row in rows}
+    for product_id, image, alt_text in ProductImage.objects.filter(product__in=images).order_by('pk').values_list(
+        'product_id', 'image', 'alt_text',
+    ):
+        images[product_id].append({'image': _media_url(image), 'alt_text': alt_text})
+    for obj, row in zip(objects, rows):
+        obj['images'] = images[row['id']]
+
+
+def product_objects(rows, fields):
+    """API objects with ``fields`` from ``select()`` rows of products"""
+    objects = serialize(rows, PRODUCT_FIELDS, fields)
+    _add_images(objects, rows, fields)
+    return objects
+
+
+def _page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidParameter('page_size must be a number')
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def _batch_keys(request):
+    """('id' or 'slug', the values asked for), or None for a listing"""
+    for param, key in (('ids', 'id'), ('slugs', 'slug')):
+        value = request.GET.get(param)
+        if value is None:
+            continue
+        values = list(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+        if len(values) > MAX_PAGE_SIZE:
+            raise InvalidParameter(f'At most {MAX_PAGE_SIZE} {param} per request')
+        if key == 'id':
+            try:
+                values = [int(item) for item in values]
+            except ValueError:
+                raise InvalidParameter('ids must be numbers')
+        return key, values
+    return None
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+def _etag(request, *args, **kwargs):
+    return hashlib.md5(f'{catalog_changed_at()}:{request.get_full_path()}'.encode()).hexdigest()
+
+
+def catalog_api(view):
+    """GET-only JSON endpoint: 400 for bad parameters, 304 for unchanged data, publicly cacheable"""
+    conditional_view = condition(etag_func=_etag)(view)
+
+    @require_GET
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            response = conditional_view(request, *args, **kwargs)
+        except InvalidParameter as error:
+            return json_response({'error': str(error)}, status=400)
+        if response.status_code in (200, 304):
+            # Browsers revalidate every time; shared caches may keep the response briefly
+            patch_cache_control(response, public=True, max_age=0, s_maxage=catalog_cache_max_age())
+        return response
+    return wrapped
+
+
+@catalog_api
+def categories(request):
+    """All categories"""
+    fields = requested_fields(request, CATEGORY_FIELDS, tuple(CATEGORY_FIELDS))
+    rows = select(Category.objects.order_by('name'), CATEGORY_FIELDS, fields)
+    return json_response({'results': serialize(rows, CATEGORY_FIELDS, fields)})
+
+
+@catalog_api
+def products(request):
+    """A page of the listing, or a batch of products by ?ids= or ?slugs="""
+    batch = _batch_keys(request)
+    if batch is not None:
+        key, values = batch
+        fields = requested_fields(request, PRODUCT_FIELDS, DETAIL_FIELDS)
+        rows = list(select(
+            Product.objects.filter(is_active=True, **{f'{key}__in': values}).order_by(), PRODUCT_FIELDS, fields,
+            ('id', key),
+        ))
+        found = {row[key]: obj for row, obj in zip(rows, product_objects(rows, fields))}
+        return json_response({
+            'results': [found[value] for value in values if value in found],
+            'missing': [value for value in values if value not in found],
+        })
+
+    fields = requested_fields(request, PRODUCT_FIELDS, LIST_FIELDS)
+    listing = Product.objects.available().listing(
+        request.GET.get('category'), request.GET.get('search'), request.GET.get('sort', 'name'),
+    )
+    # The paginator's COUNT leaves out the selected expressions
+    paginator = Paginator(select(listing, PRODUCT_FIELDS, fields, ('id',)), _page_size(request))
+    page_obj = paginator.get_page(request.GET.get('page'))
+    rows = list(page_obj.object_list)
+    return json_response({
+        'count': paginator.count,
+        'page': page_obj.number,
+        'pages': paginator.num_pages,
+        'results': product_objects(rows, fields),
+    })
+
+
+@catalog_api
+def product_detail(request, slug):
+    """One active product"""
+    fields = requested_fields(request, PRODUCT_FIELDS, DETAIL_FIELDS)
+    rows = list(select(Product.objects.filter(slug=slug, is_active=True), PRODUCT_FIELDS, fields, ('id',)))
+    if not rows:
+        return json_response({'error': 'No such product'}, status=404)
+    return json_response(product_objects(rows, fields)[0])
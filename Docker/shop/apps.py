@@ -3,4 +3,8 @@ from django.apps import AppConfig
  
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'shop' 
\ No newline at end of file
+    name = 'shop'
+
+    def ready(self):
+        import shop.catalog  # Import to register signals
+        import shop.session_cart  # Import to register signals
@@ -0,0 +1,192 @@
+"""
+Search-as-you-type suggestions over product names, brands and categories.
+
+Each worker keeps a ``SuggestionIndex``: every word-start suffix of every
+name ("adjustable dog collar", "dog collar", "collar"), normalised and kept
+in one sorted list.  The names starting with a prefix are a contiguous run
+of that list, found with two bisections.  Suggestions are ranked once, at
+build time, by units sold over the last ``POPULARITY_DAYS`` days (brands and
+categories by the sum over their products), so a lookup only has to pick the
+best ranks in the run.  Runs longer than ``SCAN_LIMIT`` have their best
+ranks precomputed, which bounds every lookup to a few hundred entries.
+
+The index is rebuilt when the product listings change (``listing_changed_at``,
+which sales that leave a product in stock do not move) or when it is older
+than ``AUTOCOMPLETE_REFRESH`` seconds, so popularity follows sales.  The
+rebuild runs in a background thread and requests keep using the old index
+until the new one replaces it.  Only a worker's first index is built inside
+a request, as there is nothing to answer from before it.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .catalog import listing_changed_at, rebuild_in_background
+from .models import Category, Product
+
+
+logger = logging.getLogger(__name__)
+
+POPULARITY_DAYS = 90
+# Most suggestions a lookup can return
+MAX_RESULTS = 10
+# Longer runs of matching names get their best ranks precomputed
+SCAN_LIMIT = 256
+# Names are indexed from each word up to this many characters
+KEY_LENGTH = 48
+
+WORD_START = re.compile(r'\b\w')
+# Sorts after every character a prefix can continue with
+PREFIX_END = '\U0010ffff'
+
+
+def autocomplete_refresh():
+    return getattr(settings, 'AUTOCOMPLETE_REFRESH', 300)
+
+
+def autocomplete_max_age():
+    return getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 300)
+
+
+def normalize(text):
+    """Case- and whitespace-insensitive form used for names and queries"""
+    return ' '.join(text.casefold().split())
+
+
+class SuggestionIndex:
+    """Sorted word-start keys of every suggestion, with their popularity ranks"""
+
+    def __init__(self, generation, suggestions):
+        """``suggestions`` is an iterable of (popularity, dict to return); higher popularity first"""
+        self.generation = generation
+        self.built_at = time.monotonic()
+        # Rank 0 is the most popular; the label breaks ties so the order is stable
+        ranked = sorted(suggestions, key=lambda item: (-item[0], item[1]['label']))
+        self.suggestions = tuple(suggestion for _, suggestion in ranked)
+
+        pairs = set()
+        for rank, suggestion in enumerate(self.suggestions):
+            name = normalize(suggestion['label'])
+            for match in WORD_START.finditer(name):
+                pairs.add((name[match.start():match.start() + KEY_LENGTH], rank))
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.ranks = [rank for _, rank in pairs]
+        self.top = {}
+        self._precompute('', 0, len(self.keys))
+
+    def _best(self, ranks):
+        return heapq.nsmallest(MAX_RESULTS, set(ranks))
+
+    def _precompute(self, prefix, lo, hi):
+        """Best ranks of every prefix matching more than SCAN_LIMIT keys, from its children"""
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(self.ranks[lo:hi])
+        depth = len(prefix)
+        candidates = []
+        position = lo
+        # Keys equal to the prefix sort first
+        while position < hi and len(self.keys[position]) == depth:
+            candidates.append(self.ranks[position])
+            position += 1
+        while position < hi:
+            child = prefix + self.keys[position][depth]
+            end = bisect_left(self.keys, child + PREFIX_END, position, hi)
+            candidates.extend(self._precompute(child, position, end))
+            position = end
+        best = self._best(candidates)
+        self.top[prefix] = best
+        return best
+
+    def lookup(self, query, limit=MAX_RESULTS):
+        """The ``limit`` most popular suggestions with a word starting with ``query``"""
+        prefix = normalize(query)[:KEY_LENGTH]
+        if not prefix:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + PREFIX_END, lo)
+        if hi - lo > SCAN_LIMIT:
+            best = self.top[prefix]
+        else:
+            best = self._best(self.ranks[lo:hi])
+        return [self.suggestions[rank] for rank in best[:limit]]
+
+
+def build_index(generation):
+    since = timezone.localdate() - timedelta(days=POPULARITY_DAYS)
+    # Imported here: orders depends on shop, not the other way round
+    from orders.models import DailyProductSales
+    sold = dict(
+        DailyProductSales.objects.filter(day__gte=since, product__isnull=False)
+        .values_list('product').annotate(units=Sum('units')).order_by()
+    )
+
+    categories = {category.pk: category for category in Category.objects.all()}
+    brand_units = defaultdict(int)
+    category_units = defaultdict(int)
+    suggestions = []
+    # reverse() once rather than per product; slugs need no quoting
+    detail_url = reverse('shop:product_detail', args=['slug']).rsplit('slug', 1)
+    for product_id, name, slug, brand, category_id in Product.objects.available().values_list(
+        'id', 'name', 'slug', 'brand', 'category_id',
+    ).order_by():
+        units = sold.get(product_id, 0)
+        suggestions.append((units, {
+            'type': 'product', 'label': name, 'url': slug.join(detail_url),
+        }))
+        if brand:
+            brand_units[brand] += units
+        category_units[category_id] += units
+
+    product_list = reverse('shop:product_list')
+    for brand, units in brand_units.items():
+        suggestions.append((units, {
+            'type': 'brand', 'label': brand, 'url': f"{product_list}?{urlencode({'search': brand})}",
+        }))
+    for category_id, units in category_units.items():
+        category = categories[category_id]
+        suggestions.append((units, {
+            'type': 'category', 'label': category.name, 'url': f'{product_list}?category={category.slug}',
+        }))
+    return SuggestionIndex(generation, suggestions)
+
+
+_index = None
+# Held by the thread building the next index
+_build_lock = threading.Lock()
+
+
+def _build(generation):
+    global _index
+    started = time.monotonic()
+    index = build_index(generation)
+    _index = index
+    logger.info(
+        'Autocomplete index of %s names built in %.0f ms', len(index.keys), (time.monotonic() - started) * 1000,
+    )
+
+
+def suggestion_index():
+    """This worker's latest index; a stale one is served while the next is built"""
+    index = _index
+    if index is None:
+        with _build_lock:
+            # Another request may have built it while this one waited
+            if _index is None:
+                _build(listing_changed_at())
+            return _index
+    generation = listing_changed_at()
+    if index.generation < generation or time.monotonic() - index.built_at >= autocomplete_refresh():
+        rebuild_in_background(_build_lock, lambda: _build(generation), 'autocomplete index')
+    return index
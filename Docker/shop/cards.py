@@ -0,0 +1,124 @@
+"""
+Product cards for listing pages, read without building Product instances.
+
+A listing page shows a dozen or so cards, each needing a handful of columns.
+``card_rows`` selects just those with ``values()``: the description is cut to
+an excerpt in SQL, and the sale flag and discount percentage are worked out
+by the database instead of by ``Product`` properties on every template
+access.  ``product_cards`` turns the rows into ``ProductCard`` objects, which
+keep the attribute names the card templates already use.
+"""
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db.models import (
+    Avg, BooleanField, Case, Count, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery,
+    Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Floor, Substr
+from django.urls import reverse
+
+from .models import Review
+
+
+# Enough for the longest excerpt a card shows (truncatewords:15)
+SUMMARY_LENGTH = 200
+
+# Product.is_on_sale for the prices that exist (discounts are never negative)
+ON_SALE = Q(discount_price__gt=0, discount_price__lt=F('price'))
+
+
+class ProductCard:
+    """What a product card renders, under the attribute names the templates use for Product"""
+    __slots__ = (
+        'id', 'name', 'slug', 'image', 'price', 'get_price', 'is_on_sale', 'discount_percentage',
+        'description', 'avg_rating', 'reviews_count',
+    )
+
+    def __init__(self, id, name, slug, image, price, get_price, is_on_sale, discount_percentage,
+                 description, avg_rating=None, reviews_count=None):
+        self.id = id
+        self.name = name
+        self.slug = slug
+        self.image = image
+        self.price = price
+        self.get_price = get_price
+        self.is_on_sale = is_on_sale
+        self.discount_percentage = discount_percentage
+        self.description = description
+        self.avg_rating = avg_rating
+        self.reviews_count = reviews_count
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image_url(self):
+        return default_storage.url(self.image) if self.image else ''
+
+    def get_absolute_url(self):
+        return reverse('shop:product_detail', args=[self.slug])
+
+
+def on_sale():
+    """Product.is_on_sale as an expression"""
+    return ExpressionWrapper(ON_SALE, output_field=BooleanField())
+
+
+def percent_off():
+    """Product.discount_percentage as an expression"""
+    # Truncated like int() in Product.discount_percentage; prices are positive
+    return Case(
+        When(ON_SALE, then=Cast(
+            Floor((F('price') - F('discount_price')) * Value(Decimal(100)) / F('price')), IntegerField(),
+        )),
+        default=Value(0),
+    )
+
+
+def rating_subqueries():
+    """Expressions for a product's average rating and number of reviews"""
+    # Correlated subqueries are only evaluated for the rows of the page, and a
+    # paginator's COUNT drops them, unlike a JOIN with GROUP BY
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    avg_rating = Subquery(reviews.annotate(value=Avg('rating')).values('value'))
+    reviews_count = Coalesce(
+        Subquery(reviews.annotate(value=Count('pk')).values('value'), output_field=IntegerField()), 0,
+    )
+    return avg_rating, reviews_count
+
+
+def card_rows(queryset, ratings=False, fields=()):
+    """``values()`` of ``queryset`` with only the columns a card needs, plus ``fields``"""
+    annotations = {
+        # One character more than kept, to tell whether the excerpt was cut
+        'summary': Substr('description', 1, SUMMARY_LENGTH + 1),
+        'on_sale': on_sale(),
+        'percent_off': percent_off(),
+    }
+    if ratings:
+        annotations['avg_rating'], annotations['reviews_count'] = rating_subqueries()
+    return queryset.annotate(**annotations).values(
+        'id', 'name', 'slug', 'image', 'price', 'discount_price', *fields, *annotations,
+    )
+
+
+def product_card(row):
+    """ProductCard from a ``card_rows`` row"""
+    summary = row['summary']
+    if len(summary) > SUMMARY_LENGTH:
+        # Drop the word that may have been cut and mark the cut, as truncatewords would
+        summary = summary[:SUMMARY_LENGTH].rsplit(None, 1)[0] + '…'
+    return ProductCard(
+        row['id'], row['name'], row['slug'], row['image'], row['price'],
+        # From the columns: SQLite returns computed decimals unquantized (12.9900000000000)
+        row['discount_price'] or row['price'],
+        # on_sale is NULL when there is no discount price
+        bool(row['on_sale']), row['percent_off'], summary, row.get('avg_rating'), row.get('reviews_count'),
+    )
+
+
+def product_cards(rows):
+    """ProductCard objects from ``card_rows`` rows"""
+    return [product_card(row) for row in rows]
@@ -0,0 +1,109 @@
+"""
+Cached catalog data and its invalidation.
+
+Two change stamps are kept.  ``catalog_changed_at`` moves on every catalog
+change, stock levels included, and validates pages that show them.
+``listing_changed_at`` only moves when what a listing shows changes: product,
+category, image and review edits, and products coming into or going out of
+stock.  Sales that leave a product in stock move the first stamp only, so
+in-memory copies of the listings (catalog snapshot, autocomplete index) are
+not rebuilt for every order.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from redis.exceptions import RedisError
+
+from .models import Category, Product, ProductImage, Review
+
+
+logger = logging.getLogger(__name__)
+
+FEATURED_CACHE_KEY = 'featured_products'
+CHANGED_AT_CACHE_KEY = 'catalog_changed_at'
+LISTING_CHANGED_AT_CACHE_KEY = 'catalog_listing_changed_at'
+
+
+def _invalidation_failed(error):
+    # Runs after the change committed, so it must not fail the request or command that made it
+    logger.warning('Could not mark the catalog as changed: %s', error)
+    count = getattr(cache, 'count', None)
+    if count is not None:
+        count('invalidations_failed')
+
+
+def invalidate_catalog():
+    """Drop cached catalog data; call once after changing products in bulk"""
+    try:
+        cache.delete(FEATURED_CACHE_KEY)
+        now = time.time()
+        cache.set_many({CHANGED_AT_CACHE_KEY: now, LISTING_CHANGED_AT_CACHE_KEY: now}, None)
+    except RedisError as e:
+        _invalidation_failed(e)
+
+
+def invalidate_stock_levels():
+    """Mark pages showing stock levels stale, after a change that keeps every product's availability"""
+    try:
+        cache.set(CHANGED_AT_CACHE_KEY, time.time(), None)
+    except RedisError as e:
+        _invalidation_failed(e)
+
+
+def _changed_at(key):
+    changed_at = cache.get(key)
+    if changed_at is None:
+        # Unknown after a cache flush, so treat everything cached before now as stale
+        changed_at = time.time()
+        cache.add(key, changed_at, None)
+    return changed_at
+
+
+def catalog_changed_at():
+    """Unix time of the last catalog change, used to validate cached pages"""
+    return _changed_at(CHANGED_AT_CACHE_KEY)
+
+
+def listing_changed_at():
+    """Unix time of the last change to what product listings show"""
+    return _changed_at(LISTING_CHANGED_AT_CACHE_KEY)
+
+
+def rebuild_in_background(lock, build, name):
+    """
+    Run ``build()`` in a daemon thread holding ``lock``; returns False without
+    starting one if another build holds it.
+    """
+    if not lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            build()
+        except Exception:
+            logger.exception('Building the %s failed', name)
+        finally:
+            # The thread's own database connection
+            connection.close()
+            lock.release()
+
+    try:
+        threading.Thread(target=run, name=name, daemon=True).start()
+    except BaseException:
+        lock.release()
+        raise
+    return True
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def catalog_changed(sender, **kwargs):
+    # After commit, so a page rendered from the old rows cannot outlive the new stamp
+    transaction.on_commit(invalidate_catalog)
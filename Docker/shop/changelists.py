@@ -0,0 +1,117 @@
+"""
+Admin changelist helpers for tables that grow large.
+
+``EstimatedCountPaginator`` asks the PostgreSQL planner how many rows a
+changelist matches and only runs an exact ``COUNT(*)`` when that number is
+small.  ``IndexedSearchMixin`` replaces the admin's ``icontains`` search,
+which scans the table (and its joins), with a full-text match against a GIN
+index and exact matches on indexed columns; fields those cannot match keep
+the ``icontains`` lookup, ideally backed by a trigram index.  On other
+databases both fall back to Django's default behaviour.
+"""
+import json
+import re
+
+from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path, lookup_spawns_duplicates
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+
+
+def _is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def _matches(vector, words):
+    """Rows whose ``vector`` has every word as a prefix"""
+    prefixes = ' & '.join(f'{word}:*' for word in words)
+    return Q(RawSQL(f"{vector} @@ to_tsquery('simple', %s)", [prefixes], output_field=BooleanField()))
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for large results"""
+    # Below this many estimated rows an exact count is cheap enough
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and _is_postgresql(queryset):
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= self.exact_count_limit:
+                return estimate
+        return super().count
+
+
+class IndexedSearchMixin:
+    """
+    ModelAdmin search backed by indexes.
+
+    ``search_vector`` is the SQL ``to_tsvector(...)`` expression of a GIN
+    index on the model's table; each search word matches as a prefix.
+    ``search_exact_fields`` are indexed fields compared with ``=``; related
+    ones (``user__username``) should be unique, as their matches are fetched
+    first.
+    ``search_related_vectors`` maps a relation (``product``) to the
+    ``search_vector`` of the related table; the related rows matching it are
+    fetched first the same way.
+    ``search_fallback_fields`` are fields none of those covers (partial
+    order numbers, emails); they are matched with ``icontains`` as
+    ``search_fields`` would be.
+    ``search_fields`` is still used on databases other than PostgreSQL.
+    """
+    search_vector = None
+    search_exact_fields = ()
+    search_related_vectors = {}
+    search_fallback_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term or not _is_postgresql(queryset):
+            return super().get_search_results(request, queryset, search_term)
+
+        condition, may_have_duplicates = self._fallback_condition(search_term)
+        for field in self.search_exact_fields:
+            relation, _, name = field.rpartition('__')
+            if relation:
+                # Look the related rows up first, so the filter stays on this table's indexes
+                model = get_fields_from_path(self.model, relation)[-1].related_model
+                pks = model._default_manager.filter(**{name: search_term}).order_by().values_list('pk', flat=True)
+                condition |= Q(**{f'{relation}__in': list(pks)})
+            else:
+                condition |= Q(**{field: search_term})
+        words = re.findall(r'\w+', search_term)
+        if words:
+            for relation, vector in self.search_related_vectors.items():
+                model = get_fields_from_path(self.model, relation)[-1].related_model
+                pks = model._default_manager.filter(_matches(vector, words)).order_by().values_list('pk', flat=True)
+                condition |= Q(**{f'{relation}__in': list(pks)})
+            if self.search_vector:
+                condition |= _matches(self.search_vector, words)
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), may_have_duplicates
+
+    def _fallback_condition(self, search_term):
+        """Django's own search over ``search_fallback_fields``: every word must match one of them"""
+        lookups = [f'{field}__icontains' for field in self.search_fallback_fields]
+        if not lookups:
+            return Q(), False
+        condition = Q()
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            condition &= Q.create([(lookup, bit) for lookup in lookups], connector=Q.OR)
+        may_have_duplicates = any(lookup_spawns_duplicates(self.opts, lookup) for lookup in lookups)
+        return condition, may_have_duplicates
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """ModelAdmin defaults for tables too big to count on every page view"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -1,10 +1,14 @@
 from .models import Cart
+from .session_cart import SessionCart
 
 
 def cart_context(request):
     """Add cart information to all templates"""
     cart_items_count = 0
-    if request.user.is_authenticated:
+    if not request.user.is_authenticated:
+        # Counted from the session alone, without touching the database
+        cart_items_count = SessionCart(request.session).total_items
+    else:
         try:
             cart = Cart.objects.get(user=request.user)
             cart_items_count = cart.total_items
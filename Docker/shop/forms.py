@@ -1,4 +1,5 @@
 from django import forms
+from django.contrib.admin.helpers import ActionForm
 from .models import Review
 
 
@@ -10,4 +11,24 @@ class ReviewForm(forms.ModelForm):
             'rating': forms.Select(attrs={'class': 'form-control'}),
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Review title'}),
             'comment': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Write your review...'}),
-        } 
\ No newline at end of file
+        } 
+
+class CatalogImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON lines'),
+    ]
+
+    feed = forms.FileField(help_text='CSV or JSONL feed keyed by product slug')
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    create_missing = forms.BooleanField(initial=True, required=False, help_text='Create products for unknown slugs')
+    dry_run = forms.BooleanField(required=False, help_text='Validate the feed without saving changes')
+
+
+class ProductActionForm(ActionForm):
+    """Admin action bar with the value bulk product actions apply"""
+    amount = forms.IntegerField(
+        required=False,
+        widget=forms.NumberInput(attrs={'placeholder': '% or units', 'style': 'width: 7em'}),
+    )
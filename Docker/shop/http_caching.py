@@ -0,0 +1,89 @@
+"""
+Conditional GET for catalog pages.
+
+A catalog page only changes when the catalog does (``catalog_changed_at``)
+or when something about the visitor does.  ``catalog_page`` derives the
+ETag and Last-Modified from the cached change stamp, without a database
+query, so a browser revalidating an unchanged page gets a 304 before the
+view runs.  With ``snapshot=True`` a page served from the in-memory catalog
+snapshot is validated by the snapshot's generation instead, which can lag
+behind the stamp while the next snapshot is built.  Anonymous visitors without cookies all see the same page; it is
+marked public so a shared cache such as nginx's proxy cache can keep it.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .catalog import catalog_changed_at
+from .session_cart import SessionCart
+from .snapshot import request_snapshot
+
+
+def catalog_cache_max_age():
+    return getattr(settings, 'CATALOG_CACHE_MAX_AGE', 60)
+
+
+def _stamp(request, snapshot):
+    """Change stamp of the data the page is rendered from"""
+    if snapshot:
+        current = request_snapshot(request)
+        if current is not None:
+            return current.generation
+    return catalog_changed_at()
+
+
+def _validators(request, snapshot=False):
+    """(etag, last_modified) for the request, or (None, None) when the page must be rendered"""
+    if not hasattr(request, '_catalog_validators'):
+        request._catalog_validators = (None, None)
+        # Logged-in pages show the wishlist and reviews, and pending messages are shown once
+        if not request.user.is_authenticated and not request.COOKIES.get(CookieStorage.cookie_name):
+            changed_at = _stamp(request, snapshot)
+            if request.COOKIES.get(settings.SESSION_COOKIE_NAME):
+                # The navbar shows the session cart, which changes without the catalog
+                visitor = f'cart={SessionCart(request.session).total_items}'
+                last_modified = None
+            else:
+                visitor = ''
+                last_modified = datetime.fromtimestamp(changed_at, tz=timezone.utc)
+            etag = hashlib.md5(f'{changed_at}:{request.get_full_path()}:{visitor}'.encode()).hexdigest()
+            request._catalog_validators = (etag, last_modified)
+    return request._catalog_validators
+
+
+def catalog_page(view=None, snapshot=False):
+    """
+    Answer unchanged catalog pages with 304 and mark anonymous ones cacheable.
+
+    Use ``@catalog_page(snapshot=True)`` for views that render from
+    ``request_snapshot(request)`` when there is one.
+    """
+    if view is None:
+        return partial(catalog_page, snapshot=snapshot)
+
+    def etag(request, *args, **kwargs):
+        return _validators(request, snapshot)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return _validators(request, snapshot)[1]
+
+    conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            etag, last_modified = _validators(request, snapshot)
+            if last_modified is not None and not response.cookies:
+                # Browsers revalidate every time; shared caches may keep the page briefly
+                patch_cache_control(response, public=True, max_age=0, s_maxage=catalog_cache_max_age())
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+        return response
+    return wrapped
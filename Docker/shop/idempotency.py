@@ -0,0 +1,125 @@
+"""
+Idempotency keys for POST endpoints that must not run twice.
+
+The client sends a key (``Idempotency-Key`` header or ``idempotency_key``
+form field) that stays the same across retries of one logical request.  The
+first request with a key claims it in the cache and runs the view; its
+response is stored under (user, view, key) for ``IDEMPOTENCY_KEY_TTL``
+seconds and replayed to any retry.  A duplicate that arrives while the first
+one is still running waits for its result instead of running the view again.
+"""
+import hashlib
+import logging
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+# A claim outlives a crashed worker by at most this long
+PENDING_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+
+def _fingerprint(request):
+    """Hash of the submitted form, so a key cannot be reused for a different request"""
+    fields = sorted(
+        (name, values) for name, values in request.POST.lists()
+        if name not in ('csrfmiddlewaretoken', 'idempotency_key')
+    )
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+def _replay(entry):
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _release(cache_key):
+    """Free a claimed key so the client can retry; never let a cache error hide the view's outcome"""
+    try:
+        cache.delete(cache_key)
+    except Exception as e:
+        logger.warning('Could not release idempotency key %s: %s', cache_key, e)
+
+
+def idempotent(store_if=None):
+    """
+    Make a view safe to retry with an idempotency key.
+
+    ``store_if(response)`` decides whether a response is final and should be
+    replayed; by default any response below 400 is.  Other responses release
+    the key so the client can try again with it.
+    """
+    if store_if is None:
+        store_if = lambda response: response.status_code < 400  # noqa: E731
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+            if not key or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            if not KEY_PATTERN.match(key):
+                return JsonResponse({'success': False, 'error': 'Invalid idempotency key'}, status=400)
+
+            cache_key = f'idempotency:{request.user.pk}:{view.__name__}:{key}'
+            fingerprint = _fingerprint(request)
+            ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+            deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+
+            try:
+                while not cache.add(cache_key, {'state': 'pending', 'fingerprint': fingerprint}, PENDING_TIMEOUT):
+                    entry = cache.get(cache_key)
+                    if entry is None:
+                        # The first attempt failed and released the key; claim it ourselves
+                        continue
+                    if entry['fingerprint'] != fingerprint:
+                        return JsonResponse(
+                            {'success': False, 'error': 'Idempotency key was already used for a different request'},
+                            status=422,
+                        )
+                    if entry['state'] == 'done':
+                        return _replay(entry)
+                    if time.monotonic() >= deadline:
+                        return JsonResponse(
+                            {'success': False, 'error': 'The original request is still being processed'},
+                            status=409,
+                        )
+                    time.sleep(POLL_INTERVAL)
+            except Exception as e:
+                # Without the cache there is no deduplication, but checkout still works
+                logger.warning('Idempotency cache unavailable, running %s without it: %s', view.__name__, e)
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                _release(cache_key)
+                raise
+
+            if store_if(response):
+                try:
+                    cache.set(cache_key, {
+                        'state': 'done',
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }, ttl)
+                except Exception as e:
+                    # The view has already run (an order may be committed); its response must still reach
+                    # the client.  A retry sees the pending claim until it expires.
+                    logger.error('Could not store idempotent response of %s: %s', view.__name__, e)
+            else:
+                _release(cache_key)
+            return response
+        return wrapper
+    return decorator
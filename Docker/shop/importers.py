@@ -0,0 +1,272 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .models import Category, Product, resize_image
+
+
+# Columns a feed may carry besides the mandatory ``slug``.  Feeds only need the
+# columns they care about: a stock feed can be just ``slug,stock_quantity``.
+# Empty cells in required columns are ignored; in nullable ones they clear the value.
+IMPORT_FIELDS = (
+    'name', 'category', 'description', 'price', 'discount_price', 'image',
+    'stock_quantity', 'stock_status', 'is_featured', 'is_active', 'weight',
+    'brand', 'age_group',
+)
+
+# Columns a row must provide when its slug does not exist yet
+REQUIRED_FOR_CREATE = ('name', 'category', 'price')
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_REJECTS = 50
+
+
+class ImportResult:
+    """Counters collected while importing a feed"""
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.images_processed = 0
+        self.rejects = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    def reject(self, line, slug, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({'line': line, 'slug': slug, 'error': reason})
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0
+        return self.read / self.elapsed
+
+    def summary(self):
+        return (
+            f"{self.read} rows read: {self.created} created, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.rejected} rejected "
+            f"in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s)"
+        )
+
+
+def iter_csv_rows(stream):
+    """Yield (line_number, row) pairs from a CSV feed with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl_rows(stream):
+    """Yield (line_number, row) pairs from a JSON-lines feed"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {'__error__': f'Invalid JSON: {e}'}
+        if not isinstance(row, dict):
+            row = {'__error__': 'Expected a JSON object'}
+        yield line_number, row
+
+
+FEED_READERS = {
+    'csv': iter_csv_rows,
+    'jsonl': iter_jsonl_rows,
+}
+
+
+def detect_format(filename, default='csv'):
+    """Guess the feed format from a file name"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class CatalogImporter:
+    """
+    Stream a product feed into the catalog.
+
+    Rows are processed in batches: each batch is diffed against the existing
+    products by slug and written with ``bulk_create``/``bulk_update`` inside
+    its own transaction, so memory use is bounded by the batch size rather
+    than the feed size.  ``Product.save()`` is never called; images are only
+    resized when a row points a product at a new image file.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, create=True, reject_writer=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.create = create
+        self.reject_writer = reject_writer
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.fields = {name: Product._meta.get_field(name) for name in IMPORT_FIELDS}
+
+    def run(self, rows):
+        """Import an iterable of (line_number, row) pairs"""
+        result = ImportResult()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch, result)
+
+        result.finished = time.monotonic()
+        if (result.created or result.updated) and not self.dry_run:
+            invalidate_catalog()
+        return result
+
+    def _reject(self, result, line, row, reason):
+        result.reject(line, row.get('slug'), reason)
+        if self.reject_writer is not None:
+            self.reject_writer.write(json.dumps({'line': line, 'error': reason, 'row': row}, default=str) + '\n')
+
+    def _clean_row(self, row):
+        """Validate a raw feed row and return {field: python value}"""
+        if '__error__' in row:
+            raise ValidationError(row['__error__'])
+
+        slug = (row.get('slug') or '').strip()
+        if not slug:
+            raise ValidationError('Missing slug')
+        cleaned = {'slug': Product._meta.get_field('slug').clean(slug, None)}
+
+        for name, field in self.fields.items():
+            if name not in row:
+                continue
+            value = row[name]
+            if isinstance(value, str):
+                value = value.strip()
+            if value == '' and not field.null and not field.blank:
+                # Empty cell in a required column: leave the current value alone
+                continue
+            if name == 'category':
+                if value not in self.categories:
+                    raise ValidationError(f'Unknown category "{value}"')
+                cleaned['category_id'] = self.categories[value]
+                continue
+            if value == '' and field.null:
+                value = None
+            elif isinstance(value, float):
+                # JSON numbers arrive as floats; go through str to keep decimals exact
+                value = str(value)
+            try:
+                cleaned[name] = field.clean(value, None)
+            except ValidationError as e:
+                raise ValidationError(f'{name}: {"; ".join(e.messages)}')
+        return cleaned
+
+    def _import_batch(self, batch, result):
+        # Validate first and collapse duplicate slugs (last row wins)
+        pending = {}
+        for line, row in batch:
+            result.read += 1
+            try:
+                cleaned = self._clean_row(row)
+            except ValidationError as e:
+                self._reject(result, line, row, '; '.join(e.messages))
+                continue
+            slug = cleaned['slug']
+            if slug in pending:
+                pending[slug][0].append((line, row))
+                pending[slug][1].update(cleaned)
+            else:
+                pending[slug] = ([(line, row)], cleaned)
+
+        if not pending:
+            return
+
+        now = timezone.now()
+        new_images = []
+        with transaction.atomic():
+            existing = {
+                product.slug: product
+                for product in Product.objects.select_for_update().filter(slug__in=pending.keys())
+            }
+
+            to_create = []
+            to_update = []
+            changed_fields = set()
+            for slug, (rows, cleaned) in pending.items():
+                product = existing.get(slug)
+                if product is None:
+                    missing = [
+                        name for name in REQUIRED_FOR_CREATE
+                        if name not in cleaned and f'{name}_id' not in cleaned
+                    ]
+                    reason = None
+                    if not self.create:
+                        reason = 'Unknown slug'
+                    elif missing:
+                        reason = f'New product is missing: {", ".join(missing)}'
+                    if reason:
+                        # The rows as supplied, so the reject file can be fixed and imported again
+                        for line, row in rows:
+                            self._reject(result, line, row, reason)
+                    else:
+                        product = Product(**cleaned)
+                        product.sync_stock_status()
+                        to_create.append(product)
+                        if product.image:
+                            new_images.append(product.image.name)
+                    continue
+
+                changed = []
+                for name, value in cleaned.items():
+                    current = getattr(product, name)
+                    if name == 'image':
+                        current = current.name
+                    if current != value:
+                        setattr(product, name, value)
+                        changed.append(name)
+                if 'stock_quantity' in changed or 'stock_status' in changed:
+                    status = product.stock_status
+                    product.sync_stock_status()
+                    if product.stock_status != status and 'stock_status' not in changed:
+                        changed.append('stock_status')
+                if not changed:
+                    result.unchanged += 1
+                    continue
+                if 'image' in changed and product.image:
+                    new_images.append(product.image.name)
+                product.updated_at = now
+                changed_fields.update(changed)
+                to_update.append(product)
+
+            if to_create:
+                Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_update:
+                changed_fields.add('updated_at')
+                Product.objects.bulk_update(to_update, sorted(changed_fields), batch_size=self.batch_size)
+            result.created += len(to_create)
+            result.updated += len(to_update)
+
+            if self.dry_run:
+                transaction.set_rollback(True)
+                return
+
+        # Resize new images only once the rows are committed
+        for name in new_images:
+            if resize_image(Product._meta.get_field('image').storage.path(name)):
+                result.images_processed += 1
@@ -0,0 +1,123 @@
+"""
+Stock bookkeeping done with single conditional UPDATE statements.
+
+``stock_status`` is derived from ``stock_quantity`` in the same statement that
+changes the quantity, so a product can never be sold below zero or show as
+in stock once it has sold out, and no row has to be read first.  A change
+that cannot alter the status is tried first, so the common sale only marks
+stock levels stale and leaves the product listings alone.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .catalog import invalidate_catalog, invalidate_stock_levels
+from .models import Product
+
+
+IN_STOCK = 'in_stock'
+OUT_OF_STOCK = 'out_of_stock'
+DISCONTINUED = 'discontinued'
+
+
+class OutOfStock(Exception):
+    """Raised when a product does not have enough stock for an order"""
+
+    def __init__(self, product):
+        super().__init__(f'Not enough stock for {product}')
+        self.product = product
+
+
+def low_stock_threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+
+def decrement_stock(product_id, quantity):
+    """
+    Take ``quantity`` units off a product's stock.
+
+    Returns False (and changes nothing) if the product is discontinued or does
+    not have enough stock left.
+    """
+    products = Product.objects.filter(pk=product_id).exclude(stock_status=DISCONTINUED)
+    # Units left over: the product stays listed, only its stock level changes
+    if products.filter(stock_quantity__gt=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity, updated_at=timezone.now(),
+    ):
+        transaction.on_commit(invalidate_stock_levels)
+        return True
+    updated = products.filter(stock_quantity__gte=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity,
+        # Right-hand sides see the old row, so this reads "old quantity <= sold"
+        stock_status=Case(
+            When(stock_quantity__lte=quantity, then=Value(OUT_OF_STOCK)),
+            default=F('stock_status'),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        # Sold out, so it leaves the listings
+        transaction.on_commit(invalidate_catalog)
+    return bool(updated)
+
+
+def increment_stock(product_id, quantity):
+    """Put ``quantity`` units back on the shelf, reopening sold-out products"""
+    products = Product.objects.filter(pk=product_id)
+    if products.exclude(stock_status=OUT_OF_STOCK).update(
+        stock_quantity=F('stock_quantity') + quantity, updated_at=timezone.now(),
+    ):
+        transaction.on_commit(invalidate_stock_levels)
+        return True
+    updated = products.update(
+        stock_quantity=F('stock_quantity') + quantity,
+        stock_status=Case(
+            When(stock_status=OUT_OF_STOCK, then=Value(IN_STOCK)),
+            default=F('stock_status'),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        # Back in stock, so it is listed again
+        transaction.on_commit(invalidate_catalog)
+    return bool(updated)
+
+
+def adjust_stock(queryset, delta):
+    """
+    Add ``delta`` units (negative to remove, floored at zero) to every product
+    in ``queryset`` in one UPDATE; returns the number of products changed.
+    """
+    return queryset.update(
+        stock_quantity=Greatest(F('stock_quantity') + delta, Value(0)),
+        # Old quantity <= -delta means the new quantity is zero
+        stock_status=Case(
+            When(stock_status=IN_STOCK, stock_quantity__lte=-delta, then=Value(OUT_OF_STOCK)),
+            When(stock_status=OUT_OF_STOCK, stock_quantity__gt=-delta, then=Value(IN_STOCK)),
+            default=F('stock_status'),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def sync_stock_status(queryset=None):
+    """Fix products whose status disagrees with their quantity; returns rows changed"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    now = timezone.now()
+    sold_out = queryset.filter(stock_status=IN_STOCK, stock_quantity=0).update(
+        stock_status=OUT_OF_STOCK, updated_at=now,
+    )
+    restocked = queryset.filter(stock_status=OUT_OF_STOCK, stock_quantity__gt=0).update(
+        stock_status=IN_STOCK, updated_at=now,
+    )
+    return sold_out + restocked
+
+
+def low_stock_products(threshold=None):
+    """In-stock active products at or below the low-stock threshold, scarcest first"""
+    if threshold is None:
+        threshold = low_stock_threshold()
+    return Product.objects.available().filter(stock_quantity__lte=threshold).order_by('stock_quantity')
@@ -0,0 +1,90 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from shop import api
+from shop.models import Product
+
+
+def encoders():
+    """(label, function returning JSON bytes) for each way to encode a response"""
+    found = [
+        # What JsonResponse does
+        ('DjangoJSONEncoder', lambda data: json.dumps(data, cls=DjangoJSONEncoder).encode()),
+        ('json compact', lambda data: json.dumps(
+            data, default=api._default, ensure_ascii=False, separators=(',', ':'),
+        ).encode()),
+    ]
+    if api.orjson is not None:
+        found.append(('orjson', lambda data: api.orjson.dumps(data, default=api._default)))
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON encoders on catalog API payloads, and time API pages with full and sparse fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help='Products in the encoded payload')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per encoder and page')
+
+    def handle(self, *args, **options):
+        if not Product.objects.available().exists():
+            raise CommandError('No available products; run populate_data first')
+        if api.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; the API uses the json module'))
+
+        fields = tuple(name for name in api.DETAIL_FIELDS if name != 'images')
+        rows = list(api.select(Product.objects.available().order_by('pk'), api.PRODUCT_FIELDS, fields)[
+            :options['products']
+        ])
+        started = time.perf_counter()
+        data = {'results': api.serialize(rows, api.PRODUCT_FIELDS, fields)}
+        shaping = time.perf_counter() - started
+        self.stdout.write(
+            f'{len(rows)} products, {len(fields)} fields; rows to objects in {shaping * 1000:.1f} ms'
+        )
+
+        self.stdout.write(f"{'encoder':<18} {'bytes':>9} {'ms':>8} {'MB/s':>8} {'objects/s':>10}")
+        for label, encode in encoders():
+            times = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                body = encode(data)
+                times.append(time.perf_counter() - started)
+            elapsed = statistics.median(times)
+            self.stdout.write(
+                f'{label:<18} {len(body):>9} {elapsed * 1000:>8.2f} {len(body) / elapsed / 1e6:>8.1f} '
+                f'{len(rows) / elapsed:>10.0f}'
+            )
+
+        setup_test_environment()
+        client = Client()
+        path = reverse('shop:api_products')
+        pages = [
+            ('listing, default fields', {'page_size': 100}),
+            ('listing, fields=id,name,price', {'page_size': 100, 'fields': 'id,name,price'}),
+            ('listing, every field', {'page_size': 100, 'fields': ','.join(api.DETAIL_FIELDS)}),
+            ('batch of 100 ids', {'ids': ','.join(str(row['id']) for row in rows[:100]), 'fields': 'id,name,price'}),
+        ]
+        self.stdout.write(f"{'page':<32} {'queries':>7} {'bytes':>8} {'p50 ms':>8}")
+        for label, params in pages:
+            client.get(path, params)
+            times = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(path, params)
+                    times.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} answered {response.status_code}')
+            self.stdout.write(
+                f'{label:<32} {len(queries):>7} {len(response.content):>8} {statistics.median(times) * 1000:>8.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
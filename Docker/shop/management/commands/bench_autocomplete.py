@@ -0,0 +1,95 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from shop import autocomplete
+from shop.catalog import invalidate_catalog
+from shop.models import Product
+
+from .bench_cards import deep_size
+
+
+def brute_force(index, query, limit):
+    """What ``lookup`` should return, by scanning every suggestion"""
+    prefix = autocomplete.normalize(query)[:autocomplete.KEY_LENGTH]
+    matches = []
+    for suggestion in index.suggestions:
+        name = autocomplete.normalize(suggestion['label'])
+        starts = (name[match.start():] for match in autocomplete.WORD_START.finditer(name))
+        if any(start[:autocomplete.KEY_LENGTH].startswith(prefix) for start in starts):
+            matches.append(suggestion)
+            if len(matches) == limit:
+                break
+    return matches
+
+
+def percentile(latencies, fraction):
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Build the autocomplete index, check it against a full scan and time lookups and the endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=20000, help='Prefixes to look up')
+        parser.add_argument('--check', type=int, default=500, help='Prefixes also checked against a full scan')
+
+    def handle(self, *args, **options):
+        names = list(Product.objects.available().values_list('name', flat=True))
+        if not names:
+            raise CommandError('No available products; run populate_data first')
+
+        invalidate_catalog()
+        started = time.perf_counter()
+        index = autocomplete.suggestion_index()
+        self.stdout.write(
+            f'index      {len(index.suggestions)} suggestions, {len(index.keys)} keys, '
+            f'{len(index.top)} precomputed prefixes, built in {(time.perf_counter() - started) * 1000:.0f} ms, '
+            f'{deep_size(index) / 1024 / 1024:.1f} MiB'
+        )
+
+        # What people type: the first few letters of a word of a product name
+        rng = random.Random(0)
+        queries = []
+        for _ in range(options['queries']):
+            words = rng.choice(names).split()
+            start = rng.randrange(len(words))
+            text = ' '.join(words[start:])
+            queries.append(text[:rng.randint(1, min(len(text), 12))])
+
+        for query in queries[:options['check']]:
+            if index.lookup(query) != brute_force(index, query, autocomplete.MAX_RESULTS):
+                raise CommandError(f'Lookup of {query!r} differs from a full scan')
+        self.stdout.write(f'checked    {min(options["check"], len(queries))} prefixes against a full scan')
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.lookup(query)
+            latencies.append(time.perf_counter() - started)
+        self.report('lookup', sorted(latencies))
+
+        setup_test_environment()
+        client = Client()
+        path = reverse('shop:autocomplete')
+        latencies = []
+        for query in queries[:2000]:
+            started = time.perf_counter()
+            response = client.get(path, {'q': query})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{path}?q={query} answered {response.status_code}')
+        self.report('endpoint', sorted(latencies))
+        self.stdout.write(f"headers    Cache-Control: {response['Cache-Control']}, ETag: {response['ETag']}")
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def report(self, label, latencies):
+        self.stdout.write(
+            f'{label:<10} p50 {percentile(latencies, 0.5) * 1000:.3f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.3f} ms, '
+            f'max {latencies[-1] * 1000:.3f} ms'
+        )
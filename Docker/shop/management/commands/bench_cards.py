@@ -0,0 +1,127 @@
+import statistics
+import sys
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Avg, Count
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from shop.cards import card_rows, product_cards
+from shop.models import Category, Product
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by ``obj`` and everything it references that was not counted yet"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        if hasattr(obj, '__dict__'):
+            size += deep_size(vars(obj), seen)
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(obj, name):
+                    size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def paginate(objects, cards):
+    page_obj = Paginator(objects, 12).get_page(1)
+    if cards:
+        page_obj.object_list = product_cards(page_obj.object_list)
+    else:
+        page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def home_products(cards):
+    available = Product.objects.available().filter(is_featured=True)
+    if cards:
+        return {'featured_products': product_cards(card_rows(available)[:8])}
+    # What home() built before product cards
+    return {'featured_products': list(available.select_related('category').annotate(
+        avg_rating=Avg('reviews__rating'), reviews_count=Count('reviews'),
+    )[:8])}
+
+
+def product_list_products(cards):
+    available = Product.objects.available().order_by('name')
+    if cards:
+        return {'page_obj': paginate(card_rows(available, ratings=True), cards)}
+    return {'page_obj': paginate(available.select_related('category').annotate(
+        avg_rating=Avg('reviews__rating'), reviews_count=Count('reviews'),
+    ), cards)}
+
+
+def category_products(cards):
+    category = Category.objects.annotate(size=Count('products')).order_by('-size').first()
+    available = Product.objects.available().filter(category=category)
+    if cards:
+        return {'category': category, 'page_obj': paginate(card_rows(available), cards)}
+    return {'category': category, 'page_obj': paginate(available.select_related('category'), cards)}
+
+
+def wishlist_products(cards, size=24):
+    # A full wishlist without writing one: the first ``size`` active products
+    products = Product.objects.filter(pk__in=Product.objects.filter(is_active=True).values('pk')[:size])
+    if cards:
+        return {'products': product_cards(card_rows(products))}
+    return {'products': list(products)}
+
+
+PAGES = [
+    ('home', 'shop/home.html', home_products),
+    ('product_list', 'shop/product_list.html', product_list_products),
+    ('category_detail', 'shop/category_detail.html', category_products),
+    ('wishlist_detail', 'shop/wishlist_detail.html', wishlist_products),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare Product instances with ProductCard rows on listing pages: queries, memory, build and render time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per page and variant')
+
+    def handle(self, *args, **options):
+        if not Product.objects.available().exists():
+            raise CommandError('No available products; run populate_data first')
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+
+        self.stdout.write(
+            f"{'page':<16} {'variant':<9} {'queries':>7} {'objects KiB':>11} {'build ms':>9} {'render ms':>10}"
+        )
+        for name, template, build in PAGES:
+            for label, cards in (('products', False), ('cards', True)):
+                with CaptureQueriesContext(connection) as queries:
+                    context = build(cards)
+                # What the page's product objects keep alive while the template renders
+                size = deep_size([list(value) for value in context.values() if not isinstance(value, Category)])
+
+                build_times, render_times = [], []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    context = build(cards)
+                    build_times.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    render_to_string(template, context, request)
+                    render_times.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'{name:<16} {label:<9} {len(queries):>7} {size / 1024:>11.1f} '
+                    f'{statistics.median(build_times) * 1000:>9.2f} {statistics.median(render_times) * 1000:>10.2f}'
+                )
+        self.stdout.write(self.style.SUCCESS('Done'))
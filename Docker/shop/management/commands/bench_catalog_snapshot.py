@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from shop import snapshot
+from shop.catalog import invalidate_catalog, listing_changed_at
+from shop.models import Category, Product
+
+from .bench_cards import deep_size
+
+
+def browsing_paths():
+    """Listing pages a visitor clicks through: sorts, filters, searches and later pages"""
+    product_list = reverse('shop:product_list')
+    paths = [
+        product_list,
+        f'{product_list}?page=2',
+        f'{product_list}?sort=price_low',
+        f'{product_list}?sort=price_high&page=3',
+        f'{product_list}?sort=newest',
+        f'{product_list}?search=dog',
+        f'{product_list}?search=food&sort=price_low',
+    ]
+    for slug in Category.objects.values_list('slug', flat=True)[:3]:
+        paths.append(f'{product_list}?category={slug}')
+        paths.append(reverse('shop:category_detail', args=[slug]))
+    return paths
+
+
+class Command(BaseCommand):
+    help = 'Compare catalog browsing requests/sec with and without the in-memory catalog snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of requests per mode')
+
+    def handle(self, *args, **options):
+        if not Product.objects.available().exists():
+            raise CommandError('No available products; run populate_data first')
+        setup_test_environment()
+        paths = browsing_paths()
+        self.stdout.write(f'{len(paths)} listing pages, anonymous visitor, {options["duration"]:.0f}s per mode')
+
+        for label, enabled in (('database', False), ('snapshot', True)):
+            with override_settings(CATALOG_SNAPSHOT=enabled):
+                if enabled:
+                    self.report_build()
+                self.run(label, paths, options['duration'])
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def report_build(self):
+        invalidate_catalog()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            current = snapshot.build_snapshot(listing_changed_at())
+        elapsed = time.perf_counter() - started
+        # Requests get theirs from a background build; have it ready before timing them
+        if current is None or snapshot.wait_for_snapshot() is None:
+            raise CommandError('The catalog is larger than CATALOG_SNAPSHOT_MAX_PRODUCTS')
+        self.stdout.write(
+            f'snapshot   {current.size} products in {elapsed * 1000:.0f} ms, {len(queries)} queries, '
+            f'{deep_size(current) / 1024 / 1024:.1f} MiB'
+        )
+
+    def run(self, label, paths, duration):
+        client = Client()
+        # Warm up: templates, the catalog change stamp and (if enabled) the snapshot
+        for path in paths:
+            client.get(path)
+        latencies = []
+        deadline = time.monotonic() + duration
+        with CaptureQueriesContext(connection) as queries:
+            while time.monotonic() < deadline:
+                path = paths[len(latencies) % len(paths)]
+                started = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} answered {response.status_code}')
+        latencies.sort()
+        elapsed = sum(latencies)
+        self.stdout.write(
+            f'{label:<10} {len(latencies) / elapsed:.1f} req/s, '
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, '
+            f'{len(queries) / len(latencies):.2f} queries/request'
+        )
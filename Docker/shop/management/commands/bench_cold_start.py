@@ -0,0 +1,55 @@
+import os
+import shlex
+import signal
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Time a server command from process start to its first 200 response'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--command', default='./entrypoint.sh serve --bind 127.0.0.1:8100',
+            help='Shell command that starts the server',
+        )
+        parser.add_argument('--url', default='http://127.0.0.1:8100/', help='URL to poll until it answers 200')
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to time')
+        parser.add_argument('--timeout', type=float, default=300, help='Give up on a start after this many seconds')
+
+    def handle(self, *args, **options):
+        timings = []
+        for run in range(1, options['runs'] + 1):
+            seconds = self.cold_start(options['command'], options['url'], options['timeout'])
+            timings.append(seconds)
+            self.stdout.write(f'Run {run}: first 200 after {seconds:.2f}s')
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["command"]}\n  best {timings[0]:.2f}s, median {timings[len(timings) // 2]:.2f}s, worst {timings[-1]:.2f}s'
+        ))
+
+    def cold_start(self, command, url, timeout):
+        started = time.monotonic()
+        # A new session, so the whole process group (gunicorn and its workers) can be stopped
+        process = subprocess.Popen(
+            shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        try:
+            while time.monotonic() - started < timeout:
+                if process.poll() is not None:
+                    raise CommandError(f'{command!r} exited with status {process.returncode}')
+                try:
+                    with urllib.request.urlopen(url, timeout=5) as response:
+                        if response.status == 200:
+                            return time.monotonic() - started
+                except (urllib.error.URLError, ConnectionError, TimeoutError):
+                    pass
+                time.sleep(0.05)
+            raise CommandError(f'No 200 from {url} within {timeout:.0f}s')
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
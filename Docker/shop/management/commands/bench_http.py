@@ -0,0 +1,138 @@
+import http.client
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.templatetags.static import static
+from django.urls import reverse
+
+from shop.models import Category, Product
+
+
+class Worker(threading.Thread):
+    """Sends requests over one keep-alive connection until the deadline"""
+
+    def __init__(self, base, paths, deadline, headers, revalidate):
+        super().__init__(daemon=True)
+        self.base, self.paths, self.deadline = base, paths, deadline
+        self.headers, self.revalidate = headers, revalidate
+        self.latencies = []
+        self.statuses = Counter()
+        self.cache_statuses = Counter()
+        self.bytes = 0
+        self.errors = 0
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.base.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.base.netloc, timeout=30)
+
+    def run(self):
+        connection = self.connect()
+        etags = {}
+        number = 0
+        while time.monotonic() < self.deadline:
+            path = self.paths[number % len(self.paths)]
+            number += 1
+            headers = dict(self.headers)
+            if self.revalidate and path in etags:
+                headers['If-None-Match'] = etags[path]
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self.connect()
+                continue
+            self.latencies.append(time.perf_counter() - started)
+            self.statuses[response.status] += 1
+            self.cache_statuses[response.getheader('X-Cache-Status', '-')] += 1
+            self.bytes += len(body)
+            if response.getheader('ETag'):
+                etags[path] = response.getheader('ETag')
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                connection = self.connect()
+        connection.close()
+
+
+def run_load(url, paths, concurrency, duration, cookie=None, revalidate=False):
+    """Request ``paths`` from ``url`` over ``concurrency`` connections for ``duration`` seconds"""
+    base = urlsplit(url)
+    if base.scheme not in ('http', 'https') or not base.netloc:
+        raise CommandError(f'Not an http(s) URL: {url}')
+    headers = {'Accept-Encoding': 'gzip', 'Host': base.netloc}
+    if cookie:
+        headers['Cookie'] = cookie
+
+    deadline = time.monotonic() + duration
+    workers = [
+        Worker(base, paths[number % len(paths):] + paths[:number % len(paths)], deadline, headers, revalidate)
+        for number in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    if not latencies:
+        raise CommandError(f'No successful requests to {url}')
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    return {
+        'elapsed': elapsed,
+        'requests': len(latencies),
+        'rate': len(latencies) / elapsed,
+        'errors': sum(worker.errors for worker in workers),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'kib_per_second': sum(worker.bytes for worker in workers) / elapsed / 1024,
+        'statuses': sum((worker.statuses for worker in workers), Counter()),
+        'cache_statuses': sum((worker.cache_statuses for worker in workers), Counter()),
+    }
+
+
+def default_paths():
+    """A mix of catalog pages and one static file"""
+    paths = [reverse('shop:home'), reverse('shop:product_list'), reverse('shop:product_list') + '?page=2']
+    paths += [product.get_absolute_url() for product in Product.objects.available().order_by('-is_featured', 'pk')[:5]]
+    paths += [reverse('shop:category_detail', args=[slug]) for slug in Category.objects.values_list('slug', flat=True)[:3]]
+    # The content-hashed name pages link to, as browsers request it
+    paths.append(static('admin/css/base.css'))
+    return paths
+
+
+class Command(BaseCommand):
+    help = 'Load-test catalog pages over HTTP (run against nginx or gunicorn to compare deployments)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost', help='Base URL of the deployment')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous connections')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable; default: catalog pages)')
+        parser.add_argument('--cookie', help='Cookie header to send, e.g. a sessionid to bypass shared caches')
+        parser.add_argument('--revalidate', action='store_true', help='Send If-None-Match with the last ETag seen, like a browser')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or default_paths()
+        result = run_load(
+            options['url'], paths, options['concurrency'], options['duration'],
+            cookie=options['cookie'], revalidate=options['revalidate'],
+        )
+        self.stdout.write(f"{options['url']}  {len(paths)} paths, {options['concurrency']} connections, {result['elapsed']:.1f}s")
+        self.stdout.write(f"  requests   {result['requests']} ({result['rate']:.1f}/s), errors {result['errors']}")
+        self.stdout.write(f"  latency    p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms, p99 {result['p99']:.1f} ms")
+        self.stdout.write(f"  transfer   {result['kib_per_second']:.1f} KiB/s")
+        self.stdout.write('  statuses   ' + ', '.join(f'{status}: {count}' for status, count in sorted(result['statuses'].items())))
+        self.stdout.write('  cache      ' + ', '.join(f'{status}: {count}' for status, count in result['cache_statuses'].most_common()))
+        self.stdout.write(self.style.SUCCESS('Done'))
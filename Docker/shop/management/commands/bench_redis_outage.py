@@ -0,0 +1,249 @@
+import socket
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from shop.catalog import CHANGED_AT_CACHE_KEY, FEATURED_CACHE_KEY, LISTING_CHANGED_AT_CACHE_KEY
+from shop.importers import CatalogImporter
+from shop.models import Product
+
+from .bench_http import default_paths
+
+
+class RedisStandIn:
+    """
+    TCP proxy in front of a Redis server whose availability can be switched.
+
+    ``up`` forwards traffic, ``down`` drops every connection as soon as it is
+    made (like a crashed or restarting Redis) and ``hang`` accepts
+    connections but never answers (like a stalled server or a lost network).
+    """
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.mode = 'up'
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._listener = socket.create_server(('127.0.0.1', 0))
+        self.address = self._listener.getsockname()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'redis://{self.address[0]}:{self.address[1]}/1'
+
+    def set_mode(self, mode):
+        self.mode = mode
+        if mode != 'up':
+            # Connections made while Redis was up are the ones clients reuse
+            with self._lock:
+                sockets, self._sockets = self._sockets, set()
+            for sock in sockets:
+                self._close(sock)
+
+    def close(self):
+        self.set_mode('down')
+        self._listener.close()
+
+    def _close(self, sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            if self.mode == 'down':
+                client.close()
+                continue
+            if self.mode == 'hang':
+                # Keep it open and unanswered until the mode changes
+                with self._lock:
+                    self._sockets.add(client)
+                continue
+            try:
+                server = socket.create_connection(self.upstream)
+            except OSError:
+                client.close()
+                continue
+            with self._lock:
+                self._sockets.update((client, server))
+            threading.Thread(target=self._pump, args=(client, server), daemon=True).start()
+            threading.Thread(target=self._pump, args=(server, client), daemon=True).start()
+
+    def _pump(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if self.mode == 'up':
+                    target.sendall(data)
+        except OSError:
+            pass
+        self._close(source)
+        self._close(target)
+
+
+def start_redis(url):
+    """(host, port) of the Redis to put behind the stand-in, and a function to stop it"""
+    if url:
+        host, _, port = url.split('//', 1)[-1].split('/', 1)[0].rpartition(':')
+        return (host or 'localhost', int(port or 6379)), lambda: None
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        raise CommandError('Install fakeredis or pass --redis-url to a real Redis')
+    server = TcpFakeServer(('127.0.0.1', 0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+    return server.server_address, stop
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure catalog latency through TieredCache while a stand-in Redis goes down, hangs and recovers, '
+        'and check that catalog and account writes still succeed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--redis-url', help='Real Redis to put behind the stand-in (default: an in-process fakeredis)')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per phase')
+        parser.add_argument('--socket-timeout', type=float, help='Override SOCKET_TIMEOUT and SOCKET_CONNECT_TIMEOUT')
+        parser.add_argument('--breaker-threshold', type=int, help='Override BREAKER_THRESHOLD')
+        parser.add_argument('--breaker-cooldown', type=float, help='Override BREAKER_COOLDOWN')
+        parser.add_argument('--no-breaker', action='store_true', help='Try Redis on every call, for comparison')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        upstream, stop_redis = start_redis(options['redis_url'])
+        stand_in = RedisStandIn(upstream)
+        try:
+            with override_settings(CACHES={'default': self.cache_settings(stand_in.url, options)}):
+                cache_options = settings.CACHES['default']['OPTIONS']
+                self.stdout.write(
+                    f"Socket timeouts {cache_options['SOCKET_CONNECT_TIMEOUT']}s connect, "
+                    f"{cache_options['SOCKET_TIMEOUT']}s read; breaker after {cache_options['BREAKER_THRESHOLD']} "
+                    f"failures for {cache_options['BREAKER_COOLDOWN']}s"
+                )
+                self.run_phases(stand_in, options['duration'])
+                caches['default'].close()
+        finally:
+            stand_in.close()
+            stop_redis()
+
+    def cache_settings(self, location, options):
+        current = settings.CACHES['default']
+        cache_options = {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'L1_KEY_PREFIXES': [FEATURED_CACHE_KEY, CHANGED_AT_CACHE_KEY, LISTING_CHANGED_AT_CACHE_KEY, 'auth_user:'],
+            'SOCKET_CONNECT_TIMEOUT': 0.25,
+            'SOCKET_TIMEOUT': 0.5,
+            'BREAKER_THRESHOLD': 3,
+            'BREAKER_COOLDOWN': 5,
+        }
+        if current['BACKEND'] == 'petshop.cache.TieredCache':
+            cache_options.update(current.get('OPTIONS') or {})
+            # Whatever connects to the configured Redis must not bypass the stand-in
+            cache_options.pop('CONNECTION_POOL_KWARGS', None)
+        if options['socket_timeout'] is not None:
+            cache_options['SOCKET_CONNECT_TIMEOUT'] = cache_options['SOCKET_TIMEOUT'] = options['socket_timeout']
+        if options['breaker_threshold'] is not None:
+            cache_options['BREAKER_THRESHOLD'] = options['breaker_threshold']
+        if options['breaker_cooldown'] is not None:
+            cache_options['BREAKER_COOLDOWN'] = options['breaker_cooldown']
+        if options['no_breaker']:
+            cache_options['BREAKER_THRESHOLD'] = float('inf')
+        return {'BACKEND': 'petshop.cache.TieredCache', 'LOCATION': location, 'OPTIONS': cache_options}
+
+    def run_phases(self, stand_in, duration):
+        paths = default_paths()[:-1]
+        anonymous = Client(raise_request_exception=False)
+        # A visitor with a cart, whose session lives in Redis
+        shopper = Client(raise_request_exception=False)
+        shopper.session.save()
+
+        for phase, mode in [('healthy', 'up'), ('down', 'down'), ('hanging', 'hang'), ('recovered', 'up')]:
+            stand_in.set_mode(mode)
+            before = Counter(caches['default'].tier_stats())
+            latencies, statuses = [], Counter()
+            deadline = time.monotonic() + duration
+            number = 0
+            with CaptureQueriesContext(connection) as queries:
+                while time.monotonic() < deadline:
+                    client = (anonymous, shopper)[number % 2]
+                    path = paths[number // 2 % len(paths)]
+                    number += 1
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] += 1
+            stats = caches['default'].tier_stats()
+            self.report(phase, latencies, statuses, len(queries), before, stats)
+            if mode != 'up':
+                self.check_writes(phase)
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def check_writes(self, phase):
+        """Saves whose cache invalidation runs on commit must not fail because Redis does"""
+        product = Product.objects.order_by('pk').first()
+        user = User.objects.order_by('pk').first()
+        if product is None or user is None:
+            raise CommandError('No products or users; run populate_data first')
+        started = time.perf_counter()
+        try:
+            product.save()
+            user.save()
+            # A real change, so the importer invalidates the catalog, then the original name back
+            importer = CatalogImporter()
+            for name in (f'{product.name} (outage check)', product.name):
+                result = importer.run([(2, {'slug': product.slug, 'name': name})])
+                if result.updated != 1:
+                    raise CommandError(f'Import updated {result.updated} products: {result.rejects}')
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError(f'Saving while Redis is {phase} failed: {e!r}')
+        self.stdout.write(
+            f'  writes     product and user saved, 2 imports applied in {(time.perf_counter() - started) * 1000:.0f} ms'
+        )
+
+    def report(self, phase, latencies, statuses, queries, before, stats):
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+        def delta(name):
+            return stats.get(name, 0) - before.get(name, 0)
+
+        self.stdout.write(f'{phase}: {len(latencies)} requests, {queries / len(latencies):.1f} queries each')
+        self.stdout.write(
+            f'  latency    p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, max {latencies[-1] * 1000:.1f} ms'
+        )
+        self.stdout.write('  statuses   ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items())))
+        self.stdout.write(
+            f"  redis      {delta('l2_hits') + delta('l2_misses')} calls, {delta('l2_errors')} errors, "
+            f"{delta('l2_short_circuits')} skipped; breaker {stats['breaker']}"
+        )
+        self.stdout.write(
+            f"  local      L1 hits {delta('l1_hits')}, fallback hits {delta('fallback_hits')}, "
+            f"misses {delta('fallback_misses')}"
+        )
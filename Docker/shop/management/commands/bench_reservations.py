@@ -0,0 +1,109 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.inventory import decrement_stock
+from shop.models import Category, Product
+from shop.reservations import DatabaseReservationStore, RedisReservationStore, reservation_ttl
+
+
+class Command(BaseCommand):
+    help = 'Stress the stock reservation store with many concurrent simulated carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['redis', 'database'], default='redis')
+        parser.add_argument('--carts', type=int, default=500, help='Number of simulated carts')
+        parser.add_argument('--threads', type=int, default=50, help='Concurrent workers')
+        parser.add_argument('--stock', type=int, default=100, help='Units of the flash-sale product')
+        parser.add_argument('--max-quantity', type=int, default=3, help='Largest quantity a cart asks for')
+        parser.add_argument('--checkout-rate', type=float, default=0.7, help='Share of carts with a hold that check out')
+
+    def handle(self, *args, **options):
+        if options['backend'] == 'redis':
+            try:
+                from django_redis import get_redis_connection
+                store = RedisReservationStore(get_redis_connection('default'))
+            except NotImplementedError:
+                raise CommandError('The default cache is not django_redis; use --backend database')
+        else:
+            store = DatabaseReservationStore()
+
+        category, category_created = Category.objects.get_or_create(slug='bench-reservations', defaults={'name': 'Bench reservations'})
+        product = Product.objects.create(
+            name='Flash sale benchmark product',
+            slug=f'bench-reservations-{int(time.time() * 1000)}',
+            category=category,
+            description='Temporary product created by bench_reservations',
+            price=Decimal('1.00'),
+            stock_quantity=options['stock'],
+        )
+
+        lock = threading.Lock()
+        stats = {'held': 0, 'rejected': 0, 'checked_out': 0, 'units_sold': 0, 'checkout_failed': 0}
+        latencies = []
+
+        def simulate_cart(cart_number):
+            holder = f'bench-{cart_number}'
+            quantity = random.randint(1, options['max_quantity'])
+            try:
+                fresh = Product.objects.get(pk=product.pk)
+                started = time.perf_counter()
+                held = store.reserve(fresh, holder, quantity, reservation_ttl())
+                elapsed = time.perf_counter() - started
+
+                outcome = 'held' if held else 'rejected'
+                sold = 0
+                if held and random.random() < options['checkout_rate']:
+                    if decrement_stock(product.pk, quantity):
+                        outcome, sold = 'checked_out', quantity
+                    else:
+                        outcome = 'checkout_failed'
+                    store.release(product.pk, holder)
+
+                with lock:
+                    latencies.append(elapsed)
+                    stats[outcome] += 1
+                    stats['units_sold'] += sold
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(simulate_cart, range(options['carts'])))
+            wall = time.perf_counter() - started
+
+            product.refresh_from_db()
+            for number in range(options['carts']):
+                store.release(product.pk, f'bench-{number}')
+        finally:
+            product.delete()
+            if category_created:
+                category.delete()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(f"Backend: {options['backend']}, {options['carts']} carts on {options['threads']} threads, stock {options['stock']}")
+        self.stdout.write(
+            f"Holds granted: {stats['held'] + stats['checked_out'] + stats['checkout_failed']}, "
+            f"rejected: {stats['rejected']}"
+        )
+        self.stdout.write(
+            f"Checkouts: {stats['checked_out']} ({stats['units_sold']} units), "
+            f"failed after a hold: {stats['checkout_failed']}, stock left: {product.stock_quantity} ({product.stock_status})"
+        )
+        if latencies:
+            self.stdout.write(
+                f"Reserve latency: median {statistics.median(latencies) * 1000:.2f} ms, "
+                f"p95 {p95 * 1000:.2f} ms; {options['carts'] / wall:.0f} carts/s overall"
+            )
+
+        if stats['checkout_failed'] or product.stock_quantity + stats['units_sold'] != options['stock']:
+            raise CommandError('Reservations did not protect checkouts')
+        self.stdout.write(self.style.SUCCESS('No checkout failed after a successful hold'))
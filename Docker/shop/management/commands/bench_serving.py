@@ -0,0 +1,110 @@
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_http import default_paths, run_load
+from .gunicorn_stats import read_worker_stats
+
+
+# (worker class, workers, threads); None lets gunicorn.conf.py size it from the CPU count
+DEFAULT_MATRIX = [
+    ('sync', None, 1),
+    ('gthread', None, 2),
+    ('gthread', None, 4),
+    ('gthread', None, 8),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark gunicorn worker classes and sizes from gunicorn.conf.py against the catalog views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--config', action='append', dest='configs',
+            help='CLASS:WORKERS:THREADS to run (repeatable), e.g. gthread:2:4; WORKERS may be "auto"',
+        )
+        parser.add_argument('--port', type=int, default=8200, help='Port for the benchmarked server')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous client connections')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds of load per configuration')
+        parser.add_argument('--cookie', help='Cookie header to send, e.g. a logged-in sessionid')
+
+    def handle(self, *args, **options):
+        matrix = [self.parse_config(config) for config in options['configs']] if options['configs'] else DEFAULT_MATRIX
+        paths = default_paths()
+        url = f"http://127.0.0.1:{options['port']}"
+
+        rows = []
+        for worker_class, workers, threads in matrix:
+            with tempfile.TemporaryDirectory() as stats_dir, self.server(options['port'], worker_class, workers, threads, stats_dir):
+                # Warm up imports, templates and caches in every worker
+                run_load(url, paths, options['concurrency'], 2, cookie=options['cookie'])
+                result = run_load(url, paths, options['concurrency'], options['duration'], cookie=options['cookie'])
+                worker_stats = read_worker_stats(stats_dir)
+            label = f"{worker_class} {len(worker_stats) or workers or '?'}x{threads}"
+            rows.append((label, result, worker_stats))
+            self.stdout.write(f"{label}: {result['rate']:.1f} req/s")
+
+        self.stdout.write(f"\n{len(paths)} catalog paths, {options['concurrency']} connections, {options['duration']:.0f}s each")
+        self.stdout.write(f"{'config':<16}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'rss MB/worker':>15}")
+        for label, result, worker_stats in rows:
+            rss = max((stats['max_rss_mb'] for stats in worker_stats), default=0)
+            self.stdout.write(
+                f"{label:<16}{result['rate']:>8.1f}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                f"{result['errors']:>8}{rss:>15.1f}"
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def parse_config(self, config):
+        try:
+            worker_class, workers, threads = config.split(':')
+            return worker_class, None if workers == 'auto' else int(workers), int(threads)
+        except ValueError:
+            raise CommandError(f'Expected CLASS:WORKERS:THREADS, got {config!r}')
+
+    @contextmanager
+    def server(self, port, worker_class, workers, threads, stats_dir):
+        """Run gunicorn with gunicorn.conf.py and the given sizing until the block exits"""
+        env = dict(
+            os.environ,
+            GUNICORN_WORKER_CLASS=worker_class,
+            GUNICORN_THREADS=str(threads),
+            GUNICORN_STATS_DIR=stats_dir,
+            GUNICORN_LOG_LEVEL='warning',
+        )
+        env.pop('GUNICORN_WORKERS', None)
+        if workers:
+            env['GUNICORN_WORKERS'] = str(workers)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{port}', 'petshop.wsgi:application'],
+            cwd=settings.BASE_DIR, env=env, start_new_session=True,
+        )
+        try:
+            self.wait_until_up(f'http://127.0.0.1:{port}/health/', process)
+            yield
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+
+    def wait_until_up(self, url, process, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {process.returncode}')
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+            time.sleep(0.1)
+        raise CommandError(f'gunicorn did not answer {url} within {timeout}s')
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+
+def read_worker_stats(stats_dir):
+    """Counters written by the gunicorn.conf.py hooks, one dict per live worker"""
+    workers = []
+    for path in sorted(Path(stats_dir).glob('*.json')):
+        try:
+            workers.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # The worker exited or is rewriting the file
+            continue
+    return workers
+
+
+def hit_rate(stats, tier):
+    cache = stats.get('cache') or {}
+    hits, misses = cache.get(f'{tier}_hits', 0), cache.get(f'{tier}_misses', 0)
+    return f'{hits / (hits + misses):.0%}' if hits + misses else '-'
+
+
+def redis_health(stats):
+    """Breaker state and failed Redis calls of the worker's TieredCache"""
+    cache = stats.get('cache') or {}
+    if 'breaker' not in cache:
+        return '-'
+    return f"{cache['breaker']}/{cache.get('l2_errors', 0)}"
+
+
+class Command(BaseCommand):
+    help = 'Show per-worker gunicorn counters (requests, latency, memory, recycling)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stats-dir', default=os.environ.get('GUNICORN_STATS_DIR') or '/tmp/petshop-gunicorn',
+            help='GUNICORN_STATS_DIR of the running server',
+        )
+
+    def handle(self, *args, **options):
+        workers = read_worker_stats(options['stats_dir'])
+        if not workers:
+            self.stdout.write(f"No worker stats in {options['stats_dir']} (is gunicorn running with gunicorn.conf.py?)")
+            return
+        now = time.time()
+        self.stdout.write(
+            f"{'pid':>7} {'class':>8} {'age':>7} {'requests':>9} {'recycle at':>10} {'errors':>6} "
+            f"{'avg ms':>7} {'max ms':>7} {'rss MB':>7} {'L1 hits':>8} {'L2 hits':>8} {'redis/errors':>13}"
+        )
+        for stats in workers:
+            requests = stats['requests']
+            self.stdout.write(
+                f"{stats['pid']:>7} {stats['worker_class']:>8} {now - stats['started']:>6.0f}s {requests:>9} "
+                f"{stats['max_requests']:>10} {stats['errors']:>6} "
+                f"{stats['busy_seconds'] / requests * 1000 if requests else 0:>7.1f} {stats['slowest_seconds'] * 1000:>7.1f} "
+                f"{stats['max_rss_mb']:>7.1f} {hit_rate(stats, 'l1'):>8} {hit_rate(stats, 'l2'):>8} {redis_health(stats):>13}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(workers)} workers, {sum(stats["requests"] for stats in workers)} requests'))
@@ -0,0 +1,59 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importers import CatalogImporter, DEFAULT_BATCH_SIZE, FEED_READERS, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Import products, prices, discounts and stock levels from a CSV or JSONL feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('feed', help='Path to the feed file, or "-" to read from stdin')
+        parser.add_argument('--format', choices=sorted(FEED_READERS), help='Feed format (default: guessed from the file name)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per transaction')
+        parser.add_argument('--no-create', action='store_true', help='Only update existing products, reject unknown slugs')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and diff the feed without writing anything')
+        parser.add_argument('--rejects', help='Write every rejected row to this JSONL file')
+
+    def handle(self, *args, **options):
+        feed = options['feed']
+        feed_format = options['format'] or detect_format(feed)
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        reject_writer = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        try:
+            if feed == '-':
+                stream = sys.stdin
+            else:
+                try:
+                    stream = open(feed, newline='', encoding='utf-8')
+                except OSError as e:
+                    raise CommandError(f'Cannot open feed: {e}')
+
+            importer = CatalogImporter(
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                create=not options['no_create'],
+                reject_writer=reject_writer,
+            )
+            try:
+                result = importer.run(FEED_READERS[feed_format](stream))
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        finally:
+            if reject_writer is not None:
+                reject_writer.close()
+
+        for reject in result.rejects:
+            self.stdout.write(self.style.WARNING(
+                f"Line {reject['line']} ({reject['slug'] or 'no slug'}): {reject['error']}"
+            ))
+        if result.rejected > len(result.rejects):
+            self.stdout.write(f'... and {result.rejected - len(result.rejects)} more rejected rows')
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(f'{prefix}Resized {result.images_processed} new images')
+        self.stdout.write(self.style.SUCCESS(prefix + result.summary()))
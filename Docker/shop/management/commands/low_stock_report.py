@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from shop.catalog import invalidate_catalog
+from shop.inventory import low_stock_products, low_stock_threshold, sync_stock_status
+
+
+class Command(BaseCommand):
+    help = 'List active products that are running low on stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, help='Report products at or below this quantity (default: LOW_STOCK_THRESHOLD)')
+        parser.add_argument('--json', action='store_true', help='Print one JSON object per product, for alerting pipelines')
+        parser.add_argument('--sync', action='store_true', help='Fix stock statuses that disagree with quantities first')
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            fixed = sync_stock_status()
+            if fixed:
+                invalidate_catalog()
+            self.stderr.write(f'Fixed stock status on {fixed} products')
+
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = low_stock_threshold()
+        products = low_stock_products(threshold).values_list('id', 'slug', 'name', 'stock_quantity')
+
+        count = 0
+        for product_id, slug, name, quantity in products.iterator():
+            count += 1
+            if options['json']:
+                self.stdout.write(json.dumps({'id': product_id, 'slug': slug, 'name': name, 'stock_quantity': quantity}))
+            else:
+                self.stdout.write(f'{quantity:>5}  {name} ({slug})')
+
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS(f'{count} products at or below {threshold} units'))
@@ -0,0 +1,84 @@
+import io
+import shutil
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from orders.partitions import ensure_partitions
+
+
+# Deploy steps from every replica queue up on this PostgreSQL advisory lock
+RELEASE_LOCK_ID = zlib.crc32(b'petshop.release')
+
+
+class Command(BaseCommand):
+    help = 'One-time deploy setup: migrations, static files and sample data, run once per release'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait', type=int, default=60, help='Seconds to wait for the database')
+        parser.add_argument('--no-sample-data', action='store_true', help='Skip populate_data')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.wait_for_database(options['wait'])
+        with self.release_lock():
+            self.step('Running migrations', call_command, 'migrate', interactive=False, verbosity=0)
+            self.step('Creating order partitions', ensure_partitions)
+            # No --clear: replicas still on the previous release keep finding their hashed files
+            self.step('Collecting static files', call_command, 'collectstatic', interactive=False, verbosity=0)
+            self.step('Copying product images', self.copy_images)
+            if not options['no_sample_data']:
+                self.step('Loading sample data', call_command, 'populate_data', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(f'Release ready in {time.monotonic() - started:.1f}s'))
+
+    def step(self, label, function, *args, **kwargs):
+        started = time.monotonic()
+        self.stdout.write(f'{label}...', ending='')
+        self.stdout.flush()
+        function(*args, **kwargs)
+        self.stdout.write(f' {time.monotonic() - started:.1f}s')
+
+    def wait_for_database(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                connection.ensure_connection()
+                return
+            except OperationalError as error:
+                if time.monotonic() >= deadline:
+                    raise CommandError(f'Database unavailable: {error}')
+                self.stdout.write('Waiting for the database...')
+                time.sleep(1)
+
+    @contextmanager
+    def release_lock(self):
+        """Let one replica at a time run the release steps (PostgreSQL only)"""
+        if connection.vendor != 'postgresql':
+            yield
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [RELEASE_LOCK_ID])
+            if not cursor.fetchone()[0]:
+                self.stdout.write('Another release is running, waiting for it to finish...')
+                cursor.execute('SELECT pg_advisory_lock(%s)', [RELEASE_LOCK_ID])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [RELEASE_LOCK_ID])
+
+    def copy_images(self):
+        source = settings.BASE_DIR / 'images'
+        target = settings.MEDIA_ROOT / 'products'
+        target.mkdir(parents=True, exist_ok=True)
+        (settings.MEDIA_ROOT / 'categories').mkdir(parents=True, exist_ok=True)
+        if not source.is_dir():
+            return
+        for image in source.iterdir():
+            if image.suffix.lower() in ('.png', '.jpg') and not (target / image.name).exists():
+                shutil.copy2(image, target / image.name)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:33
+
+from django.db import migrations, models
+
+
+def sync_stock_status(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.filter(stock_status='in_stock', stock_quantity=0).update(stock_status='out_of_stock')
+    Product.objects.filter(stock_status='out_of_stock', stock_quantity__gt=0).update(stock_status='in_stock')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('stock_status', 'in_stock')), fields=['category', 'name'], name='product_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('stock_status', 'in_stock')), fields=['stock_quantity'], name='product_low_stock_idx'),
+        ),
+        migrations.RunPython(sync_stock_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+# Keep these expressions in step with the search_vector of the admin classes
+SEARCH_INDEXES = [
+    ('product_search_idx', 'shop_product', "to_tsvector('simple', name || ' ' || brand)"),
+    ('review_search_idx', 'shop_review', "to_tsvector('simple', title || ' ' || comment)"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
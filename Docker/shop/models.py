@@ -5,6 +5,20 @@ from PIL import Image
 import os
 
 
+def resize_image(path, max_size=(500, 500)):
+    """Shrink an image file in place; returns True if it was resized"""
+    try:
+        if os.path.exists(path):
+            img = Image.open(path)
+            if img.height > max_size[1] or img.width > max_size[0]:
+                img.thumbnail(max_size)
+                img.save(path)
+                return True
+    except (FileNotFoundError, OSError, IOError):
+        pass
+    return False
+
+
 class Category(models.Model):
     """Product categories for pets and pet supplies"""
     name = models.CharField(max_length=100, unique=True)
@@ -25,6 +39,32 @@ class Category(models.Model):
         return reverse('shop:category_detail', args=[self.slug])
 
 
+class ProductQuerySet(models.QuerySet):
+    def available(self):
+        """Active products that can currently be bought"""
+        return self.filter(is_active=True, stock_status='in_stock')
+
+    def listing(self, category_slug=None, search=None, sort_by='name'):
+        """Products as ``product_list`` filters and sorts them"""
+        products = self
+        if category_slug:
+            products = products.filter(category__slug=category_slug)
+        if search:
+            products = products.filter(
+                models.Q(name__icontains=search) |
+                models.Q(description__icontains=search) |
+                models.Q(brand__icontains=search)
+            )
+        # The id keeps pages stable among equal values
+        if sort_by == 'price_low':
+            return products.order_by('price', 'pk')
+        if sort_by == 'price_high':
+            return products.order_by('-price', 'pk')
+        if sort_by == 'newest':
+            return products.order_by('-created_at', 'pk')
+        return products.order_by('name', 'pk')
+
+
 class Product(models.Model):
     """Products in the pet shop"""
     STOCK_STATUS_CHOICES = [
@@ -50,11 +90,26 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['category', 'is_active']),
-            models.Index(fields=['is_featured', 'is_active']),
+            models.Index(fields=['category', 'is_active'], name='shop_produc_categor_bbda0b_idx'),
+            models.Index(fields=['is_featured', 'is_active'], name='shop_produc_is_feat_78a8e6_idx'),
+            # Listings and the low-stock feed only ever look at purchasable products
+            models.Index(
+                fields=['category', 'name'],
+                name='product_available_idx',
+                condition=models.Q(is_active=True, stock_status='in_stock'),
+            ),
+            models.Index(
+                fields=['stock_quantity'],
+                name='product_low_stock_idx',
+                condition=models.Q(is_active=True, stock_status='in_stock'),
+            ),
+            # Admin date hierarchy and default ordering
+            models.Index(fields=['created_at'], name='product_created_idx'),
         ]
 
     def __str__(self):
@@ -63,18 +118,35 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('shop:product_detail', args=[self.slug])
 
+    @property
+    def image_url(self):
+        """URL of the main image, or '' (shared with ProductCard)"""
+        return self.image.url if self.image else ''
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so saves that do not replace it skip the resize
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
     def save(self, *args, **kwargs):
+        self.sync_stock_status()
         super().save(*args, **kwargs)
-        if self.image and hasattr(self.image, 'path'):
-            try:
-                if os.path.exists(self.image.path):
-                    img = Image.open(self.image.path)
-                    if img.height > 500 or img.width > 500:
-                        output_size = (500, 500)
-                        img.thumbnail(output_size)
-                        img.save(self.image.path)
-            except (FileNotFoundError, OSError, IOError):
-                pass
+        if self.image and hasattr(self.image, 'path') and self.image.name != getattr(self, '_loaded_image', None):
+            resize_image(self.image.path)
+        self._loaded_image = self.image.name
+
+    def sync_stock_status(self):
+        """Derive stock_status from stock_quantity (discontinued is left alone)"""
+        if self.stock_status == 'in_stock' and self.stock_quantity <= 0:
+            self.stock_status = 'out_of_stock'
+        elif self.stock_status == 'out_of_stock' and self.stock_quantity > 0:
+            self.stock_status = 'in_stock'
+
+    def can_fulfil(self, quantity):
+        """Check if quantity units can be sold right now"""
+        return self.stock_status == 'in_stock' and self.stock_quantity >= quantity
 
     @property
     def get_price(self):
@@ -129,6 +201,9 @@ class Review(models.Model):
     class Meta:
         unique_together = ('product', 'user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='review_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.rating} stars by {self.user.username}"
@@ -173,6 +248,23 @@ class CartItem(models.Model):
         return self.quantity * self.product.get_price
 
 
+class StockReservation(models.Model):
+    """Short-lived hold on stock for a cart line (database fallback for Redis)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    holder = models.CharField(max_length=64)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('product', 'holder')
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held by {self.holder}"
+
+
 class Wishlist(models.Model):
     """User wishlist"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -0,0 +1,187 @@
+"""
+Short-lived stock holds for cart lines.
+
+Adding a product to a cart places a hold for the line's quantity that expires
+after ``STOCK_RESERVATION_TTL`` seconds unless the cart touches it again.  A
+hold only succeeds if the product's stock minus everybody else's live holds
+covers it, so during a flash sale the last units go to the carts that got
+there first instead of failing at checkout.  Checkout refreshes the hold,
+takes the stock with ``inventory.decrement_stock`` and then drops the hold.
+
+Holds live in Redis and are checked and updated by a single Lua script.  If
+Redis is not configured or not reachable, a database table is used instead,
+serialised per product with ``SELECT ... FOR UPDATE``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .models import Product, StockReservation
+
+
+logger = logging.getLogger(__name__)
+
+
+def reservation_ttl():
+    return getattr(settings, 'STOCK_RESERVATION_TTL', 900)
+
+
+def cart_holder(cart_id):
+    """Hold owner key for a database cart"""
+    return f'cart-{cart_id}'
+
+
+# KEYS: holds zset (holder -> expiry ms), quantities hash (holder -> qty), held counter
+# ARGV: holder, wanted quantity, stock, now ms, expiry ms, key ttl ms
+RESERVE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[4])
+for _, member in ipairs(expired) do
+    local qty = tonumber(redis.call('HGET', KEYS[2], member) or '0')
+    redis.call('HDEL', KEYS[2], member)
+    redis.call('DECRBY', KEYS[3], qty)
+end
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[4])
+end
+
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local held = tonumber(redis.call('GET', KEYS[3]) or '0')
+local wanted = tonumber(ARGV[2])
+local available = tonumber(ARGV[3]) - (held - current)
+if wanted > available then
+    return 0
+end
+
+redis.call('HSET', KEYS[2], ARGV[1], wanted)
+redis.call('ZADD', KEYS[1], ARGV[5], ARGV[1])
+redis.call('INCRBY', KEYS[3], wanted - current)
+for i = 1, 3 do
+    redis.call('PEXPIRE', KEYS[i], ARGV[6])
+end
+return 1
+"""
+
+# KEYS: as above; ARGV: holder
+RELEASE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if current > 0 then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('DECRBY', KEYS[3], current)
+end
+return current
+"""
+
+
+class RedisReservationStore:
+    """Holds kept in Redis, three keys per product"""
+
+    def __init__(self, client):
+        self.client = client
+        self._reserve = client.register_script(RESERVE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    @staticmethod
+    def _keys(product_id):
+        # The hash tag keeps a product's keys in one slot on Redis Cluster
+        return [f'stock:{{{product_id}}}:holds', f'stock:{{{product_id}}}:qty', f'stock:{{{product_id}}}:held']
+
+    def reserve(self, product, holder, quantity, ttl):
+        now_ms = int(time.time() * 1000)
+        args = [holder, quantity, product.stock_quantity, now_ms, now_ms + ttl * 1000, (ttl + 60) * 1000]
+        return bool(self._reserve(keys=self._keys(product.pk), args=args))
+
+    def release(self, product_id, holder):
+        self._release(keys=self._keys(product_id), args=[holder])
+
+
+class DatabaseReservationStore:
+    """Holds kept in the shop_stockreservation table"""
+
+    def reserve(self, product, holder, quantity, ttl):
+        now = timezone.now()
+        with transaction.atomic():
+            # Locking the product row serialises holds on the same product
+            stock = Product.objects.select_for_update().filter(pk=product.pk).values_list(
+                'stock_quantity', flat=True
+            ).first()
+            if stock is None:
+                return False
+            holds = StockReservation.objects.filter(product_id=product.pk)
+            holds.filter(expires_at__lte=now).delete()
+            held = holds.exclude(holder=holder).aggregate(total=Sum('quantity'))['total'] or 0
+            if quantity > stock - held:
+                return False
+            StockReservation.objects.update_or_create(
+                product_id=product.pk,
+                holder=holder,
+                defaults={'quantity': quantity, 'expires_at': now + timedelta(seconds=ttl)},
+            )
+        return True
+
+    def release(self, product_id, holder):
+        StockReservation.objects.filter(product_id=product_id, holder=holder).delete()
+
+
+_database_store = DatabaseReservationStore()
+_redis_store = None
+
+
+def _redis():
+    """The Redis store, or None if reservations are configured to use the database"""
+    global _redis_store
+    if getattr(settings, 'STOCK_RESERVATION_BACKEND', 'redis') != 'redis':
+        return None
+    if _redis_store is None:
+        try:
+            from django_redis import get_redis_connection
+            _redis_store = RedisReservationStore(get_redis_connection('default'))
+        except (ImportError, NotImplementedError):
+            # The default cache is not django_redis (e.g. local development)
+            return None
+    return _redis_store
+
+
+def _call(method, *args):
+    store = _redis()
+    if store is not None:
+        try:
+            return getattr(store, method)(*args)
+        except RedisError as e:
+            logger.warning('Stock reservations falling back to the database: %s', e)
+    return getattr(_database_store, method)(*args)
+
+
+def reserve(product, holder, quantity, ttl=None):
+    """
+    Hold ``quantity`` units of ``product`` for ``holder``, replacing any
+    previous hold it had.  Returns False if other holds leave too little stock.
+    """
+    if quantity <= 0:
+        release(product.pk, holder)
+        return True
+    if product.stock_status != 'in_stock':
+        return False
+    return _call('reserve', product, holder, quantity, ttl or reservation_ttl())
+
+
+def release(product_id, holder):
+    """Drop ``holder``'s hold on a product, if any"""
+    _call('release', product_id, holder)
+
+
+def release_holds(product_ids, holder):
+    """Drop ``holder``'s holds on several products"""
+    for product_id in product_ids:
+        release(product_id, holder)
+
+
+def purge_expired():
+    """Delete expired database holds; Redis expires its own"""
+    return StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,147 @@
+"""
+Carts for anonymous visitors, kept in the session.
+
+Sessions live in the Redis cache (``SESSION_ENGINE``), so browsing and
+filling a cart without an account never writes to PostgreSQL.  The cart is
+stored compactly as ``{product_id: quantity}``; when the visitor logs in it is
+merged into their database cart with one bulk upsert.
+"""
+import uuid
+
+from django.contrib import messages
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import reservations
+from .models import Cart, CartItem, Product
+
+
+CART_SESSION_KEY = 'cart'
+HOLDER_SESSION_KEY = 'cart_holder'
+
+
+class SessionCartItem:
+    """Cart line with the same interface the templates use for CartItem"""
+    __slots__ = ('product', 'quantity')
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        # Session lines are addressed by product id in the cart URLs
+        return self.product.pk
+
+    @property
+    def product_id(self):
+        return self.product.pk
+
+    @property
+    def total_price(self):
+        return self.quantity * self.product.get_price
+
+
+class SessionCart:
+    """Cart of an anonymous visitor"""
+
+    def __init__(self, session):
+        self.session = session
+        self.lines = session.get(CART_SESSION_KEY, {})
+        self._items = None
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    @property
+    def holder(self):
+        """Stock reservation key; survives the session key change on login"""
+        holder = self.session.get(HOLDER_SESSION_KEY)
+        if holder is None:
+            holder = self.session[HOLDER_SESSION_KEY] = f'guest-{uuid.uuid4().hex}'
+        return holder
+
+    def quantity(self, product_id):
+        return self.lines.get(str(product_id), 0)
+
+    def set(self, product_id, quantity):
+        if quantity > 0:
+            self.lines[str(product_id)] = quantity
+        else:
+            self.lines.pop(str(product_id), None)
+        self.session[CART_SESSION_KEY] = self.lines
+        self._items = None
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.session.pop(CART_SESSION_KEY, None)
+        self.session.pop(HOLDER_SESSION_KEY, None)
+        self.lines = {}
+        self._items = None
+
+    def items(self):
+        """Cart lines with their products, loaded in one query"""
+        if self._items is None:
+            products = Product.objects.filter(
+                id__in=[int(product_id) for product_id in self.lines], is_active=True
+            ).select_related('category')
+            self._items = [
+                SessionCartItem(product, self.lines[str(product.pk)])
+                for product in products
+            ]
+        return self._items
+
+    @property
+    def total_items(self):
+        return sum(self.lines.values())
+
+    @property
+    def total_price(self):
+        return sum(item.total_price for item in self.items())
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    """Move an anonymous visitor's cart into their database cart on login"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    session_cart = SessionCart(request.session)
+    if not session_cart:
+        return
+
+    product_ids = [int(product_id) for product_id in session_cart.lines]
+    products = Product.objects.available().filter(id__in=product_ids)
+    # The guest holds would otherwise count against the merged cart's holds
+    reservations.release_holds(product_ids, session_cart.holder)
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        existing = {} if created else dict(
+            CartItem.objects.filter(cart=cart, product__in=products).values_list('product_id', 'quantity')
+        )
+
+        merged = []
+        skipped = []
+        cart_holder = reservations.cart_holder(cart.pk)
+        for product in products:
+            quantity = existing.get(product.pk, 0) + session_cart.quantity(product.pk)
+            if product.can_fulfil(quantity) and reservations.reserve(product, cart_holder, quantity):
+                merged.append(CartItem(cart=cart, product=product, quantity=quantity))
+            else:
+                skipped.append(product.name)
+
+        if merged:
+            CartItem.objects.bulk_create(
+                merged,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+
+    session_cart.clear()
+
+    if skipped:
+        messages.warning(request, f'Not enough stock to keep {", ".join(skipped)} in your cart.')
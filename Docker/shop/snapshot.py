@@ -0,0 +1,170 @@
+"""
+In-memory catalog snapshot, per worker process (``CATALOG_SNAPSHOT``).
+
+When the catalog is small enough to keep in memory, each worker holds an
+immutable copy of the categories and available products, built with one
+query and indexed for what the catalog pages ask: products by id, slug and
+category, every sort order of ``product_list`` and the featured products.
+Browsing and filtering then runs without the database.
+
+The snapshot is tagged with its generation, the listing change stamp
+(``listing_changed_at``), which sales that leave a product in stock do not
+move.  A request that sees a newer generation starts building the next
+snapshot in a background thread and is served from the current one; the
+build swaps its result in with a single reference assignment, so requests
+use either the old or the new snapshot, never a mix.  Until a worker's first
+snapshot is ready its requests query the database.  The generation is read
+before the products, so a change that lands during a build only causes one
+more build.  Pages served from a snapshot are validated by its generation
+(``http_caching``), so they are never labelled newer than they are.
+
+Sorting uses Python's string order, which can differ from the database
+collation for mixed case and accents.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .cards import card_rows, product_card
+from .catalog import listing_changed_at, rebuild_in_background
+from .models import Category, Product
+
+
+logger = logging.getLogger(__name__)
+
+# product_list's ?sort= values and their sort keys; ids break ties, as in the database queries
+SORT_KEYS = {
+    'name': lambda entry: (entry[0].name, entry[0].id),
+    'price_low': lambda entry: (entry[0].price, entry[0].id),
+    'price_high': lambda entry: (-entry[0].price, entry[0].id),
+    'newest': lambda entry: (-entry[1], entry[0].id),
+}
+
+
+def snapshot_enabled():
+    return getattr(settings, 'CATALOG_SNAPSHOT', False)
+
+
+def snapshot_max_products():
+    return getattr(settings, 'CATALOG_SNAPSHOT_MAX_PRODUCTS', 50000)
+
+
+class CatalogSnapshot:
+    """Immutable, indexed copy of the categories and available products"""
+    __slots__ = (
+        'generation', 'categories', 'category_by_slug', 'by_id', 'by_slug', 'featured', 'size',
+        '_orders', '_search_text',
+    )
+
+    def __init__(self, generation, categories, rows):
+        self.generation = generation
+        self.categories = tuple(categories)
+        self.category_by_slug = {category.slug: category for category in self.categories}
+
+        entries = []
+        search_text = {}
+        for row in rows:
+            card = product_card(row)
+            # (card, created_at as a number, category id, featured)
+            entries.append((card, row['created_at'].timestamp(), row['category_id'], row['is_featured']))
+            # Lowercased like the database's case-insensitive search over the same fields
+            search_text[card.id] = '\n'.join((row['name'], row['description'], row['brand'])).lower()
+        self.size = len(entries)
+        self.by_id = {entry[0].id: entry[0] for entry in entries}
+        self.by_slug = {entry[0].slug: entry[0] for entry in entries}
+        self._search_text = search_text
+
+        # Every (category id or None, sort) listing, so a page is a slice of a ready tuple
+        self._orders = {}
+        for sort, key in SORT_KEYS.items():
+            ordered = sorted(entries, key=key)
+            self._orders[None, sort] = tuple(entry[0] for entry in ordered)
+            for category in self.categories:
+                self._orders[category.id, sort] = tuple(entry[0] for entry in ordered if entry[2] == category.id)
+        self.featured = tuple(entry[0] for entry in sorted(entries, key=SORT_KEYS['newest']) if entry[3])
+
+    def products(self, category_slug=None, search=None, sort_by='name'):
+        """Cards as product_list would list them for these filters"""
+        category_id = None
+        if category_slug:
+            category = self.category_by_slug.get(category_slug)
+            if category is None:
+                return ()
+            category_id = category.id
+        products = self._orders[category_id, sort_by if sort_by in SORT_KEYS else 'name']
+        if search:
+            needle = search.lower()
+            products = tuple(card for card in products if needle in self._search_text[card.id])
+        return products
+
+
+def build_snapshot(generation):
+    """A snapshot of the catalog as of ``generation``, or None if it is too big to hold"""
+    available = Product.objects.available()
+    limit = snapshot_max_products()
+    rows = list(card_rows(
+        available, ratings=True, fields=('category_id', 'created_at', 'is_featured', 'brand', 'description'),
+    )[:limit + 1])
+    if len(rows) > limit:
+        logger.warning('Catalog has more than %s available products; not keeping a snapshot', limit)
+        return None
+    return CatalogSnapshot(generation, Category.objects.all(), rows)
+
+
+_snapshot = None
+# Generation whose catalog was too big, so it is not queried again on every request
+_skipped_generation = None
+# Held by the thread building the next snapshot
+_build_lock = threading.Lock()
+
+
+def _build(generation):
+    global _snapshot, _skipped_generation
+    started = time.monotonic()
+    snapshot = build_snapshot(generation)
+    if snapshot is None:
+        _skipped_generation = generation
+        _snapshot = None
+        return
+    _snapshot = snapshot
+    logger.info(
+        'Catalog snapshot of %s products built in %.0f ms', snapshot.size, (time.monotonic() - started) * 1000,
+    )
+
+
+def catalog_snapshot():
+    """This worker's latest snapshot of the catalog, or None to query the database"""
+    if not snapshot_enabled():
+        return None
+    generation = listing_changed_at()
+    snapshot = _snapshot
+    # A snapshot newer than the generation this request read is just as good
+    if snapshot is not None and snapshot.generation >= generation:
+        return snapshot
+    if generation == _skipped_generation:
+        return None
+    # Serve the current snapshot, labelled with its own generation, while the next one is built
+    rebuild_in_background(_build_lock, lambda: _build(generation), 'catalog snapshot')
+    return snapshot
+
+
+def request_snapshot(request):
+    """The snapshot ``request`` is served from, the same for its validators and its content"""
+    if not hasattr(request, '_catalog_snapshot'):
+        request._catalog_snapshot = catalog_snapshot()
+    return request._catalog_snapshot
+
+
+def wait_for_snapshot(timeout=60):
+    """The snapshot of the current catalog, once built (for commands; requests never wait)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = catalog_snapshot()
+        if snapshot is not None and snapshot.generation >= listing_changed_at():
+            return snapshot
+        if not snapshot_enabled() or listing_changed_at() == _skipped_generation:
+            return None
+        time.sleep(0.01)
+    return None
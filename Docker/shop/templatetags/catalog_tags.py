@@ -0,0 +1,21 @@
+from django import template
+from django.middleware.csrf import get_token
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def catalog_csrf_token(context):
+    """
+    CSRF input for catalog pages.
+
+    Anonymous pages are shared through caches, so they cannot carry a token
+    for one visitor; the input is left empty and filled in from the CSRF
+    cookie by the script in base.html.
+    """
+    request = context['request']
+    if request.user.is_authenticated:
+        return format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">', get_token(request))
+    return mark_safe('<input type="hidden" name="csrfmiddlewaretoken" value="" data-csrf-from-cookie>')
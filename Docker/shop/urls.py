@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'shop'
 
@@ -8,6 +8,11 @@ urlpatterns = [
     path('products/', views.product_list, name='product_list'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    path('search/suggest/', views.autocomplete, name='autocomplete'),
+    path('api/categories/', api.categories, name='api_categories'),
+    path('api/products/', api.products, name='api_products'),
+    path('api/products/<slug:slug>/', api.product_detail, name='api_product_detail'),
+    path('csrf/', views.csrf_cookie, name='csrf_cookie'),
     path('cart/', views.cart_detail, name='cart_detail'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('update-cart-item/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
@@ -2,33 +2,51 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Count
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST, require_http_methods
+from django.db.models import Avg
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.core.cache import cache
-from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.db import transaction
+import hashlib
+import json
 import uuid
 from .models import Product, Category, Cart, CartItem, Wishlist, Review
 from .forms import ReviewForm
+from . import reservations
+from .autocomplete import MAX_RESULTS, autocomplete_max_age, suggestion_index
+from .cards import card_rows, product_cards
+from .catalog import FEATURED_CACHE_KEY
+from .http_caching import catalog_page
+from .idempotency import idempotent
+from .inventory import OutOfStock, decrement_stock
+from .session_cart import SessionCart
+from .snapshot import request_snapshot
 from orders.models import Order, OrderItem
+from orders.numbers import new_order_number
+from orders.tasks import queue_order_jobs
 from accounts.models import UserProfile
 
 
+@catalog_page(snapshot=True)
 def home(request):
     """Home page view"""
-    # Cache featured products for better performance
-    featured_products = cache.get('featured_products')
-    if not featured_products:
-        featured_products = Product.objects.filter(
-            is_featured=True, 
-            is_active=True
-        ).select_related('category').annotate(
-            avg_rating=Avg('reviews__rating'),
-            reviews_count=Count('reviews')
-        )[:8]
-        cache.set('featured_products', featured_products, 300)  # Cache for 5 minutes
-    
-    categories = Category.objects.all()[:6]
+    snapshot = request_snapshot(request)
+    if snapshot is not None:
+        featured_products = snapshot.featured[:8]
+        categories = snapshot.categories[:6]
+    else:
+        # Cache featured products for better performance
+        featured_products = cache.get(FEATURED_CACHE_KEY)
+        if not featured_products:
+            featured_products = product_cards(card_rows(
+                Product.objects.available().filter(is_featured=True)
+            )[:8])
+            cache.set(FEATURED_CACHE_KEY, featured_products, 300)  # Cache for 5 minutes
+        
+        categories = Category.objects.all()[:6]
     
     # Get user's wishlist products if authenticated
     user_wishlist_products = []
@@ -47,42 +65,27 @@ def home(request):
     return render(request, 'shop/home.html', context)
 
 
+@catalog_page(snapshot=True)
 def product_list(request):
     """Product listing with filtering and pagination"""
-    products = Product.objects.filter(is_active=True).select_related('category').annotate(
-        avg_rating=Avg('reviews__rating'),
-        reviews_count=Count('reviews')
-    )
-    categories = Category.objects.all()
-    
-    # Filtering
     category_slug = request.GET.get('category')
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-    
     search_query = request.GET.get('search')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(brand__icontains=search_query)
-        )
-    
-    # Sorting
     sort_by = request.GET.get('sort', 'name')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
-    else:
-        products = products.order_by('name')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    
+    snapshot = request_snapshot(request)
+    if snapshot is not None:
+        # Filtered, sorted and paginated in memory
+        categories = snapshot.categories
+        page_obj = Paginator(snapshot.products(category_slug, search_query, sort_by), 12).get_page(page_number)
+    else:
+        products = Product.objects.available().listing(category_slug, search_query, sort_by)
+        categories = Category.objects.all()
+        
+        # Pagination
+        paginator = Paginator(card_rows(products, ratings=True), 12)
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = product_cards(page_obj.object_list)
     
     # Get user's wishlist products if authenticated
     user_wishlist_products = []
@@ -104,6 +107,7 @@ def product_list(request):
     return render(request, 'shop/product_list.html', context)
 
 
+@catalog_page
 def product_detail(request, slug):
     """Product detail view with reviews"""
     product = get_object_or_404(
@@ -121,9 +125,8 @@ def product_detail(request, slug):
     reviews = all_reviews[:5]
     
     # Related products
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
+    related_products = Product.objects.available().filter(
+        category=product.category
     ).exclude(id=product.id)[:4]
     
     # Review form for authenticated users
@@ -147,18 +150,24 @@ def product_detail(request, slug):
     return render(request, 'shop/product_detail.html', context)
 
 
+@catalog_page(snapshot=True)
 def category_detail(request, slug):
     """Category detail view"""
-    category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(
-        category=category,
-        is_active=True
-    ).select_related('category')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    snapshot = request_snapshot(request)
+    if snapshot is not None:
+        category = snapshot.category_by_slug.get(slug)
+        if category is None:
+            raise Http404('No such category')
+        page_obj = Paginator(snapshot.products(slug, sort_by='newest'), 12).get_page(page_number)
+    else:
+        category = get_object_or_404(Category, slug=slug)
+        products = Product.objects.available().filter(category=category)
+        
+        # Pagination
+        paginator = Paginator(card_rows(products), 12)
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = product_cards(page_obj.object_list)
     
     context = {
         'category': category,
@@ -167,41 +176,78 @@ def category_detail(request, slug):
     return render(request, 'shop/category_detail.html', context)
 
 
-@login_required
+@require_GET
+def autocomplete(request):
+    """Suggestions for a search box: the most popular names with a word starting with ?q="""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), MAX_RESULTS)
+    except ValueError:
+        limit = 8
+    suggestions = suggestion_index().lookup(query, limit)
+    response = JsonResponse({'query': query, 'suggestions': suggestions})
+    # The same for every visitor, so browsers and nginx may keep it; the ETag follows the content
+    patch_cache_control(response, public=True, max_age=autocomplete_max_age())
+    etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+@never_cache
+@ensure_csrf_cookie
+def csrf_cookie(request):
+    """Set the CSRF cookie for pages that came from a shared cache"""
+    return HttpResponse(status=204)
+
+
 @require_POST
 def add_to_cart(request, product_id):
     """Add product to cart"""
     product = get_object_or_404(Product, id=product_id, is_active=True)
     quantity = int(request.POST.get('quantity', 1))
     
-    if product.stock_quantity < quantity:
-        messages.error(request, 'Not enough stock available.')
-        return redirect('shop:product_detail', slug=product.slug)
+    if not request.user.is_authenticated:
+        # Anonymous carts live in the session until the visitor logs in
+        session_cart = SessionCart(request.session)
+        line_quantity = session_cart.quantity(product.pk) + quantity
+        if not product.can_fulfil(line_quantity) or not reservations.reserve(product, session_cart.holder, line_quantity):
+            messages.error(request, 'Not enough stock available.')
+            return redirect('shop:product_detail', slug=product.slug)
+        session_cart.set(product.pk, line_quantity)
+        messages.success(request, f'{product.name} added to cart!')
+        return redirect('shop:cart_detail')
     
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': quantity}
-    )
+    cart_item = CartItem.objects.filter(cart=cart, product=product).first()
+    line_quantity = quantity + (cart_item.quantity if cart_item else 0)
+    
+    # Hold the stock for the whole cart line so it is still there at checkout
+    if not product.can_fulfil(line_quantity) or not reservations.reserve(product, reservations.cart_holder(cart.pk), line_quantity):
+        messages.error(request, 'Not enough stock available.')
+        return redirect('shop:product_detail', slug=product.slug)
     
-    if not created:
-        cart_item.quantity += quantity
+    if cart_item:
+        cart_item.quantity = line_quantity
         cart_item.save()
+    else:
+        CartItem.objects.create(cart=cart, product=product, quantity=line_quantity)
     
     messages.success(request, f'{product.name} added to cart!')
     return redirect('shop:cart_detail')
 
 
-@login_required
 def cart_detail(request):
     """Shopping cart detail"""
-    try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('product').all()
-    except Cart.DoesNotExist:
-        cart = None
-        cart_items = []
+    if not request.user.is_authenticated:
+        cart = SessionCart(request.session)
+        cart_items = cart.items()
+    else:
+        try:
+            cart = Cart.objects.get(user=request.user)
+            cart_items = cart.items.select_related('product').all()
+        except Cart.DoesNotExist:
+            cart = None
+            cart_items = []
     
     context = {
         'cart': cart,
@@ -210,18 +256,39 @@ def cart_detail(request):
     return render(request, 'shop/cart_detail.html', context)
 
 
-@login_required
 @require_POST
 def update_cart_item(request, item_id):
     """Update cart item quantity"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     quantity = int(request.POST.get('quantity', 1))
     
+    if not request.user.is_authenticated:
+        # Session cart lines are addressed by product id
+        session_cart = SessionCart(request.session)
+        if not session_cart.quantity(item_id):
+            raise Http404('No such cart item')
+        if quantity <= 0:
+            session_cart.remove(item_id)
+            reservations.release(item_id, session_cart.holder)
+            messages.success(request, 'Item removed from cart.')
+            return redirect('shop:cart_detail')
+        product = get_object_or_404(Product, id=item_id, is_active=True)
+        if not product.can_fulfil(quantity) or not reservations.reserve(product, session_cart.holder, quantity):
+            messages.error(request, 'Not enough stock available.')
+        else:
+            session_cart.set(item_id, quantity)
+            messages.success(request, 'Cart updated successfully.')
+        return redirect('shop:cart_detail')
+    
+    cart_item = get_object_or_404(CartItem.objects.select_related('product'), id=item_id, cart__user=request.user)
+    holder = reservations.cart_holder(cart_item.cart_id)
+    
     if quantity <= 0:
         cart_item.delete()
+        reservations.release(cart_item.product_id, holder)
         messages.success(request, 'Item removed from cart.')
     else:
-        if cart_item.product.stock_quantity < quantity:
+        product = cart_item.product
+        if not product.can_fulfil(quantity) or not reservations.reserve(product, holder, quantity):
             messages.error(request, 'Not enough stock available.')
         else:
             cart_item.quantity = quantity
@@ -231,13 +298,23 @@ def update_cart_item(request, item_id):
     return redirect('shop:cart_detail')
 
 
-@login_required
 @require_POST
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
+    if not request.user.is_authenticated:
+        session_cart = SessionCart(request.session)
+        if not session_cart.quantity(item_id):
+            raise Http404('No such cart item')
+        product = get_object_or_404(Product, id=item_id)
+        session_cart.remove(item_id)
+        reservations.release(item_id, session_cart.holder)
+        messages.success(request, f'{product.name} removed from cart.')
+        return redirect('shop:cart_detail')
+    
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     product_name = cart_item.product.name
     cart_item.delete()
+    reservations.release(cart_item.product_id, reservations.cart_holder(cart_item.cart_id))
     messages.success(request, f'{product_name} removed from cart.')
     return redirect('shop:cart_detail')
 
@@ -269,7 +346,7 @@ def wishlist_detail(request):
     """Wishlist detail"""
     try:
         wishlist = Wishlist.objects.get(user=request.user)
-        products = wishlist.products.filter(is_active=True)
+        products = product_cards(card_rows(wishlist.products.filter(is_active=True)))
     except Wishlist.DoesNotExist:
         products = []
     
@@ -358,34 +435,34 @@ def checkout(request):
         return redirect('shop:cart_detail')
     
     # Get user profile for pre-filling form
-    try:
-        profile = request.user.userprofile
-    except UserProfile.DoesNotExist:
-        profile = UserProfile.objects.create(user=request.user)
+    profile = UserProfile.objects.for_user(request.user)
     
     context = {
         'cart': cart,
         'cart_items': cart_items,
         'profile': profile,
+        # Sent with every submit of this page so retries cannot place a second order
+        'idempotency_key': uuid.uuid4().hex,
     }
     return render(request, 'shop/checkout.html', context)
 
 
 @login_required
 @require_POST
+@idempotent(store_if=lambda response: json.loads(response.content).get('success'))
 def process_checkout(request):
     """Process checkout and create order"""
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('product').all()
+        cart_items = cart.items.select_related('product__category').all()
     except Cart.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Cart not found'})
     
     if not cart_items:
         return JsonResponse({'success': False, 'error': 'Cart is empty'})
     
-    # Generate unique order number
-    order_number = f"PET-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+    # Time-ordered, so new orders append to the order_number index
+    order_number = new_order_number()
     
     # Create shipping address string
     shipping_address = f"{request.POST.get('first_name')} {request.POST.get('last_name')}\n"
@@ -393,35 +470,46 @@ def process_checkout(request):
     shipping_address += f"{request.POST.get('city')}, {request.POST.get('postal_code')}\n"
     shipping_address += f"{request.POST.get('country')}"
     
-    # Create order
-    order = Order.objects.create(
-        user=request.user,
-        order_number=order_number,
-        total_amount=cart.total_price,
-        shipping_address=shipping_address,
-        billing_address=shipping_address,  # Same as shipping for simplicity
-        phone_number=request.POST.get('phone'),
-        email=request.POST.get('email'),
-        notes=request.POST.get('notes', ''),
-        status='processing'
-    )
-    
-    # Create order items
-    for cart_item in cart_items:
-        OrderItem.objects.create(
-            order=order,
-            product=cart_item.product,
-            quantity=cart_item.quantity,
-            price=cart_item.product.get_price
-        )
-        
-        # Update product stock
-        product = cart_item.product
-        product.stock_quantity -= cart_item.quantity
-        product.save()
-    
-    # Clear the cart
-    cart_items.delete()
+    try:
+        with transaction.atomic():
+            # Create order
+            order = Order.objects.create(
+                user=request.user,
+                order_number=order_number,
+                total_amount=cart.total_price,
+                shipping_address=shipping_address,
+                billing_address=shipping_address,  # Same as shipping for simplicity
+                phone_number=request.POST.get('phone'),
+                email=request.POST.get('email'),
+                notes=request.POST.get('notes', ''),
+                item_count=len(cart_items),
+                status='processing'
+            )
+            
+            # Create order items; stock is taken in product order so that
+            # concurrent checkouts lock rows in the same sequence
+            holder = reservations.cart_holder(cart.pk)
+            lines = []
+            for cart_item in sorted(cart_items, key=lambda item: item.product_id):
+                # Refresh the cart's hold first so stock held by other carts is respected
+                if not reservations.reserve(cart_item.product, holder, cart_item.quantity):
+                    raise OutOfStock(cart_item.product)
+                if not decrement_stock(cart_item.product_id, cart_item.quantity):
+                    raise OutOfStock(cart_item.product)
+                lines.append(OrderItem.from_product(order, cart_item.product, cart_item.quantity))
+            OrderItem.objects.bulk_create(lines)
+            
+            # The stock is taken now, so the holds are no longer needed
+            held_products = [item.product_id for item in cart_items]
+            transaction.on_commit(lambda: reservations.release_holds(held_products, holder))
+            
+            # Emails, stock alerts and the sales rollups run in the job worker once this commits
+            queue_order_jobs(order, lines)
+
+            # Clear the cart
+            cart_items.delete()
+    except OutOfStock as e:
+        return JsonResponse({'success': False, 'error': f'Not enough stock available for {e.product.name}.'})
     
     return JsonResponse({
         'success': True, 